@@ -1,64 +1,47 @@
-import pickle
 import sys
-import os
-import time
-from credentials import load_switch_key, session, baseurl
-from urllib.parse import urljoin, urlencode
-
-
-def get_property_pkl_file():
-    """Get the file path of the property pickle file."""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(current_dir, 'property_fields.pkl')
-
-
-def load_relevant_data_from_pkl():
-    """Load the relevant data for the property from the pickle file."""
-    pkl_file_path = get_property_pkl_file()
-
-    if not os.path.exists(pkl_file_path):
-        raise FileNotFoundError(f"Pickle file '{pkl_file_path}' not found for the property.")
-
-    try:
-        with open(pkl_file_path, 'rb') as pklfile:
-            relevant_data = pickle.load(pklfile)
-        print(f"Loaded relevant data from pkl: {relevant_data}")  # Debugging information
-        return relevant_data
-    except pickle.UnpicklingError as e:
-        raise Exception(f"Error while unpickling the file: {e}")
+from credentials import load_switch_key
+from papi_client import client
+from state_store import load_relevant_data
+from activation_watcher import fetch_activation, wait_for_activation
+from rule_tree_hash import rules_hash, is_already_active
+from update_property_rule_tree import load_rule_tree
+from instrumentation import logger
+from activation_metrics import record_submission, record_status
+from cache_warmer import warm_after_activation
 
 
 def get_latest_property_version(propertyId, ASK):
     """Fetch the latest property version from Akamai."""
-    url = urljoin(baseurl, f"/papi/v1/properties/{propertyId}/versions/latest")
     qs = {
         'accountSwitchKey': ASK,
     }
 
-    headers = {
-        "accept": "application/json",
-        "PAPI-Use-Prefixes": "false",
-        "content-type": "application/json"
-    }
-
-    response = session.get(url, headers=headers, params=qs)
+    response = client.get(f"/papi/v1/properties/{propertyId}/versions/latest", params=qs)
     if response.status_code == 200:
         latest_version = response.json().get('versions').get('items')[0].get('propertyVersion')
         print(f"Latest property version: {latest_version}")
         return latest_version
     else:
         print(f"Failed to fetch latest property version. Status code: {response.status_code}")
-        print(f"Response content: {response.json()}")  # Add this for debugging
+        logger.warning(f"Response content: {response.text}",
+                       extra={'event': 'response', 'status': response.status_code})
         return None
 
 
-def activate_on_akamai(ASK, propertyId, propertyVersion, contractId, groupId, network):
-    """Activate the specified property version on the given network (STAGING or PRODUCTION)."""
+def activate_on_akamai(ASK, propertyId, propertyVersion, contractId, groupId, network, use_fast_fallback=False):
+    """
+    Activate the specified property version on the given network (STAGING or PRODUCTION).
+
+    With use_fast_fallback, propertyVersion must be the fallback version of the current
+    activation and its fallback window must still be open; the edge then switches back
+    in seconds instead of running a full activation.
+    """
+    action = "Fast fallback to" if use_fast_fallback else "DevOps Push Activating"
     payload = {
         "propertyVersion": propertyVersion,
         "network": network.upper(),  # Network can be STAGING or PRODUCTION
-        "note": f"DevOps Push Activating version {propertyVersion} on {network.upper()}",
-        "useFastFallback": False,
+        "note": f"{action} version {propertyVersion} on {network.upper()}",
+        "useFastFallback": use_fast_fallback,
         "notifyEmails": [
             "gamittal@akamai.com",
         ],
@@ -82,70 +65,53 @@ def activate_on_akamai(ASK, propertyId, propertyVersion, contractId, groupId, ne
         'groupId': groupId,
     }
 
-    headers = {
-        "accept": "application/json",
-        "PAPI-Use-Prefixes": "false",
-        "content-type": "application/json"
-    }
-
-    response = session.post(urljoin(baseurl, f'/papi/v1/properties/{propertyId}/activations'),
-                            headers=headers, json=payload, params=qs)
+    response = client.post(f'/papi/v1/properties/{propertyId}/activations', json=payload, params=qs)
 
     if response.status_code == 201:
         print(f"Successfully activated property on {network.upper()} network.")
         activation_data = response.json()
         activation_link = activation_data.get('activationLink')
 
-        print(f'activation_link : {activation_link}')
+        logger.debug(f"Activation link: {activation_link}", extra={'event': 'activation', 'link': activation_link})
 
         # Split the URL to extract activationId from the path
         path = activation_link.split('?')[0]  # Isolate the path before query parameters
         activation_id = path.split('/')[-1]  # Extract the activationId
         print(f"Activation ID: {activation_id}")
+        record_submission(activation_id, propertyId, propertyVersion, network)
         return activation_id
     else:
         print(f"Failed to activate property on {network.upper()} network. Status code: {response.status_code}")
-        print(f"Response content: {response.json()}")  # Add this for debugging
+        logger.warning(f"Response content: {response.text}",
+                       extra={'event': 'response', 'status': response.status_code})
         return None
 
 
 def check_activation_status(propertyId, activationId, contractId, groupId, ASK):
     """Check the activation status using the activationId for the given network."""
-
-    query_params = {
-        'contractId': contractId,
-        'groupId': groupId,
-        'accountSwitchKey': ASK,
-    }
-
-    headers = {
-        "accept": "application/json",
-        "PAPI-Use-Prefixes": "false",
-        "content-type": "application/json"
-    }
-
-    # Make the GET request to check activation status
-    response = session.get(urljoin(baseurl,
-                                   f"/papi/v1/properties/{propertyId}/activations/{activationId}"), headers=headers,
-                           params=query_params)
+    response = fetch_activation(propertyId, activationId, contractId, groupId, ASK)
 
     if response.status_code == 200:
-        activation_data = response.json()
-        return activation_data['activations']['items'][0]['status']  # Polling the activation status
+        activation = response.json()['activations']['items'][0]
+        record_status(activation, propertyId)
+        return activation['status']  # Polling the activation status
     else:
         print(f"Error while checking activation status: {response.status_code}")
-        # print(f"Response: {response.json()}")
+        logger.debug("Response content", extra={'event': 'response', 'body': response.text})
         return None
 
 
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: python3 activate_on_akamai.py <network>")
-        print("Example: python3 activate_on_akamai.py staging")
-        print("Example: python3 activate_on_akamai.py production")
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    if not argv or len(argv) > 2:
+        print("Usage: python3 activate_on_akamai.py <network> [<propertyName>]")
+        print("Example: python3 activate_on_akamai.py staging www.cyberabstract.com")
+        print("Example: AKAMAI_PROPERTY_NAME=www.cyberabstract.com python3 activate_on_akamai.py production")
         exit(1)
 
-    network = sys.argv[1].lower()  # Get the environment (staging or production) from command-line arguments
+    network = argv[0].lower()  # Get the environment (staging or production) from command-line arguments
 
     if network not in ['staging', 'production']:
         print(f"Invalid network: {network}. Use 'staging' or 'production'.")
@@ -158,37 +124,42 @@ if __name__ == '__main__':
             raise Exception("No switch key found. Exiting.")
         ASK = switch_key_data['switch_key']
 
-        # Step 2: Load relevant data (including contractId, groupId, and propertyId) from the pickle file
-        relevant_data = load_relevant_data_from_pkl()
+        # Step 2: Load relevant data (including contractId, groupId, and propertyId) from the state store
+        relevant_data = load_relevant_data(argv[1] if len(argv) > 1 else None)
 
-        # Extract relevant fields from the pickle file
+        # Extract relevant fields from the state store
         contractId = relevant_data['contractId']
         groupId = relevant_data['groupId']
         propertyId = relevant_data['propertyId']
 
-        # Step 3: Fetch the latest property version from Akamai
+        # Step 3: Skip the activation if the network already runs an identical rule tree
+        local_hash = relevant_data.get('rulesHash') or rules_hash(load_rule_tree(relevant_data['propertyName']))
+        if is_already_active(ASK, propertyId, contractId, groupId, network, local_hash):
+            print(f"Rule tree is already active on {network.upper()} network. Skipping activation.")
+            exit(0)
+
+        # Step 4: Fetch the latest property version from Akamai
         propertyVersion = get_latest_property_version(propertyId, ASK)
         if not propertyVersion:
             raise Exception("Unable to fetch the latest property version. Exiting.")
 
-        # Step 4: Activate the new property version on the specified network (STAGING or PRODUCTION)
-        print(f"Activating version {propertyVersion} on {network.upper()} network.")  # Debugging
+        # Step 5: Activate the new property version on the specified network (STAGING or PRODUCTION)
+        print(f"Activating version {propertyVersion} on {network.upper()} network.")
         activation_id = activate_on_akamai(ASK, propertyId, propertyVersion, contractId, groupId, network)
 
         if activation_id is not None:
-            # Step 5: Poll for activation status using activationId
+            # Step 6: Watch the activation, polling quickly at first and backing off while it is pending
             print("Polling for activation status...")
-            while True:
-                status = check_activation_status(propertyId, activation_id, contractId, groupId, ASK)
-                if status == "ACTIVE":
-                    print(f"Activation on {network.upper()} network completed successfully!")
-                    exit(0)  # Success, continue with next steps in GitHub Actions
-                elif status == "FAILED":
-                    print(f"Activation on {network.upper()} network failed.")
-                    exit(1)  # Failure, stop workflow
-                else:
-                    print(f"Current status: {status}. Waiting to complete...")
-                    time.sleep(60)  # Wait 60 seconds before polling again
+            status = wait_for_activation(ASK, propertyId, activation_id, contractId, groupId)
+            if status == "ACTIVE":
+                print(f"Activation on {network.upper()} network completed successfully!")
+                if network == 'production':
+                    # Optional warm-up of the edge cache (AKAMAI_WARM_URLS)
+                    warm_after_activation([relevant_data['propertyName']])
+                exit(0)  # Success, continue with next steps in GitHub Actions
+            else:
+                print(f"Activation on {network.upper()} network ended with status {status}.")
+                exit(1)  # Failure, stop workflow
         else:
             print("Activation failed, skipping polling.")
             exit(1)
@@ -196,3 +167,7 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"An error occurred: {e}")
         exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from instrumentation import logger, metrics, percentile
+from state_store import get_connection, transaction
+
+FINAL_STATUSES = ('ACTIVE', 'FAILED', 'ABORTED', 'DEACTIVATED')
+
+# Order in which an activation moves through PAPI statuses, for the progress report
+PROGRESS_STATUSES = ['SUBMITTED', 'PENDING', 'ZONE_1', 'ZONE_2', 'ZONE_3', 'ACTIVE']
+
+BUCKETS = {'day': 86400, 'week': 7 * 86400}
+
+# Identifies the rows of one deploy or bulk deploy run in deploy_steps
+RUN_ID = f"{int(time.time())}-{os.getpid()}"
+
+
+def parse_date(value):
+    """Epoch seconds of a PAPI date ('2024-05-01T10:00:00Z'), or None."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def record_submission(activationId, propertyId, propertyVersion, network, property_name=None):
+    """Record that an activation was submitted, timed by the local clock."""
+    now = time.time()
+    try:
+        with transaction() as connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO activation_history (activation_id, property_id, property_name, '
+                'property_version, network, status, submitted_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (activationId, propertyId, property_name, propertyVersion, network.upper(), 'SUBMITTED', now, now))
+            connection.execute('INSERT OR IGNORE INTO activation_events (activation_id, status, seen_at) '
+                               'VALUES (?, ?, ?)', (activationId, 'SUBMITTED', now))
+    except sqlite3.Error as e:
+        logger.warning(f"Could not record activation {activationId}: {e}")
+
+
+def record_status(item, propertyId=None):
+    """
+    Record a polled activation (an item of the PAPI activations response).
+
+    The first time each status is seen is kept as an event, so the report can show
+    how long activations spend pending and in each zone. When the activation reaches
+    a final status its duration is stored: PAPI's submitDate to updateDate when the
+    response carries them, the local submission and poll times otherwise.
+    """
+    now = time.time()
+    activation_id = item['activationId']
+    status = item['status']
+    try:
+        with transaction() as connection:
+            row = connection.execute('SELECT * FROM activation_history WHERE activation_id = ?',
+                                     (activation_id,)).fetchone()
+            if row is None:
+                connection.execute(
+                    'INSERT INTO activation_history (activation_id, property_id, property_name, property_version, '
+                    'network, status, submitted_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (activation_id, item.get('propertyId', propertyId), item.get('propertyName'),
+                     item.get('propertyVersion'), item.get('network', ''), status,
+                     parse_date(item.get('submitDate')) or now, now))
+                row = connection.execute('SELECT * FROM activation_history WHERE activation_id = ?',
+                                         (activation_id,)).fetchone()
+
+            connection.execute('INSERT OR IGNORE INTO activation_events (activation_id, status, seen_at) '
+                               'VALUES (?, ?, ?)', (activation_id, status, now))
+
+            finished_at, duration = row['finished_at'], row['duration']
+            if status in FINAL_STATUSES and finished_at is None:
+                submitted, updated = parse_date(item.get('submitDate')), parse_date(item.get('updateDate'))
+                finished_at = now
+                duration = updated - submitted if submitted and updated else now - row['submitted_at']
+            connection.execute(
+                'UPDATE activation_history SET status = ?, property_name = COALESCE(property_name, ?), '
+                'finished_at = ?, duration = ?, updated_at = ? WHERE activation_id = ?',
+                (status, item.get('propertyName'), finished_at, duration, now, activation_id))
+    except sqlite3.Error as e:
+        logger.warning(f"Could not record activation {activation_id}: {e}")
+
+
+def record_steps(command, run_id=RUN_ID, phases=None):
+    """Persist the phase timings of this run (see instrumentation.metrics), or the given (name, runs, total)."""
+    if phases is None:
+        with metrics.lock:
+            phases = [(name, stats['count'], stats['total']) for name, stats in metrics.phases.items()]
+    if not phases:
+        return
+    now = time.time()
+    try:
+        with transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO deploy_steps (run_id, command, step, runs, total_seconds, recorded_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)', [(run_id, command, name, runs, total, now) for name, runs, total in phases])
+    except sqlite3.Error as e:
+        logger.warning(f"Could not record the step timings: {e}")
+
+
+def activation_stats(days=30):
+    """Count, failures and p50/p95/max duration of the activations of the last `days` days, per network."""
+    since = time.time() - days * 86400
+    rows = get_connection().execute(
+        'SELECT network, status, duration FROM activation_history WHERE submitted_at >= ? AND finished_at IS NOT NULL',
+        (since,)).fetchall()
+    stats = {}
+    for network in sorted({row['network'] for row in rows}):
+        durations = [row['duration'] for row in rows if row['network'] == network and row['status'] == 'ACTIVE']
+        stats[network] = {
+            'activations': sum(1 for row in rows if row['network'] == network),
+            'failed': sum(1 for row in rows if row['network'] == network and row['status'] != 'ACTIVE'),
+            'p50': percentile(durations, 0.50),
+            'p95': percentile(durations, 0.95),
+            'max': max(durations, default=0.0),
+        }
+    return stats
+
+
+def progress_stats(days=30):
+    """Median seconds from submission until each status was first seen, per network."""
+    since = time.time() - days * 86400
+    rows = get_connection().execute(
+        'SELECT h.network, e.status, e.seen_at - h.submitted_at AS elapsed FROM activation_events e '
+        'JOIN activation_history h ON h.activation_id = e.activation_id '
+        'WHERE h.submitted_at >= ? AND h.status = ?', (since, 'ACTIVE')).fetchall()
+    progress = {}
+    for row in rows:
+        progress.setdefault(row['network'], {}).setdefault(row['status'], []).append(max(row['elapsed'], 0.0))
+    return {network: {status: percentile(statuses[status], 0.50)
+                      for status in PROGRESS_STATUSES if status in statuses}
+            for network, statuses in sorted(progress.items())}
+
+
+def trend(days=30, bucket='week'):
+    """Successful activations and their p50/p95 duration per network and day or week, oldest first."""
+    size = BUCKETS[bucket]
+    since = time.time() - days * 86400
+    rows = get_connection().execute(
+        'SELECT network, submitted_at, duration FROM activation_history '
+        'WHERE submitted_at >= ? AND status = ? ORDER BY submitted_at', (since, 'ACTIVE')).fetchall()
+    buckets = {}
+    for row in rows:
+        start = int(row['submitted_at'] // size * size)
+        buckets.setdefault((row['network'], start), []).append(row['duration'])
+    return [{'network': network, 'start': start, 'activations': len(durations),
+             'p50': percentile(durations, 0.50), 'p95': percentile(durations, 0.95)}
+            for (network, start), durations in sorted(buckets.items())]
+
+
+def step_stats(days=30):
+    """p50/p95 seconds per run of every deploy step."""
+    since = time.time() - days * 86400
+    rows = get_connection().execute('SELECT step, runs, total_seconds FROM deploy_steps WHERE recorded_at >= ?',
+                                    (since,)).fetchall()
+    steps = {}
+    for row in rows:
+        steps.setdefault(row['step'], []).append(row['total_seconds'] / row['runs'])
+    return {step: {'runs': len(seconds), 'p50': percentile(seconds, 0.50), 'p95': percentile(seconds, 0.95)}
+            for step, seconds in sorted(steps.items(), key=lambda item: -sum(item[1]))}
+
+
+def history(property_name=None, limit=20):
+    """The most recent activations, optionally of one property (by name or ID)."""
+    query = 'SELECT * FROM activation_history'
+    params = []
+    if property_name:
+        query += ' WHERE property_name = ? OR property_id = ?'
+        params = [property_name, property_name]
+    return get_connection().execute(query + ' ORDER BY submitted_at DESC LIMIT ?', params + [limit]).fetchall()
+
+
+def _minutes(seconds):
+    return f"{seconds / 60:.1f}m"
+
+
+def print_report(days=30, bucket='week'):
+    """Print activation latency per network, the time to reach each status, the trend and the step timings."""
+    stats = activation_stats(days)
+    if not stats:
+        print(f"No activations recorded in the last {days} days.")
+        return
+
+    print(f"Activations in the last {days} days")
+    print(f"{'network':<12} {'count':>6} {'failed':>6} {'p50':>8} {'p95':>8} {'max':>8}")
+    for network, network_stats in stats.items():
+        print(f"{network:<12} {network_stats['activations']:>6} {network_stats['failed']:>6} "
+              f"{_minutes(network_stats['p50']):>8} {_minutes(network_stats['p95']):>8} "
+              f"{_minutes(network_stats['max']):>8}")
+
+    print("\nMedian time from submission until each status was first seen")
+    for network, statuses in progress_stats(days).items():
+        print(f"{network:<12} " + '  '.join(f"{status} {_minutes(seconds)}" for status, seconds in statuses.items()))
+
+    print(f"\nTrend per {bucket}")
+    print(f"{'network':<12} {'from':<10} {'count':>6} {'p50':>8} {'p95':>8}")
+    for row in trend(days, bucket):
+        print(f"{row['network']:<12} {datetime.fromtimestamp(row['start']).strftime('%Y-%m-%d'):<10} "
+              f"{row['activations']:>6} {_minutes(row['p50']):>8} {_minutes(row['p95']):>8}")
+
+    steps = step_stats(days)
+    if steps:
+        print("\nDeploy steps")
+        print(f"{'step':<32} {'runs':>5} {'p50 s':>8} {'p95 s':>8}")
+        for step, step_data in steps.items():
+            print(f"{step:<32} {step_data['runs']:>5} {step_data['p50']:>8.1f} {step_data['p95']:>8.1f}")
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    options = {}
+    args = []
+    iterator = iter(argv)
+    for arg in iterator:
+        if arg.startswith('--'):
+            options[arg] = next(iterator, '')
+        else:
+            args.append(arg)
+
+    if (not args or args[0] not in ('report', 'history') or set(options) - {'--days', '--bucket', '--limit'}
+            or options.get('--bucket', 'week') not in BUCKETS):
+        print("Usage: python3 activation_metrics.py report [--days 30] [--bucket day|week]")
+        print("       python3 activation_metrics.py history [<propertyName|propertyId>] [--limit 20]")
+        exit(1)
+
+    try:
+        if args[0] == 'report':
+            print_report(int(options.get('--days', 30)), options.get('--bucket', 'week'))
+        else:
+            for row in history(args[1] if len(args) > 1 else None, int(options.get('--limit', 20))):
+                duration = _minutes(row['duration']) if row['duration'] is not None else '-'
+                print(f"{datetime.fromtimestamp(row['submitted_at']).strftime('%Y-%m-%d %H:%M')} "
+                      f"{row['activation_id']:<16} {row['property_name'] or row['property_id']:<40} "
+                      f"v{row['property_version']} {row['network']:<10} {row['status']:<12} {duration}")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
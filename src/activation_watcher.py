@@ -0,0 +1,166 @@
+import asyncio
+import random
+import sys
+import time
+from credentials import load_switch_key
+from papi_client import client, retry_after_seconds
+from activation_metrics import record_status
+
+FINAL_STATUSES = ('ACTIVE', 'FAILED', 'ABORTED', 'DEACTIVATED')
+
+INITIAL_INTERVAL = 15   # First poll comes quickly; small changes often finish in a few minutes
+MAX_INTERVAL = 120      # Never wait longer than this between two polls
+BACKOFF_FACTOR = 1.5    # Growth of the interval after every non-final poll
+JITTER = 0.2            # +/- 20% so many watchers don't poll in lockstep
+MAX_CONSECUTIVE_ERRORS = 10
+
+
+def next_interval(interval):
+    """Return the base interval for the poll after the given one."""
+    return min(interval * BACKOFF_FACTOR, MAX_INTERVAL)
+
+
+def jittered(interval):
+    """Spread an interval by +/- JITTER."""
+    return interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+def fetch_activation(propertyId, activationId, contractId, groupId, ASK):
+    """Fetch a single activation from PAPI and return the raw response."""
+    query_params = {
+        'contractId': contractId,
+        'groupId': groupId,
+        'accountSwitchKey': ASK,
+    }
+
+    return client.get(f"/papi/v1/properties/{propertyId}/activations/{activationId}", params=query_params)
+
+
+async def watch_activation(ASK, activation, timeout=None):
+    """
+    Poll one activation until it reaches a final status.
+
+    Args:
+        ASK (str): The account switch key.
+        activation (dict): Must contain propertyId, activationId, contractId and groupId.
+        timeout (float): Give up after this many seconds. None waits forever.
+
+    Returns:
+        str: The final status, 'TIMEOUT' or 'ERROR'.
+    """
+    activation_id = activation['activationId']
+    deadline = None if timeout is None else time.monotonic() + timeout
+    interval = INITIAL_INTERVAL
+    errors = 0
+    last_status = None
+
+    while True:
+        try:
+            response = await asyncio.to_thread(fetch_activation, activation['propertyId'], activation_id,
+                                               activation['contractId'], activation['groupId'], ASK)
+        except Exception as e:
+            # Connection errors that outlast the client's retries count as one failed poll
+            response = None
+            print(f"Error while checking activation {activation_id}: {e}")
+        delay = jittered(interval)
+        items = response.json().get('activations', {}).get('items', []) \
+            if response is not None and response.status_code == 200 else []
+
+        if items:
+            errors = 0
+            item = items[0]
+            status = item['status']
+            if status != last_status or status in FINAL_STATUSES:
+                # Keep the first time each status is seen and the final duration for activation_metrics.py
+                record_status(item, activation['propertyId'])
+            if status in FINAL_STATUSES:
+                print(f"Activation {activation_id} finished with status {status}.")
+                return status
+            if status != last_status:
+                print(f"Activation {activation_id} status: {status}")
+                last_status = status
+            interval = next_interval(interval)
+        else:
+            errors += 1
+            if response is not None:
+                print(f"Error while checking activation {activation_id}: {response.status_code}")
+            if errors >= MAX_CONSECUTIVE_ERRORS:
+                return 'ERROR'
+
+        requested = retry_after_seconds(response) if response is not None else None
+        if requested is not None:
+            delay = max(delay, requested)
+
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return 'TIMEOUT'
+            delay = min(delay, remaining)
+
+        await asyncio.sleep(delay)
+
+
+async def watch_activations(ASK, activations, timeout=None):
+    """
+    Poll many activations concurrently and return a dict of activationId -> final status.
+
+    A watch that fails with an exception reports 'ERROR' without stopping the others.
+    """
+    statuses = await asyncio.gather(*(watch_activation(ASK, activation, timeout) for activation in activations),
+                                    return_exceptions=True)
+    return {activation['activationId']: 'ERROR' if isinstance(status, Exception) else status
+            for activation, status in zip(activations, statuses)}
+
+
+def wait_for_activations(ASK, activations, timeout=None):
+    """Blocking wrapper around watch_activations for synchronous callers."""
+    return asyncio.run(watch_activations(ASK, activations, timeout))
+
+
+def wait_for_activation(ASK, propertyId, activationId, contractId, groupId, timeout=None):
+    """Block until a single activation reaches a final status and return it."""
+    activation = {
+        'propertyId': propertyId,
+        'activationId': activationId,
+        'contractId': contractId,
+        'groupId': groupId,
+    }
+    return asyncio.run(watch_activation(ASK, activation, timeout))
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    if len(argv) < 3:
+        print("Usage: python3 activation_watcher.py <contractId> <groupId> <propertyId:activationId> "
+              "[<propertyId:activationId> ...]")
+        exit(1)
+
+    contractId, groupId = argv[0], argv[1]
+
+    try:
+        switch_key_data = load_switch_key()
+        if switch_key_data is None:
+            raise Exception("No switch key found. Exiting.")
+        ASK = switch_key_data['switch_key']
+
+        activations = []
+        for pair in argv[2:]:
+            propertyId, activationId = pair.split(':', 1)
+            activations.append({'propertyId': propertyId, 'activationId': activationId,
+                                'contractId': contractId, 'groupId': groupId})
+
+        results = wait_for_activations(ASK, activations)
+        for activationId, status in results.items():
+            print(f"{activationId}: {status}")
+
+        exit(0 if all(status == 'ACTIVE' for status in results.values()) else 1)
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
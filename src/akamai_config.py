@@ -0,0 +1,73 @@
+import atexit
+import importlib
+import os
+import sys
+
+# Subcommand -> (module, description). Modules are only imported when their subcommand runs,
+# so `akamai_config.py --help` and usage errors never load requests, edgegrid or .edgerc.
+COMMANDS = {
+    'deploy': ('deploy', 'Run the whole deployment of a property in one process'),
+    'search': ('property_search', 'Search for a property and save its rule tree and state'),
+    'catalog': ('property_catalog', 'Sync or query the local catalog of properties and hostnames'),
+    'create-version': ('create_a_new_property_version', 'Create a new version of the current property'),
+    'update-rules': ('update_property_rule_tree', 'Push the local rule tree to the current property version'),
+    'activate': ('activate_on_akamai', 'Activate the latest version on staging or production'),
+    'watch': ('activation_watcher', 'Watch one or more activations until they finish'),
+    'activations': ('activation_metrics', 'Report activation times per network and their trend'),
+    'rollback': ('rollback', 'Put the last known-good version back live, with fast fallback when possible'),
+    'daemon': ('deploy_daemon', 'Serve deploy requests, coalescing bursts into one deployment per property'),
+    'bulk-deploy': ('bulk_deploy', 'Deploy many properties concurrently from a manifest'),
+    'impact': ('change_impact', 'List the properties a git range changed, as a bulk deploy manifest'),
+    'smoke-test': ('smoke_test', 'Smoke test hostnames x paths x edge servers concurrently'),
+    'warm': ('cache_warmer', 'Warm the edge cache from a URL list or access log'),
+    'diff': ('rule_tree_diff', 'Print the JSON Patch between two rule tree files'),
+    'hash': ('rule_tree_hash', 'Print the content hash of a rule tree file'),
+    'simulate': ('rule_tree_simulator', 'Show which rules and behaviors apply to sample URLs, offline'),
+    'optimize': ('rule_tree_optimizer', 'Fold redundant rules and behaviors and report the size saved'),
+    'stream': ('rule_tree_stream', 'Re-indent a rule tree file with bounded memory'),
+    'validate': ('rule_tree_validation', 'Validate the local rule tree locally and with a PAPI dry run'),
+    'templates': ('rule_tree_templates', 'Render rule trees from templates and list the users of snippets'),
+    'state': ('state_store', 'Import or show the local property state'),
+    'switch-key': ('credentials', 'Prefetch, list or select account switch keys'),
+}
+
+
+def print_usage():
+    """Print the list of subcommands."""
+    print("Usage: python3 akamai_config.py [--account <name|id>] <command> [arguments]")
+    print()
+    print("Commands:")
+    for name, (_, description) in COMMANDS.items():
+        print(f"  {name:<16} {description}")
+
+
+def main(argv=None):
+    """Dispatch to the subcommand's module, importing only that module."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    # --account <name|id> selects the account switch key for this run only
+    if len(argv) > 1 and argv[0] == '--account':
+        os.environ['AKAMAI_ACCOUNT'] = argv[1]
+        argv = argv[2:]
+
+    if not argv or argv[0] in ('-h', '--help', 'help'):
+        print_usage()
+        exit(0 if argv else 1)
+
+    command = argv[0]
+    if command not in COMMANDS:
+        print(f"Unknown command: {command}")
+        print_usage()
+        exit(1)
+
+    # AKAMAI_TIMING_SUMMARY=1 prints the per-phase and per-endpoint timings of any command on exit
+    if os.getenv('AKAMAI_TIMING_SUMMARY') == '1':
+        from instrumentation import metrics
+        atexit.register(metrics.print_summary)
+
+    module = importlib.import_module(COMMANDS[command][0])
+    module.main(argv[1:])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from credentials import load_switch_key
+from papi_client import client
+from create_a_new_property_version import create_or_reuse_version
+from update_property_rule_tree import load_snapshot, prepare_rule_tree, push_rule_tree, remove_snapshot
+from rule_tree_hash import is_already_active, get_active_version
+from activate_on_akamai import activate_on_akamai
+from activation_watcher import wait_for_activation
+from instrumentation import metrics, phase
+from activation_metrics import record_steps
+from rollback import mark_known_good, known_good_versions
+from cache_warmer import WARM_URLS, warm_after_activation
+from state_store import load_version_hash, save_relevant_data, save_version_hash
+from rule_tree_validation import DRY_RUN, validate_rule_tree, validate_on_server
+from smoke_test import run_smoke_test
+
+DEFAULT_MAX_WORKERS = 10
+
+# Order of the networks when a property is rolled out to both ('both')
+PIPELINE_NETWORKS = ['staging', 'production']
+
+MANIFEST_FIELDS = ['propertyName', 'propertyId', 'propertyVersion', 'contractId', 'groupId', 'etag']
+
+
+def load_manifest(manifest_path):
+    """
+    Load the list of properties to deploy from a JSON manifest.
+
+    The manifest is a JSON list where each entry carries the same fields that
+    property_search.py saves to the state store for a single property.
+    """
+    with open(manifest_path, 'r') as manifest_file:
+        manifest = json.load(manifest_file)
+
+    if not isinstance(manifest, list):
+        raise Exception(f"Manifest '{manifest_path}' must contain a JSON list of properties.")
+
+    for index, entry in enumerate(manifest):
+        missing = [field for field in MANIFEST_FIELDS if field not in entry]
+        if missing:
+            raise Exception(f"Manifest entry {index} is missing required fields: {', '.join(missing)}")
+
+    return manifest
+
+
+def activate_and_wait(ASK, entry, version, network):
+    """Activate the version on the network and wait until the activation finishes."""
+    with phase(f'activate-{network.lower()}'):
+        activation_id = activate_on_akamai(ASK, entry['propertyId'], version,
+                                           entry['contractId'], entry['groupId'], network)
+    if activation_id is None:
+        raise Exception(f"Activation on {network.upper()} network was rejected.")
+
+    with phase(f'poll-activation-{network.lower()}'):
+        status = wait_for_activation(ASK, entry['propertyId'], activation_id, entry['contractId'], entry['groupId'])
+    if status != 'ACTIVE':
+        raise Exception(f"Activation on {network.upper()} network ended with status {status}.")
+
+
+def make_pipeline(max_workers, staging_slots=None, production_slots=None, halt_on_failure=False):
+    """
+    Shared gates of one bulk run.
+
+    Each network gets a semaphore that bounds how many activations are in flight on
+    it at once, and `halt` stops properties from starting new activations once any
+    property failed (when halt_on_failure is set).
+    """
+    return {
+        'slots': {'staging': threading.Semaphore(staging_slots or max_workers),
+                  'production': threading.Semaphore(production_slots or max_workers)},
+        'halt': threading.Event(),
+        'halt_on_failure': halt_on_failure,
+    }
+
+
+def write_version(ASK, entry, local_tree, snapshot, local_hash, result):
+    """Validate the rule tree and write it to a new or reused editable version; returns the version."""
+    result['step'] = 'validate'
+    with phase('validate'):
+        validate_rule_tree(ASK, entry['propertyId'], entry['propertyVersion'], entry['contractId'],
+                           entry['groupId'], local_tree if local_tree is not None else load_snapshot(snapshot))
+
+    result['step'] = 'create-version'
+    with phase('create-version'):
+        new_version, etag = create_or_reuse_version(ASK, entry['propertyId'], entry['propertyVersion'],
+                                                    entry['contractId'], entry['groupId'], entry['etag'])
+    result['propertyVersion'] = new_version
+    if DRY_RUN:
+        result['step'] = 'dry-run'
+        with phase('dry-run'):
+            validate_on_server(ASK, entry['propertyId'], new_version, entry['contractId'], entry['groupId'],
+                               local_tree if local_tree is not None else load_snapshot(snapshot))
+    result['step'] = 'update-rules'
+    with phase('update-rules'):
+        response = push_rule_tree(ASK, entry['propertyId'], new_version,
+                                  entry['contractId'], entry['groupId'], entry['propertyName'], local_tree,
+                                  snapshot)
+    if response is not None and response.status_code != 200:
+        raise Exception(f"Rule tree update failed. Status code: {response.status_code}")
+    if response is not None:
+        etag = response.json().get('etag', etag)
+    if entry.get('accountId'):
+        # Manifests built by change_impact.py identify the property, so the next run starts from this version
+        save_relevant_data({'accountId': entry['accountId'], 'propertyId': entry['propertyId'],
+                            'propertyName': entry['propertyName'], 'contractId': entry['contractId'],
+                            'groupId': entry['groupId'], 'propertyVersion': new_version, 'etag': etag,
+                            'rulesHash': local_hash})
+    save_version_hash(entry.get('accountId'), entry['propertyId'], new_version, local_hash)
+    return new_version
+
+
+def deploy_property(ASK, entry, network, pipeline=None):
+    """
+    Run validate, create-version, update-rules, activate and smoke test for a single manifest entry.
+
+    With network 'both' the property is pipelined through staging activation, staging
+    smoke test, production activation and production smoke test. Properties run in
+    separate workers, so one property's production activation overlaps the next
+    one's staging activation, within the per-network slots of the pipeline.
+    """
+    pipeline = pipeline or make_pipeline(1)
+    network = network.lower() if network else None
+    result = {
+        'propertyName': entry['propertyName'],
+        'propertyId': entry['propertyId'],
+        'propertyVersion': None,
+        'status': 'FAILED',
+        'step': None,
+        'error': None,
+    }
+    start = time.monotonic()
+    snapshot = None
+
+    try:
+        result['step'] = 'compare-hash'
+        # A rule tree above STREAM_THRESHOLD is kept as a snapshot file and streamed instead
+        local_tree, snapshot, local_hash = prepare_rule_tree(entry['propertyName'])
+        networks = [network] if network not in (None, 'both') else ['STAGING', 'PRODUCTION']
+        with phase('compare-hash'):
+            unchanged = all(is_already_active(ASK, entry['propertyId'], entry['contractId'], entry['groupId'], n,
+                                              local_hash) for n in networks)
+        if unchanged:
+            result['status'] = 'UNCHANGED'
+            result['step'] = 'done'
+            result['duration'] = round(time.monotonic() - start, 1)
+            return result
+
+        if load_version_hash(entry['propertyId'], entry['propertyVersion']) == local_hash:
+            # An earlier run already wrote this rule tree to the version; resume with its activations
+            resumed = True
+            new_version = result['propertyVersion'] = entry['propertyVersion']
+            print(f"{entry['propertyName']}: version {new_version} already holds the rule tree; resuming.")
+        else:
+            resumed = False
+            new_version = write_version(ASK, entry, local_tree, snapshot, local_hash, result)
+
+        for target in (PIPELINE_NETWORKS if network == 'both' else [network] if network else []):
+            if resumed and new_version in known_good_versions(entry['propertyId'], target) and get_active_version(
+                    ASK, entry['propertyId'], entry['contractId'], entry['groupId'], target) == new_version:
+                print(f"{entry['propertyName']}: version {new_version} is already live and known-good on "
+                      f"{target.upper()}.")
+                continue
+
+            result['step'] = f'activate-{target}'
+            with pipeline['slots'][target]:
+                # Checked once the slot is ours, so a property that waited for it does not activate after a failure
+                if pipeline['halt'].is_set():
+                    raise Exception("Halted before activation because another property failed.")
+                try:
+                    activate_and_wait(ASK, entry, new_version, target)
+                except Exception:
+                    # Halt before the slot is released, so the property waiting for it sees the failure
+                    if pipeline['halt_on_failure']:
+                        pipeline['halt'].set()
+                    raise
+
+            result['step'] = f'smoke-test-{target}'
+            with phase(f'smoke-test-{target}'):
+                if not all(run_smoke_test(hostname, target) for hostname in get_hostnames(entry)):
+                    raise Exception(f"Smoke test on {target.upper()} network failed.")
+            mark_known_good(entry['propertyId'], target, new_version)
+
+            if target == 'production' and WARM_URLS:
+                # Warm-up problems are reported but never fail the rollout
+                result['step'] = 'warm-cache'
+                with phase('warm-cache'):
+                    warm_after_activation(get_hostnames(entry))
+
+        result['status'] = 'SUCCESS'
+        result['step'] = 'done'
+    except (Exception, SystemExit) as e:
+        # The rule tree helpers exit when the rule tree file is missing; keep the other workers running.
+        result['error'] = str(e) or e.__class__.__name__
+        if pipeline['halt_on_failure']:
+            pipeline['halt'].set()
+    finally:
+        remove_snapshot(snapshot)
+
+    result['duration'] = round(time.monotonic() - start, 1)
+    return result
+
+
+def get_hostnames(entry):
+    """Hostnames to smoke test for a manifest entry (`hostnames`, defaulting to the property name)."""
+    return entry.get('hostnames') or [entry['propertyName']]
+
+
+def run_bulk_deploy(ASK, manifest, network, max_workers=DEFAULT_MAX_WORKERS, staging_slots=None,
+                    production_slots=None, halt_on_failure=False):
+    """Deploy every property in the manifest concurrently using a bounded worker pool."""
+    # Size the shared connection pool so every worker can keep a connection alive
+    if client.pool_size < max_workers:
+        client.resize_pool(max_workers)
+    pipeline = make_pipeline(max_workers, staging_slots, production_slots, halt_on_failure)
+    results = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(deploy_property, ASK, entry, network, pipeline): entry for entry in manifest}
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"[{result['status']}] {result['propertyName']} "
+                  f"(step: {result['step']}, {result['duration']}s)"
+                  + (f": {result['error']}" if result['error'] else ""))
+            results.append(result)
+
+    return results
+
+
+def print_report(results):
+    """Print a per-property summary of the bulk deployment."""
+    succeeded = [r for r in results if r['status'] == 'SUCCESS']
+    unchanged = [r for r in results if r['status'] == 'UNCHANGED']
+    failed = [r for r in results if r['status'] == 'FAILED']
+
+    print(f"\nBulk deploy finished: {len(succeeded)} succeeded, {len(unchanged)} unchanged, {len(failed)} failed.")
+    for result in sorted(results, key=lambda r: r['propertyName']):
+        line = f"  {result['propertyName']:<50} {result['status']:<9} version={result['propertyVersion']}"
+        if result['error']:
+            line += f" failed at {result['step']}: {result['error']}"
+        print(line)
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    options = {}
+    args = []
+    iterator = iter(argv)
+    for arg in iterator:
+        if arg == '--halt-on-failure':
+            options[arg] = True
+        elif arg.startswith('--'):
+            options[arg] = next(iterator, '')
+        else:
+            args.append(arg)
+
+    if len(args) < 2 or set(options) - {'--staging-slots', '--production-slots', '--halt-on-failure'}:
+        print("Usage: python3 bulk_deploy.py <manifest.json> <staging|production|both|none> [max_workers] "
+              "[--staging-slots N] [--production-slots N] [--halt-on-failure]")
+        print("Example: python3 bulk_deploy.py properties.json staging 20")
+        print("Example: python3 bulk_deploy.py properties.json both 20 --production-slots 5 --halt-on-failure")
+        exit(1)
+
+    manifest_path = args[0]
+    network = args[1].lower()
+    max_workers = int(args[2]) if len(args) > 2 else DEFAULT_MAX_WORKERS
+
+    if network not in ['staging', 'production', 'both', 'none']:
+        print(f"Invalid network: {network}. Use 'staging', 'production', 'both' or 'none'.")
+        exit(1)
+
+    try:
+        switch_key_data = load_switch_key()
+        if switch_key_data is None:
+            raise Exception("No switch key found. Exiting.")
+        ASK = switch_key_data['switch_key']
+
+        manifest = load_manifest(manifest_path)
+        print(f"Deploying {len(manifest)} properties with {max_workers} workers.")
+
+        results = run_bulk_deploy(ASK, manifest, None if network == 'none' else network, max_workers,
+                                  int(options.get('--staging-slots', 0)) or None,
+                                  int(options.get('--production-slots', 0)) or None,
+                                  options.get('--halt-on-failure', False))
+        print_report(results)
+        metrics.print_summary()
+        record_steps('bulk-deploy')
+
+        exit(0 if all(r['status'] != 'FAILED' for r in results) else 1)
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+import asyncio
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from requests import Session
+from requests.adapters import HTTPAdapter
+from instrumentation import percentile
+from papi_client import TokenBucket
+from smoke_test import PRAGMA_DEBUG, resolve_edge_ips
+
+# AKAMAI_WARM_URLS names a URL list or access log; deploys then warm the production cache after activating
+WARM_URLS = os.getenv('AKAMAI_WARM_URLS')
+WARM_TOP = int(os.getenv('AKAMAI_WARM_TOP', '1000'))
+WARM_RATE = float(os.getenv('AKAMAI_WARM_RATE', '50'))          # Requests per second
+WARM_CONCURRENCY = int(os.getenv('AKAMAI_WARM_CONCURRENCY', '20'))
+DEFAULT_TIMEOUT = 30
+
+# The request line and status of a common or combined log format entry
+LOG_REQUEST = re.compile(r'"([A-Z]+) (\S+) HTTP/[\d.]+" (\d{3})')
+
+# Warm the compressed variant browsers ask for
+WARM_HEADERS = {'Accept-Encoding': 'gzip, deflate, br', 'Pragma': PRAGMA_DEBUG}
+
+
+def load_urls(path, hostname=None, top=WARM_TOP):
+    """
+    Read the URLs to warm from a file.
+
+    The file is either a list of URLs, one per line, or an access log in common or
+    combined format, from which the `top` most requested GET paths with a 2xx/304
+    response are taken and prefixed with https://<hostname>.
+    """
+    urls = []
+    paths = Counter()
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            match = LOG_REQUEST.search(line)
+            if match:
+                method, request_path, status = match.groups()
+                if method in ('GET', 'HEAD') and (status.startswith('2') or status == '304'):
+                    paths[request_path] += 1
+            else:
+                urls.append(line)
+
+    if paths:
+        if not hostname:
+            raise Exception(f"{path} is an access log; pass the hostname to warm its paths on.")
+        urls.extend(f'https://{hostname}{p}' for p, _ in paths.most_common(top))
+    return list(dict.fromkeys(urls))[:top]
+
+
+def build_targets(urls, edge_ips=None, resolve_network=None):
+    """
+    Map every URL to the request that warms it.
+
+    By default the URL itself is fetched. With edge_ips, or the edge servers the
+    hostname resolves to on `resolve_network`, every edge server is warmed directly
+    with the hostname in the Host header.
+    """
+    resolved = {}
+    targets = []
+    for url in urls:
+        parts = urlsplit(url)
+        hostname = parts.hostname
+        path = parts.path or '/'
+        if parts.query:
+            path += f'?{parts.query}'
+
+        ips = edge_ips
+        if not ips and resolve_network:
+            if hostname not in resolved:
+                resolved[hostname] = resolve_edge_ips(hostname, resolve_network)
+            ips = resolved[hostname]
+        if ips:
+            targets.extend({'url': url, 'hostname': hostname, 'target': f'http://{ip}{path}'} for ip in ips)
+        else:
+            targets.append({'url': url, 'hostname': hostname, 'target': url})
+    return targets
+
+
+def make_session(pool_size):
+    session = Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch(session, bucket, target, timeout=DEFAULT_TIMEOUT):
+    """Fetch one target at the allowed rate, read the body so the edge caches it, and report the cache status."""
+    bucket.acquire()
+    result = {'url': target['url'], 'target': target['target'], 'status': None, 'cache': None,
+              'seconds': None, 'error': None}
+    start = time.monotonic()
+    try:
+        with session.get(target['target'], headers=dict(WARM_HEADERS, Host=target['hostname']), timeout=timeout,
+                         allow_redirects=False, stream=True) as response:
+            for _ in response.iter_content(65536):
+                pass
+            result['status'] = response.status_code
+            result['cache'] = (response.headers.get('X-Cache') or '').split(' ')[0] or None
+    except Exception as e:
+        result['error'] = str(e) or e.__class__.__name__
+    result['seconds'] = time.monotonic() - start
+    return result
+
+
+def summarize(results):
+    """Hit and miss counts, hit ratio, errors and latency percentiles of the warm-up requests."""
+    cache = Counter(r['cache'] for r in results if r['cache'])
+    hits = sum(count for status, count in cache.items() if 'HIT' in status)
+    misses = sum(count for status, count in cache.items() if 'HIT' not in status)
+    latencies = [r['seconds'] for r in results if r['error'] is None]
+    return {
+        'requests': len(results),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+        'errors': sum(1 for r in results if r['error'] or (r['status'] or 0) >= 400),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'cache': dict(cache),
+    }
+
+
+def _print_progress(results, total):
+    summary = summarize(results)
+    print(f"Warmed {len(results)}/{total}: hit {summary['hit_ratio']:.0%}, {summary['misses']} misses, "
+          f"{summary['errors']} errors, p50 {summary['p50_ms']:.0f} ms")
+
+
+async def warm(targets, concurrency=WARM_CONCURRENCY, rate=WARM_RATE, timeout=DEFAULT_TIMEOUT, progress_every=100):
+    """
+    Fetch the targets concurrently, at most `concurrency` at a time and `rate` per second.
+
+    A progress line with the hit ratio so far is printed every `progress_every` requests.
+    """
+    session = make_session(concurrency)
+    bucket = TokenBucket(rate, max(1, int(rate)))
+    results = []
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = [loop.run_in_executor(executor, fetch, session, bucket, target, timeout) for target in targets]
+        for future in asyncio.as_completed(pending):
+            results.append(await future)
+            if progress_every and len(results) % progress_every == 0 and len(results) < len(targets):
+                _print_progress(results, len(targets))
+    return results
+
+
+def warm_urls(urls, edge_ips=None, resolve_network=None, concurrency=WARM_CONCURRENCY, rate=WARM_RATE,
+              timeout=DEFAULT_TIMEOUT):
+    """Blocking wrapper: warm the URLs and return the per-request results."""
+    return asyncio.run(warm(build_targets(urls, edge_ips, resolve_network), concurrency, rate, timeout))
+
+
+def print_report(results):
+    summary = summarize(results)
+    cache = ', '.join(f"{status} {count}" for status, count in sorted(summary['cache'].items())) or 'n/a'
+    print(f"Warmed {summary['requests']} URLs: hit ratio {summary['hit_ratio']:.0%} "
+          f"({summary['hits']} hits, {summary['misses']} misses), {summary['errors']} errors, "
+          f"p50 {summary['p50_ms']:.0f} ms, p95 {summary['p95_ms']:.0f} ms, cache: {cache}")
+    for result in results:
+        if result['error']:
+            print(f"FAILED {result['target']} (Host: {urlsplit(result['url']).hostname}): {result['error']}")
+
+
+def warm_after_activation(hostnames):
+    """
+    Warm the production cache for the hostnames with the URLs of AKAMAI_WARM_URLS.
+
+    Only URLs on the hostnames are fetched. Returns the summary, or None when no URL
+    list is configured or the warm-up could not run; a warm-up never fails a deploy.
+    """
+    if not WARM_URLS:
+        return None
+    try:
+        urls = [url for url in load_urls(WARM_URLS, hostnames[0]) if urlsplit(url).hostname in hostnames]
+        if not urls:
+            print(f"No URL in {WARM_URLS} is on {', '.join(hostnames)}; skipping the cache warm-up.")
+            return None
+        results = warm_urls(urls)
+    except Exception as e:
+        print(f"Cache warm-up failed: {e}")
+        return None
+    print_report(results)
+    return summarize(results)
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    options = {}
+    args = []
+    iterator = iter(argv)
+    for arg in iterator:
+        if arg.startswith('--'):
+            options[arg] = next(iterator, '')
+        else:
+            args.append(arg)
+
+    allowed = {'--hostname', '--top', '--edge-ips', '--resolve', '--concurrency', '--rate', '--timeout'}
+    if len(args) != 1 or set(options) - allowed or options.get('--resolve', 'production') not in ('staging',
+                                                                                                   'production'):
+        print("Usage: python3 cache_warmer.py <urls.txt|access.log> [--hostname H] [--top N] "
+              "[--edge-ips IP,IP:port | --resolve staging|production] [--concurrency N] [--rate R] [--timeout S]")
+        print("Example: python3 cache_warmer.py urls.txt --rate 20")
+        print("Example: python3 cache_warmer.py access.log --hostname www.cyberabstract.com --top 500")
+        exit(1)
+
+    try:
+        urls = load_urls(args[0], options.get('--hostname'), int(options.get('--top', WARM_TOP)))
+        edge_ips = options['--edge-ips'].split(',') if options.get('--edge-ips') else None
+
+        start = time.monotonic()
+        results = warm_urls(urls, edge_ips, options.get('--resolve'),
+                            int(options.get('--concurrency', WARM_CONCURRENCY)),
+                            float(options.get('--rate', WARM_RATE)), float(options.get('--timeout', DEFAULT_TIMEOUT)))
+        print_report(results)
+        print(f"{len(results)} requests in {time.monotonic() - start:.1f}s")
+        exit(0 if summarize(results)['errors'] == 0 else 1)
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
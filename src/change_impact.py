@@ -0,0 +1,131 @@
+import json
+import os
+import subprocess
+import sys
+from state_store import load_relevant_data
+from rule_tree_templates import TEMPLATE_SUFFIX, get_rule_tree_dir, get_snippet_dir, render_all, affected_properties
+
+DEFAULT_RANGE = 'HEAD~1..HEAD'
+
+# The manifest fields bulk_deploy.py needs, plus accountId so its results can be saved back to the state store
+MANIFEST_FIELDS = ['accountId', 'propertyName', 'propertyId', 'propertyVersion', 'contractId', 'groupId', 'etag']
+
+
+def changed_files(diff_range=DEFAULT_RANGE):
+    """Return the paths added or changed in the git range, relative to the repository root."""
+    start = diff_range.split('..')[0]
+    if not start.strip('0'):
+        # A push that creates a branch has no "before" commit
+        diff_range = DEFAULT_RANGE
+    # A deleted rule tree file has nothing left to deploy
+    output = subprocess.run(['git', 'diff', '--name-only', '--diff-filter=d', diff_range], check=True,
+                            capture_output=True, text=True).stdout
+    return [line for line in output.splitlines() if line]
+
+
+def _relative_to(path, directory):
+    """The path relative to the directory, or None when it is outside of it."""
+    relative = os.path.relpath(os.path.abspath(path), os.path.abspath(directory))
+    return None if relative.startswith('..') else relative
+
+
+def impacted_properties(paths):
+    """
+    Map changed files to the names of the properties they affect.
+
+    A changed <name>.json or <name>.template.json affects that property; a changed
+    snippet affects every property whose template uses it, per the dependency index.
+    Other files affect nothing.
+    """
+    names = set()
+    snippets = []
+    for path in paths:
+        snippet = _relative_to(path, get_snippet_dir())
+        if snippet is not None:
+            snippets.append(snippet)
+            continue
+        if _relative_to(path, get_rule_tree_dir()) != os.path.basename(path):
+            continue
+        file_name = os.path.basename(path)
+        if file_name.endswith(TEMPLATE_SUFFIX):
+            names.add(file_name[:-len(TEMPLATE_SUFFIX)])
+        elif file_name.endswith('.json'):
+            names.add(file_name[:-len('.json')])
+
+    if snippets:
+        # Bring the dependency index up to date before reading it
+        render_all()
+        names.update(affected_properties(snippets))
+    return sorted(names)
+
+
+def build_manifest(names):
+    """
+    Build the bulk_deploy.py manifest for the properties from the state store.
+
+    Returns:
+        tuple: (manifest entries, names of properties without stored state)
+    """
+    manifest = []
+    unresolved = []
+    for name in names:
+        try:
+            relevant_data = load_relevant_data(name)
+        except Exception:
+            unresolved.append(name)
+            continue
+        manifest.append({field: relevant_data.get(field) for field in MANIFEST_FIELDS})
+    return manifest, unresolved
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    options = {}
+    args = []
+    iterator = iter(argv)
+    for arg in iterator:
+        if arg == '--names':
+            options[arg] = True
+        elif arg.startswith('--'):
+            options[arg] = next(iterator, '')
+        else:
+            args.append(arg)
+
+    if set(options) - {'--names', '--output'} or len(args) > 1 or options.get('--output') == '':
+        print("Usage: python3 change_impact.py [<range>] [--names] [--output <manifest.json>]")
+        print(f"  <range>   Git range to inspect (default {DEFAULT_RANGE})")
+        print("  --names   Print the impacted property names instead of a manifest")
+        print("  --output  Write the manifest to a file instead of stdout")
+        exit(1)
+
+    try:
+        diff_range = args[0] if args else DEFAULT_RANGE
+        names = impacted_properties(changed_files(diff_range))
+        print(f"{len(names)} properties impacted by {diff_range}.", file=sys.stderr)
+
+        if options.get('--names'):
+            for name in names:
+                print(name)
+            return
+
+        manifest, unresolved = build_manifest(names)
+        for name in unresolved:
+            print(f"No stored state for {name}; run property_search.py for it first.", file=sys.stderr)
+
+        if options.get('--output'):
+            with open(options['--output'], 'w') as outfile:
+                json.dump(manifest, outfile, indent=4)
+        else:
+            print(json.dumps(manifest, indent=4))
+
+        if unresolved:
+            exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
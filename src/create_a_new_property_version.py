@@ -1,53 +1,11 @@
-import os
-import pickle
-from credentials import load_switch_key, session, baseurl
-from urllib.parse import urljoin
+from credentials import load_switch_key
+from papi_client import client
+from state_store import load_relevant_data, save_relevant_data
+from rule_tree_hash import rules_hash, is_already_active
+from update_property_rule_tree import load_rule_tree
+from rule_tree_validation import DRY_RUN, validate_rule_tree, validate_on_server
 import re
-
-def get_property_pkl_file():
-    """Get the file path of the property pickle file."""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(current_dir, 'property_fields.pkl')
-
-
-def load_relevant_data_from_pkl():
-    """Load the relevant data for the property from the pickle file."""
-    pkl_file_path = get_property_pkl_file()
-
-    if not os.path.exists(pkl_file_path):
-        raise FileNotFoundError(f"Pickle file '{pkl_file_path}' not found for the property.")
-
-    try:
-        with open(pkl_file_path, 'rb') as pklfile:
-            relevant_data = pickle.load(pklfile)
-        return relevant_data
-    except pickle.UnpicklingError as e:
-        raise Exception(f"Error while unpickling the file: {e}")
-
-
-def save_relevant_data_to_pkl(new_data):
-    """Save the updated relevant data to the pickle file."""
-
-    print('inside save_relevant.....', new_data)
-    try:
-        existing_data = load_relevant_data_from_pkl()
-        print(f"Existing data before update: {existing_data}")
-
-        # Update the existing data with the new data
-        existing_data.update(new_data)
-
-        # Save the updated data back to the pickle file
-        with open(get_property_pkl_file(), 'wb') as pklfile:
-            pickle.dump(existing_data, pklfile)
-
-        print(f"New data: {new_data} saved to {get_property_pkl_file()}")
-        new_data = load_relevant_data_from_pkl()
-        print(f"New data after update: {new_data}")
-
-
-    except Exception as e:
-        print(f"Failed to save data to the pickle file: {e}")
-
+import sys
 
 def create_new_version(ASK, propertyId, propertyVersion, contractId, groupId, etag):
     """Create a new property version using the Akamai PAPI API."""
@@ -62,14 +20,7 @@ def create_new_version(ASK, propertyId, propertyVersion, contractId, groupId, et
         'groupId': groupId
     }
 
-    headers = {
-        "accept": "application/json",
-        "PAPI-Use-Prefixes": "false",
-        "content-type": "application/json"
-    }
-
-    url = urljoin(baseurl, f'/papi/v1/properties/{propertyId}/versions')
-    response = session.post(url, headers=headers, json=payload, params=qs)
+    response = client.post(f'/papi/v1/properties/{propertyId}/versions', json=payload, params=qs)
 
     if response.status_code == 201:
         # Extract the new property version from the response
@@ -81,7 +32,64 @@ def create_new_version(ASK, propertyId, propertyVersion, contractId, groupId, et
             f"Failed to create a new property version. Status code: {response.status_code}. Response: {response.json()}")
 
 
-if __name__ == '__main__':
+def get_version(ASK, propertyId, propertyVersion, contractId, groupId):
+    """
+    Return a version item of the property (propertyVersion, etag, stagingStatus, productionStatus).
+
+    `propertyVersion` is a version number or 'latest'.
+    """
+    qs = {
+        'accountSwitchKey': ASK,
+        'contractId': contractId,
+        'groupId': groupId
+    }
+
+    response = client.get(f"/papi/v1/properties/{propertyId}/versions/{propertyVersion}", params=qs)
+    if response.status_code != 200:
+        raise Exception(f"Failed to fetch property version {propertyVersion}. Status code: {response.status_code}")
+    return response.json()['versions']['items'][0]
+
+
+def get_latest_version(ASK, propertyId, contractId, groupId):
+    """Return the latest version item of the property (propertyVersion, etag, stagingStatus, productionStatus)."""
+    return get_version(ASK, propertyId, 'latest', contractId, groupId)
+
+
+def is_editable(version_item):
+    """A version can still be edited until it has been activated (or is being activated) on either network."""
+    return version_item.get('stagingStatus') == 'INACTIVE' and version_item.get('productionStatus') == 'INACTIVE'
+
+
+def create_or_reuse_version(ASK, propertyId, propertyVersion, contractId, groupId, etag):
+    """
+    Return a version the rule tree can be written to, creating one only when needed.
+
+    When the known version is still the latest, has never been activated and its etag
+    is unchanged, it is an editable draft of ours and is reused. Otherwise a new version
+    is created from it, conditional on the same etag.
+
+    Returns:
+        tuple: (version, etag) of the version to update.
+    """
+    latest = get_latest_version(ASK, propertyId, contractId, groupId)
+    if latest['propertyVersion'] == propertyVersion and latest.get('etag') == etag and is_editable(latest):
+        print(f"Reusing editable version {propertyVersion}; no new version needed.")
+        return propertyVersion, etag
+
+    new_version = create_new_version(ASK, propertyId, propertyVersion, contractId, groupId, etag)
+    # The new version has an etag of its own; the rule tree write and the next create need it
+    return new_version, get_version(ASK, propertyId, new_version, contractId, groupId)['etag']
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    if len(argv) > 1 or any(arg.startswith('-') for arg in argv):
+        print("Usage: python3 create_a_new_property_version.py [<propertyName>]")
+        print("  The property defaults to AKAMAI_PROPERTY_NAME.")
+        exit(1)
+
     try:
         # Step 1: Load the existing account switch key (ASK)
         switch_key_data = load_switch_key()
@@ -90,10 +98,10 @@ if __name__ == '__main__':
 
         ASK = switch_key_data['switch_key']
 
-        # Step 2: Load relevant data from the pickle file for the property
-        relevant_data = load_relevant_data_from_pkl()
+        # Step 2: Load relevant data from the state store for the property
+        relevant_data = load_relevant_data(argv[0] if argv else None)
 
-        # Extract relevant fields from the pickle file
+        # Extract relevant fields from the state store
         contractId = relevant_data['contractId']
         groupId = relevant_data['groupId']
         propertyId = relevant_data['propertyId']
@@ -101,17 +109,42 @@ if __name__ == '__main__':
         etag = relevant_data['etag']
         property_name = relevant_data['propertyName']  # Load property name dynamically
 
+        # Step 3: Skip the deployment when the rule tree is already active on both networks.
+        # The hash ignores formatting and key order, so whitespace-only commits don't trigger a deploy.
+        local_tree = load_rule_tree(property_name)
+        local_hash = rules_hash(local_tree)
+        print(f"Local rule tree hash: {local_hash}")
+        if all(is_already_active(ASK, propertyId, contractId, groupId, network, local_hash)
+               for network in ('STAGING', 'PRODUCTION')):
+            save_relevant_data({'rulesHash': local_hash}, property_name)
+            print(f"Rule tree for {property_name} is unchanged from the active versions. Skipping new version.")
+            exit(0)
+
+        # Validate the rule tree locally before creating anything
+        validate_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, local_tree)
+
         # Print the property name being processed
         print(f"Creating a new version for property: {property_name}")
 
-        # Step 3: Create a new property version using the loaded data
-        new_property_version = create_new_version(ASK, propertyId, propertyVersion, contractId, groupId, etag)
+        # Step 4: Reuse the editable draft or create a new property version using the loaded data
+        new_property_version, new_etag = create_or_reuse_version(ASK, propertyId, propertyVersion, contractId,
+                                                                 groupId, etag)
+
+        # Step 5: Save the new property version, its etag and the hash of the rule tree it will carry
+        save_relevant_data({'propertyVersion': new_property_version, 'etag': new_etag, 'rulesHash': local_hash},
+                           property_name)
 
-        # Step 4: Save the new property version to the pickle file
-        save_relevant_data_to_pkl({'propertyVersion': new_property_version})
+        # With AKAMAI_DRY_RUN=1, validate on PAPI against the new version while it is still editable
+        if DRY_RUN:
+            validate_on_server(ASK, propertyId, new_property_version, contractId, groupId, local_tree)
 
-        # Step 5: Print the final status
-        print(f"New property version {new_property_version} has been successfully created and saved.")
+        # Step 6: Print the final status
+        print(f"Property version {new_property_version} is ready for the rule tree and has been saved.")
 
     except Exception as e:
         print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
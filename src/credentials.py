@@ -1,27 +1,170 @@
 import os
-import pickle
-import tempfile  # To get the temp directory in a cross-platform way
+import sys
+import threading
 from pathlib import Path
 from urllib.parse import urljoin
-from akamai.edgegrid import EdgeRc, EdgeGridAuth
-from requests import Session
-
-# Get the path to the .edgerc file from the environment variable or fallback to the default location
-edgerc_path = os.getenv('AKAMAI_EDGERC_PATH', str(Path.home().joinpath('.edgerc')))
-EDGERC = EdgeRc(edgerc_path)
-SECTION = 'default'
-baseurl = f'https://{EDGERC.get(SECTION, "host")}'
-session = Session()
-session.auth = EdgeGridAuth.from_edgerc(EDGERC, SECTION)
-
-def _get_all_switch_keys(my_account):
-    qparam = {'search': my_account}
-    resp = session.get(urljoin(baseurl,
-                               'identity-management/v3/api-clients/self/account-switch-keys'),
-                       params=qparam).json()
+from state_store import (load_switch_key_data, save_switch_key_data, save_switch_keys, list_switch_keys,
+                         switch_keys_age, get_state_db_file)
+
+SECTION = os.getenv('AKAMAI_EDGERC_SECTION', 'default')
+
+# Cached switch keys older than this many seconds are refreshed in the background
+SWITCH_KEY_TTL = int(os.getenv('AKAMAI_SWITCH_KEY_TTL', str(24 * 3600)))
+
+# Credentials, auth and sessions are created on first use and cached per edgerc section,
+# so importing this module (or running a script with --help) never touches .edgerc.
+_edgerc = None
+_sessions = {}
+_lock = threading.Lock()
+_refresh_thread = None
+
+
+def get_edgerc_path():
+    """Get the path to the .edgerc file from the environment variable or fallback to the default location."""
+    return os.getenv('AKAMAI_EDGERC_PATH', str(Path.home().joinpath('.edgerc')))
+
+
+def get_edgerc():
+    """Parse the .edgerc file once and return it."""
+    global _edgerc
+    if _edgerc is None:
+        from akamai.edgegrid import EdgeRc
+        edgerc_path = get_edgerc_path()
+        if not os.path.exists(edgerc_path):
+            raise FileNotFoundError(f"Edgerc file '{edgerc_path}' not found. Set AKAMAI_EDGERC_PATH.")
+        _edgerc = EdgeRc(edgerc_path)
+    return _edgerc
+
+
+def get_baseurl(section=None):
+    """Return the API base URL for the edgerc section (AKAMAI_API_BASEURL overrides it, e.g. for a local mock)."""
+    if os.getenv('AKAMAI_API_BASEURL'):
+        return os.getenv('AKAMAI_API_BASEURL')
+    return f'https://{get_edgerc().get(section or SECTION, "host")}'
+
+
+def get_session(section=None):
+    """Return the authenticated session for the edgerc section, creating it on first use."""
+    section = section or SECTION
+    with _lock:
+        if section not in _sessions:
+            from akamai.edgegrid import EdgeGridAuth
+            from requests import Session
+            session = Session()
+            # A local mock server (AKAMAI_API_BASEURL) does not need EdgeGrid credentials
+            if not os.getenv('AKAMAI_API_BASEURL') or os.path.exists(get_edgerc_path()):
+                session.auth = EdgeGridAuth.from_edgerc(get_edgerc(), section)
+            _sessions[section] = session
+        return _sessions[section]
+
+
+def __getattr__(name):
+    """Keep `from credentials import session, baseurl` working without eager initialization."""
+    if name == 'session':
+        return get_session()
+    if name == 'baseurl':
+        return get_baseurl()
+    if name == 'EDGERC':
+        return get_edgerc()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _get_all_switch_keys(my_account=None):
+    qparam = {'search': my_account} if my_account else {}
+    resp = get_session().get(urljoin(get_baseurl(),
+                                     'identity-management/v3/api-clients/self/account-switch-keys'),
+                             params=qparam).json()
     return resp
 
 
+def account_id(switch_key):
+    """The account ID part of a switch key (ACCOUNT_ID:CONTRACT_TYPE_ID)."""
+    return switch_key.split(':', 1)[0]
+
+
+def prefetch_switch_keys():
+    """Fetch every switch key the API client can use and store them all in one batch."""
+    accounts = _get_all_switch_keys()
+    save_switch_keys([{'switch_key': account['accountSwitchKey'], 'account_name': account['accountName']}
+                      for account in accounts])
+    return len(accounts)
+
+
+def _refresh_switch_keys():
+    try:
+        count = prefetch_switch_keys()
+        print(f"Refreshed {count} account switch keys.")
+    except Exception as e:
+        print(f"Background refresh of switch keys failed: {e}")
+
+
+def refresh_switch_keys_in_background():
+    """Refresh the switch key cache on a daemon thread, unless a refresh is already running."""
+    global _refresh_thread
+    with _lock:
+        if _refresh_thread is None or not _refresh_thread.is_alive():
+            _refresh_thread = threading.Thread(target=_refresh_switch_keys, daemon=True)
+            _refresh_thread.start()
+        return _refresh_thread
+
+
+def find_switch_key(account, switch_keys):
+    """
+    Match an account against the cached switch keys.
+
+    The account can be an exact account name, an account ID or a switch key, or a
+    case-insensitive part of one account name.
+    """
+    for data in switch_keys:
+        if account in (data['account_name'], data['switch_key'], account_id(data['switch_key'])):
+            return data
+    matches = [data for data in switch_keys if account.lower() in data['account_name'].lower()]
+    if len(matches) > 1:
+        raise Exception(f"'{account}' matches {len(matches)} accounts: "
+                        f"{', '.join(data['account_name'] for data in matches)}")
+    return matches[0] if matches else None
+
+
+def lookup_switch_key(account):
+    """Return the cached switch key of an account, prefetching all keys once if it is not cached."""
+    switch_key_data = find_switch_key(account, list_switch_keys())
+    if switch_key_data is None:
+        prefetch_switch_keys()
+        switch_key_data = find_switch_key(account, list_switch_keys())
+    if switch_key_data is None:
+        raise Exception(f"No switch key found for account '{account}'.")
+    return switch_key_data
+
+
+def resolve_switch_key(account=None):
+    """
+    Return the switch key to use, without asking anything.
+
+    AKAMAI_ACCOUNT_SWITCH_KEY is used as is. Otherwise the account (argument or
+    AKAMAI_ACCOUNT) is looked up in the cache, prefetching all keys once if it is
+    missing; without an account the selected key is used. A cache older than
+    SWITCH_KEY_TTL is served as is and refreshed in the background.
+
+    Returns:
+        dict: The switch key data, or None if no switch key is stored.
+    """
+    if os.getenv('AKAMAI_ACCOUNT_SWITCH_KEY'):
+        switch_key = os.getenv('AKAMAI_ACCOUNT_SWITCH_KEY')
+        cached = find_switch_key(switch_key, list_switch_keys())
+        return {'switch_key': switch_key, 'account_name': cached['account_name'] if cached else switch_key}
+
+    account = account or os.getenv('AKAMAI_ACCOUNT')
+    switch_key_data = lookup_switch_key(account) if account else load_switch_key_data()
+
+    age = switch_keys_age()
+    if age is not None and age > SWITCH_KEY_TTL and os.path.exists(get_edgerc_path()):
+        refresh_switch_keys_in_background()
+
+    if switch_key_data is None:
+        return None
+    return {'switch_key': switch_key_data['switch_key'], 'account_name': switch_key_data['account_name']}
+
+
 def generate_switch_key():
     """Generate a new switch key for a different account."""
     my_account = input('Enter account name: ')
@@ -32,89 +175,83 @@ def generate_switch_key():
     switch_key = accounts[key_number - 1]['accountSwitchKey']
     account_name = accounts[key_number - 1]['accountName']
 
-    # Store the switch key and account name using pickle
+    # Store the switch key and account name in the state store
     switch_key_data = {'switch_key': switch_key, 'account_name': account_name}
-    with open('switch_key.pkl', 'wb') as local_cache:
-        pickle.dump(switch_key_data, local_cache)
+    save_switch_key_data(switch_key_data)
 
-    print(f"New switch key stored in file switch_key.pkl for account '{account_name}': {switch_key}")
+    print(f"New switch key stored for account '{account_name}': {switch_key}")
     return switch_key_data
 
 
-import os
-import pickle
-
-
-def load_switch_key():
+def load_switch_key(account=None):
     """
-    Load the switch key from the pickle file located in the 'src' folder.
+    Load the switch key to use (see resolve_switch_key).
 
     Returns:
         dict: The switch key data if successfully loaded, None otherwise.
     """
-    # Get the current directory where this script is located
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-
-    # Construct the path to the pickle file located in the 'src' folder
-    pkl_file_path = os.path.join(current_dir, 'switch_key.pkl')
-
-    # Check if the file exists before trying to open it
-    if not os.path.exists(pkl_file_path):
-        print(f"Error: Pickle file {pkl_file_path} not found.")
-        return None
-
     try:
-        # Load the switch key from the pickle file
-        with open(pkl_file_path, 'rb') as f:
-            switch_key_data = pickle.load(f)
-
-        # Log and return the switch key data
-        print(
-            f"Reusing account switch key from file: {switch_key_data['switch_key']} for account '{switch_key_data['account_name']}'")
-        return switch_key_data
-
-    except pickle.UnpicklingError:
-        print("Error: Failed to unpickle the file. The pickle file may be corrupted.")
-        return None
+        switch_key_data = resolve_switch_key(account)
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return None
 
+    if switch_key_data is None:
+        print(f"Error: No switch key found in {get_state_db_file()}.")
+        return None
+
+    print(
+        f"Reusing account switch key: {switch_key_data['switch_key']} for account '{switch_key_data['account_name']}'")
+    return switch_key_data
+
 
 def get_or_generate_switch_key():
     """
-    Check if a switch key exists, and if so, give the user an option to reuse it.
-    If the switch key does not exist or the user chooses not to reuse it, generate a new one.
-    This function can be reused by other scripts.
+    Return the switch key to use, asking for one only when none can be resolved
+    and the script runs in an interactive terminal.
     """
-    # Check if a switch key already exists
     switch_key_data = load_switch_key()
-
     if switch_key_data:
-        # Show the user their current switch key and account
-        current_switch_key = switch_key_data['switch_key']
-        current_account_name = switch_key_data['account_name']
-        print(f"You already have a switch key for the account: {current_account_name} (Key: {current_switch_key})")
-
-        # Ask the user if they want to reuse the switch key or generate a new one
-        reuse_choice = input(
-            f"Do you want to reuse this switch key for account '{current_account_name}'? (y/n): ").strip().lower()
-
-        if reuse_choice == 'y':
-            print(f"Reusing switch key for account '{current_account_name}'.")
-            return switch_key_data
-        else:
-            print("Generating a new switch key for a different account...")
-            return generate_switch_key()
-    else:
-        # No existing switch key, generate a new one
-        print("No switch key found. Generating a new one...")
-        return generate_switch_key()
+        return switch_key_data
+
+    if not sys.stdin.isatty():
+        print("No switch key found. Set AKAMAI_ACCOUNT or AKAMAI_ACCOUNT_SWITCH_KEY, "
+              "or run 'credentials.py prefetch' and 'credentials.py select <account>'.")
+        exit(1)
+
+    print("No switch key found. Generating a new one...")
+    return generate_switch_key()
+
 
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
 
-# Optional: main function for standalone execution
-def main():
-    get_or_generate_switch_key()
+    if argv and argv[0] not in ('prefetch', 'list', 'select'):
+        print("Usage: python3 credentials.py [prefetch | list | select <account>]")
+        print("  prefetch          Fetch and cache every switch key of the API client")
+        print("  list              List the cached switch keys")
+        print("  select <account>  Select the switch key of an account name, account ID or switch key")
+        print("Without a command, prints the switch key in use or asks for one.")
+        exit(1)
+
+    try:
+        if not argv:
+            get_or_generate_switch_key()
+        elif argv[0] == 'prefetch':
+            print(f"Cached {prefetch_switch_keys()} account switch keys in {get_state_db_file()}.")
+        elif argv[0] == 'list':
+            for data in list_switch_keys():
+                print(f"{'*' if data['selected'] else ' '} {data['switch_key']:<28} {data['account_name']}")
+        else:
+            if len(argv) < 2:
+                raise Exception("select needs an account.")
+            switch_key_data = lookup_switch_key(argv[1])
+            save_switch_key_data(switch_key_data)
+            print(f"Selected account '{switch_key_data['account_name']}': {switch_key_data['switch_key']}")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
 
 
 # This ensures the script can still be executed directly but the main logic is reusable by other scripts
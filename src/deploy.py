@@ -0,0 +1,219 @@
+import sys
+from credentials import load_switch_key
+from state_store import load_relevant_data, save_relevant_data, save_version_hash
+from property_search import find_active_property, save_property_state
+from create_a_new_property_version import create_or_reuse_version
+from update_property_rule_tree import load_snapshot, prepare_rule_tree, push_rule_tree, remove_snapshot
+from activate_on_akamai import activate_on_akamai
+from activation_watcher import wait_for_activation
+from rule_tree_hash import is_already_active
+from smoke_test import run_smoke_test
+from rule_tree_validation import DRY_RUN, validate_rule_tree, validate_on_server
+from instrumentation import metrics, phase
+from activation_metrics import record_steps
+from rollback import mark_known_good
+from cache_warmer import WARM_URLS, warm_after_activation
+
+STEPS = [
+    'validate',
+    'create-version',
+    'update-rules',
+    'activate-staging',
+    'smoke-test-staging',
+    'activate-production',
+    'smoke-test-production',
+]
+
+
+class Deployment:
+    """
+    A single deployment of one property, run in one process.
+
+    Progress is checkpointed in the state store after every step under
+    `deployCheckpoint`, keyed by the hash of the rule tree being deployed. Running
+    the same deployment again resumes after the last completed step, and an
+    activation that was already submitted is watched instead of submitted again.
+    """
+
+    def __init__(self, ASK, property_name, include_production=True, restart=False):
+        self.ASK = ASK
+        self.property_name = property_name
+        self.include_production = include_production
+        self.relevant_data = load_relevant_data(property_name)
+        # A rule tree above STREAM_THRESHOLD is kept as a snapshot file and streamed instead
+        self.local_tree, self.snapshot, self.local_hash = prepare_rule_tree(property_name)
+
+        checkpoint = self.relevant_data.get('deployCheckpoint')
+        if restart or not checkpoint or checkpoint.get('rulesHash') != self.local_hash:
+            checkpoint = {'rulesHash': self.local_hash, 'completed': [], 'activations': {}}
+        self.checkpoint = checkpoint
+
+    def save(self, **fields):
+        """Persist the checkpoint together with any updated property fields."""
+        self.relevant_data.update(fields)
+        save_relevant_data(dict(fields, deployCheckpoint=self.checkpoint), self.property_name)
+
+    def rule_tree(self):
+        """The rule tree being deployed, parsed from the snapshot for the steps that need it."""
+        return self.local_tree if self.local_tree is not None else load_snapshot(self.snapshot)
+
+    def is_unchanged(self):
+        """Return True if both networks already run the local rule tree."""
+        return all(is_already_active(self.ASK, self.relevant_data['propertyId'], self.relevant_data['contractId'],
+                                     self.relevant_data['groupId'], network, self.local_hash)
+                   for network in ('STAGING', 'PRODUCTION'))
+
+    def validate(self):
+        data = self.relevant_data
+        validate_rule_tree(self.ASK, data['propertyId'], data['propertyVersion'], data['contractId'],
+                           data['groupId'], self.rule_tree())
+
+    def create_version(self):
+        data = self.relevant_data
+        new_version, etag = create_or_reuse_version(self.ASK, data['propertyId'], data['propertyVersion'],
+                                                    data['contractId'], data['groupId'], data['etag'])
+        self.save(propertyVersion=new_version, etag=etag, rulesHash=self.local_hash)
+        if DRY_RUN:
+            # Only a version that was never activated accepts a dry run; a failure here reruns
+            # create-version, which reuses this draft
+            validate_on_server(self.ASK, data['propertyId'], new_version, data['contractId'], data['groupId'],
+                               self.rule_tree())
+
+    def update_rules(self):
+        data = self.relevant_data
+        # Push the tree that was hashed and validated, even if the file changed since
+        response = push_rule_tree(self.ASK, data['propertyId'], data['propertyVersion'],
+                                  data['contractId'], data['groupId'], self.property_name, self.local_tree,
+                                  self.snapshot)
+        if response is not None:
+            if response.status_code != 200:
+                raise Exception(f"Rule tree update failed. Status code: {response.status_code}. "
+                                f"Response: {response.json()}")
+            # Keep the etag of the updated version so the next deploy creates from a matching pair
+            self.save(etag=response.json().get('etag', data['etag']))
+        # Once activated, the skip check finds this version's hash without downloading its rule tree
+        save_version_hash(data.get('accountId'), data['propertyId'], data['propertyVersion'], self.local_hash,
+                          data['etag'])
+
+    def activate(self, network):
+        data = self.relevant_data
+        activation_id = self.checkpoint['activations'].get(network)
+        if activation_id is None:
+            activation_id = activate_on_akamai(self.ASK, data['propertyId'], data['propertyVersion'],
+                                               data['contractId'], data['groupId'], network)
+            if activation_id is None:
+                raise Exception(f"Activation on {network.upper()} network was rejected.")
+            self.checkpoint['activations'][network] = activation_id
+            self.save()
+        else:
+            print(f"Resuming watch of activation {activation_id} on {network.upper()} network.")
+
+        status = wait_for_activation(self.ASK, data['propertyId'], activation_id, data['contractId'], data['groupId'])
+        if status != 'ACTIVE':
+            # Allow a rerun to submit a fresh activation
+            del self.checkpoint['activations'][network]
+            self.save()
+            raise Exception(f"Activation on {network.upper()} network ended with status {status}.")
+
+    def smoke_test(self, network):
+        if not run_smoke_test(self.property_name, network):
+            raise Exception(f"Smoke test on {network.upper()} network failed.")
+        # The version is now a rollback target for this network
+        mark_known_good(self.relevant_data['propertyId'], network, self.relevant_data['propertyVersion'],
+                        self.checkpoint['activations'].get(network))
+
+    def warm_cache(self):
+        # Warm-up problems are reported but never fail the deployment
+        warm_after_activation([self.property_name])
+
+    def run_step(self, step):
+        if step == 'validate':
+            self.validate()
+        elif step == 'create-version':
+            self.create_version()
+        elif step == 'update-rules':
+            self.update_rules()
+        elif step == 'warm-cache':
+            self.warm_cache()
+        else:
+            action, network = step.rsplit('-', 1)
+            if action == 'activate':
+                self.activate(network)
+            else:
+                self.smoke_test(network)
+
+    def run(self):
+        """Run every step that has not completed yet."""
+        try:
+            self.run_steps()
+        finally:
+            remove_snapshot(self.snapshot)
+
+    def run_steps(self):
+        if not self.checkpoint['completed']:
+            with phase('compare-hash'):
+                unchanged = self.is_unchanged()
+            if unchanged:
+                print(f"Rule tree for {self.property_name} is already active on both networks. Nothing to deploy.")
+                return
+
+        steps = STEPS if self.include_production else STEPS[:5]
+        if self.include_production and WARM_URLS:
+            steps = steps + ['warm-cache']
+        for step in steps:
+            if step in self.checkpoint['completed']:
+                print(f"Skipping {step}: already completed.")
+                continue
+
+            print(f"==> {step}")
+            with phase(step, property=self.property_name):
+                self.run_step(step)
+
+            self.checkpoint['completed'].append(step)
+            self.save()
+
+        print(f"Deployment of {self.property_name} version {self.relevant_data['propertyVersion']} completed.")
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    flags = [arg for arg in argv if arg.startswith('--')]
+    args = [arg for arg in argv if not arg.startswith('--')]
+    unknown = set(flags) - {'--search', '--skip-production', '--restart'}
+    if unknown or len(args) > 1:
+        print("Usage: python3 deploy.py [<propertyName>] [--search] [--skip-production] [--restart]")
+        print("  --search           Look the property up on PAPI first instead of using the stored state")
+        print("  --skip-production  Stop after the staging smoke test")
+        print("  --restart          Ignore any checkpoint and deploy from the first step")
+        exit(1)
+
+    try:
+        switch_key_data = load_switch_key()
+        if switch_key_data is None:
+            raise Exception("No switch key found. Exiting.")
+        ASK = switch_key_data['switch_key']
+
+        property_name = args[0] if args else None
+        if '--search' in flags:
+            if property_name is None:
+                raise Exception("--search needs a property name.")
+            save_property_state(find_active_property(property_name, ASK))
+        property_name = property_name or load_relevant_data()['propertyName']
+
+        deployment = Deployment(ASK, property_name, include_production='--skip-production' not in flags,
+                                restart='--restart' in flags)
+        try:
+            deployment.run()
+        finally:
+            metrics.print_summary()
+            record_steps('deploy')
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
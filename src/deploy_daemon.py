@@ -0,0 +1,264 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from instrumentation import metrics
+from activation_metrics import RUN_ID, record_steps
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = int(os.getenv('AKAMAI_DAEMON_PORT', '8787'))
+DEFAULT_WORKERS = 4
+
+# Held by `git pull` and while a deployment loads its rule tree. A deployment keeps the tree it loaded
+# in memory and pushes that one, so a pull for the next deployment never changes what a running one deploys.
+_checkout_lock = threading.Lock()
+
+
+def pull_latest():
+    """Fast-forward the checkout the daemon runs from to the latest commit."""
+    with _checkout_lock:
+        subprocess.run(['git', 'pull', '--ff-only', '--quiet'], check=True, capture_output=True, text=True)
+
+
+def run_deployment(ASK, request):
+    """Deploy one property with the same steps and checkpoints as deploy.py."""
+    from deploy import Deployment
+    with _checkout_lock:
+        deployment = Deployment(ASK, request['propertyName'], include_production=not request.get('skipProduction'))
+    deployment.run()
+
+
+class DeployQueue:
+    """
+    A per-property coalescing queue of deploy requests.
+
+    At most one deployment per property runs at a time. Requests for a property that
+    arrive while it is queued or deploying replace its pending request instead of
+    adding one, so a burst of pushes costs at most one more deployment of the latest
+    state once the running one finishes. Different properties deploy in parallel, up
+    to `max_workers` at a time.
+    """
+
+    def __init__(self, ASK, max_workers=DEFAULT_WORKERS, deploy=run_deployment, pull=False):
+        self.ASK = ASK
+        self.max_workers = max_workers
+        self.deploy = deploy
+        self.pull = pull
+        self.condition = threading.Condition()
+        self.order = deque()
+        self.pending = {}
+        self.running = {}
+        self.results = {}
+        self.stopping = False
+        self.threads = []
+        self.batches = 0
+
+    def submit(self, request):
+        """Queue a deploy request; returns 'queued', or 'coalesced' when it replaced a pending one."""
+        name = request['propertyName']
+        with self.condition:
+            previous = self.pending.get(name)
+            request = dict(request, received=time.time(),
+                           coalesced=previous['coalesced'] + 1 if previous else 0)
+            self.pending[name] = request
+            if previous is None:
+                self.order.append(name)
+            self.condition.notify_all()
+        return 'coalesced' if previous else 'queued'
+
+    def _take(self):
+        """Wait for a queued property that is not deploying and take its latest request."""
+        with self.condition:
+            while True:
+                if self.stopping:
+                    return None
+                for name in self.order:
+                    if name not in self.running:
+                        self.order.remove(name)
+                        request = self.pending.pop(name)
+                        self.running[name] = dict(request, started=time.time())
+                        return request
+                self.condition.wait()
+
+    def _work(self):
+        while True:
+            request = self._take()
+            if request is None:
+                return
+            name = request['propertyName']
+            result = {'status': 'SUCCESS', 'error': None, 'commit': request.get('commit'),
+                      'coalesced': request['coalesced'], 'started': time.time()}
+            print(f"Deploying {name}" + (f" ({request['coalesced']} coalesced requests)"
+                                         if request['coalesced'] else ""))
+            try:
+                if self.pull:
+                    pull_latest()
+                self.deploy(self.ASK, request)
+            except (Exception, SystemExit) as e:
+                # Deployment helpers exit on fatal errors; keep the daemon alive
+                result.update(status='FAILED', error=str(e) or e.__class__.__name__)
+            result['finished'] = time.time()
+            print(f"Deployment of {name} {result['status']} after {result['finished'] - result['started']:.1f}s"
+                  + (f": {result['error']}" if result['error'] else ""))
+
+            phases = None
+            with self.condition:
+                del self.running[name]
+                self.results[name] = result
+                if not self.running:
+                    # The workers share the phase timings; take them once no deployment is in flight,
+                    # so each batch of deployments is one run in activation_metrics.py
+                    self.batches += 1
+                    run_id = f"{RUN_ID}-{self.batches}"
+                    phases = metrics.take_phases()
+                self.condition.notify_all()
+            if phases:
+                # Written outside the lock so submit(), status() and the other workers never wait on SQLite
+                record_steps('daemon', run_id=run_id, phases=phases)
+
+    def start(self):
+        for _ in range(self.max_workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+    def wait_idle(self, timeout=None):
+        """Block until nothing is queued or deploying; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.order or self.running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def status(self):
+        with self.condition:
+            return {'running': dict(self.running), 'pending': dict(self.pending), 'results': dict(self.results)}
+
+
+class DeployRequestHandler(BaseHTTPRequestHandler):
+    """POST /deploy queues properties; GET /status shows what is running, pending and done."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path != '/status':
+            return self.send_json(404, {'error': 'Not found'})
+        self.send_json(200, self.server.queue.status())
+
+    def do_POST(self):
+        if self.path != '/deploy':
+            return self.send_json(404, {'error': 'Not found'})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            names = body.get('properties') or [body['propertyName']]
+        except (ValueError, KeyError, AttributeError):
+            names = None
+        if not isinstance(names, list) or not all(isinstance(name, str) and name for name in names):
+            return self.send_json(400, {'error': 'Expected {"propertyName": ...} or {"properties": [...]}'})
+
+        outcome = {}
+        for name in names:
+            outcome[name] = self.server.queue.submit({'propertyName': name, 'commit': body.get('commit'),
+                                                      'skipProduction': bool(body.get('skipProduction'))})
+        self.send_json(202, outcome)
+
+
+def start_daemon(queue, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Start the workers and the HTTP interface in background threads; returns the server."""
+    queue.start()
+    server = ThreadingHTTPServer((host, port), DeployRequestHandler)
+    server.daemon_threads = True
+    server.queue = queue
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def submit(names, port=DEFAULT_PORT, host=DEFAULT_HOST, commit=None, skip_production=False):
+    """Send a deploy request to a running daemon and return its answer."""
+    from requests import post
+    response = post(f'http://{host}:{port}/deploy', timeout=30,
+                    json={'properties': names, 'commit': commit, 'skipProduction': skip_production})
+    if response.status_code != 202:
+        raise Exception(f"Deploy daemon rejected the request. Status code: {response.status_code}")
+    return response.json()
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    options = {}
+    args = []
+    iterator = iter(argv)
+    for arg in iterator:
+        if arg in ('--pull', '--skip-production'):
+            options[arg] = True
+        elif arg.startswith('--'):
+            options[arg] = next(iterator, '')
+        else:
+            args.append(arg)
+
+    allowed = {'--host', '--port', '--workers', '--pull', '--commit', '--skip-production'}
+    if (args and args[0] != 'submit') or (args[:1] == ['submit'] and len(args) < 2) or set(options) - allowed:
+        print("Usage: python3 deploy_daemon.py [--host 127.0.0.1] [--port 8787] [--workers 4] [--pull]")
+        print("       python3 deploy_daemon.py submit <propertyName> [...] [--commit SHA] [--skip-production]")
+        exit(1)
+
+    host = options.get('--host', DEFAULT_HOST)
+    port = int(options.get('--port', DEFAULT_PORT))
+
+    try:
+        if args:
+            for name, outcome in submit(args[1:], port, host, options.get('--commit'),
+                                        options.get('--skip-production', False)).items():
+                print(f"{name}: {outcome}")
+            return
+
+        from credentials import load_switch_key
+        switch_key_data = load_switch_key()
+        if switch_key_data is None:
+            raise Exception("No switch key found. Exiting.")
+
+        queue = DeployQueue(switch_key_data['switch_key'], int(options.get('--workers', DEFAULT_WORKERS)),
+                            pull=options.get('--pull', False))
+        server = start_daemon(queue, host, port)
+        print(f"Deploy daemon listening on http://{host}:{server.server_address[1]} "
+              f"with {queue.max_workers} workers.")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print("Stopping after the running deployments finish.")
+            server.shutdown()
+            queue.stop()
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from opentelemetry import trace
+    tracer = trace.get_tracer('akamai-pipeline')
+except ImportError:  # OpenTelemetry is optional
+    tracer = None
+
+# AKAMAI_LOG_LEVEL=DEBUG logs every API call; AKAMAI_LOG_FORMAT=json writes one JSON object per line
+LOG_LEVEL = os.getenv('AKAMAI_LOG_LEVEL', 'WARNING').upper()
+LOG_FORMAT = os.getenv('AKAMAI_LOG_FORMAT', 'text')
+
+logger = logging.getLogger('akamai')
+
+# Path segments that identify one object (prp_123, 45, atv_6) are folded so calls group by endpoint
+ID_SEGMENT = re.compile(r'^(?!v\d+$)[\w-]*\d[\w-]*$')
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a log record as one JSON object, including any fields passed in `extra`."""
+
+    RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in self.RESERVED})
+        return json.dumps(entry, default=str)
+
+
+def configure_logging():
+    """Attach a stderr handler to the `akamai` logger once, in the format chosen by the environment."""
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json'
+                         else logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def endpoint_of(method, path):
+    """Group a request path into its endpoint: GET /papi/v1/properties/{id}/versions/{id}/rules."""
+    segments = path.split('?', 1)[0].split('/')
+    return f"{method} {'/'.join('{id}' if ID_SEGMENT.match(s) else s for s in segments)}"
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Metrics:
+    """Thread-safe per-endpoint and per-phase measurements of one run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.phases = {}
+
+    def record_request(self, method, path, status, seconds, bytes_sent, bytes_received, attempt):
+        """Record one attempt of an API call and log it."""
+        endpoint = endpoint_of(method, path)
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, {'calls': 0, 'retries': 0, 'latencies': [], 'sent': 0,
+                                                         'received': 0, 'statuses': {}})
+            stats['calls'] += 1
+            stats['retries'] += 1 if attempt else 0
+            stats['latencies'].append(seconds)
+            stats['sent'] += bytes_sent
+            stats['received'] += bytes_received
+            stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+
+        logger.debug(f"{method} {path} -> {status} in {seconds * 1000:.0f} ms",
+                     extra={'event': 'api_call', 'endpoint': endpoint, 'status': status,
+                            'duration_ms': round(seconds * 1000, 1), 'bytes_sent': bytes_sent,
+                            'bytes_received': bytes_received, 'attempt': attempt})
+
+    def record_phase(self, name, seconds):
+        with self.lock:
+            stats = self.phases.setdefault(name, {'count': 0, 'total': 0.0})
+            stats['count'] += 1
+            stats['total'] += seconds
+        logger.info(f"Phase {name} took {seconds:.2f}s",
+                    extra={'event': 'phase', 'phase': name, 'duration_ms': round(seconds * 1000, 1)})
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+            self.phases.clear()
+
+    def take_phases(self):
+        """Return the (name, runs, total seconds) of every phase and reset all measurements, in one step."""
+        with self.lock:
+            phases = [(name, stats['count'], stats['total']) for name, stats in self.phases.items()]
+            self.endpoints.clear()
+            self.phases.clear()
+        return phases
+
+    def print_summary(self):
+        """Print the time spent per phase and per endpoint, slowest first."""
+        with self.lock:
+            phases = sorted(self.phases.items(), key=lambda item: -item[1]['total'])
+            endpoints = sorted(self.endpoints.items(), key=lambda item: -sum(item[1]['latencies']))
+
+        if phases:
+            print(f"{'phase':<32} {'runs':>5} {'total s':>9}")
+            for name, stats in phases:
+                print(f"{name:<32} {stats['count']:>5} {stats['total']:>9.2f}")
+        if endpoints:
+            print(f"{'endpoint':<60} {'calls':>6} {'retries':>7} {'p50 ms':>8} {'p95 ms':>8} {'total s':>8} "
+                  f"{'KB out':>8} {'KB in':>8}  statuses")
+            for endpoint, stats in endpoints:
+                statuses = ' '.join(f"{status}x{count}" for status, count in sorted(stats['statuses'].items(),
+                                                                                     key=lambda item: str(item[0])))
+                print(f"{endpoint:<60} {stats['calls']:>6} {stats['retries']:>7} "
+                      f"{percentile(stats['latencies'], 0.50) * 1000:>8.0f} "
+                      f"{percentile(stats['latencies'], 0.95) * 1000:>8.0f} {sum(stats['latencies']):>8.2f} "
+                      f"{stats['sent'] / 1024:>8.1f} {stats['received'] / 1024:>8.1f}  {statuses}")
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def span(name, **attributes):
+    """An OpenTelemetry span when opentelemetry is installed, otherwise nothing."""
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+@contextmanager
+def phase(name, **attributes):
+    """Time a phase of the run (create-version, activate-staging, ...) and trace it as a span."""
+    start = time.monotonic()
+    try:
+        with span(name, **attributes):
+            yield
+    finally:
+        metrics.record_phase(name, time.monotonic() - start)
+
+
+configure_logging()
@@ -0,0 +1,204 @@
+import os
+import random
+import socket
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+from urllib3.connection import HTTPConnection
+from credentials import get_session, get_baseurl
+from instrumentation import metrics, span, endpoint_of
+
+PAPI_HEADERS = {
+    "accept": "application/json",
+    "PAPI-Use-Prefixes": "false",
+    "content-type": "application/json"
+}
+
+# All limits can be tuned per runner through the environment
+DEFAULT_POOL_SIZE = int(os.getenv('AKAMAI_POOL_SIZE', '20'))
+DEFAULT_RATE = float(os.getenv('AKAMAI_RATE_LIMIT', '10'))    # Sustained requests per second
+DEFAULT_BURST = int(os.getenv('AKAMAI_RATE_BURST', '20'))     # Requests allowed back to back
+DEFAULT_MAX_RETRIES = int(os.getenv('AKAMAI_MAX_RETRIES', '5'))
+DEFAULT_TIMEOUT = float(os.getenv('AKAMAI_TIMEOUT', '120'))   # Rule tree validation can take a while
+
+BACKOFF_BASE = 1      # Seconds before the first retry
+BACKOFF_MAX = 60      # Upper bound for a single retry delay
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+# Keep idle connections open and let the kernel detect dead peers between polls
+KEEPALIVE_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+if hasattr(socket, 'TCP_KEEPIDLE'):
+    KEEPALIVE_SOCKET_OPTIONS += [(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30),
+                                 (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)]
+
+
+def retry_after_seconds(response):
+    """Return the delay requested by a Retry-After header, or None if there is none."""
+    retry_after = response.headers.get('Retry-After')
+    if not retry_after:
+        return None
+    if retry_after.isdigit():
+        return int(retry_after)
+    try:
+        return max(0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _response_size(response, stream=False):
+    """Bytes received in the response body, without reading a streamed body early."""
+    if response.headers.get('Content-Length'):
+        return int(response.headers['Content-Length'])
+    return 0 if stream else len(response.content)
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter that enables TCP keep-alive on every pooled connection."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = KEEPALIVE_SOCKET_OPTIONS
+        super().init_poolmanager(*args, **kwargs)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class PapiClient:
+    """
+    Shared transport for every PAPI call.
+
+    Wraps the authenticated session with a sized connection pool, client-side rate
+    limiting and retries. Throttled (429) requests are always retried; server errors
+    and connection failures are only retried for idempotent methods, so a POST that
+    may have been processed (new version, activation) is never sent twice. A JSON
+    Patch or any write conditional on If-Match is not retried either: if the first
+    attempt was applied, the retry would fail with 412 and report the write as failed.
+    """
+
+    def __init__(self, session=None, baseurl=None, section=None, pool_size=DEFAULT_POOL_SIZE, rate=DEFAULT_RATE,
+                 burst=DEFAULT_BURST, max_retries=DEFAULT_MAX_RETRIES, timeout=DEFAULT_TIMEOUT):
+        self.section = section
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session = session
+        self._baseurl = baseurl
+        if session is not None:
+            self.resize_pool(pool_size)
+
+    @property
+    def session(self):
+        """The authenticated session for this client's edgerc section, created on first use."""
+        if self._session is None:
+            self._session = get_session(self.section)
+            self.resize_pool(self.pool_size)
+        return self._session
+
+    @property
+    def baseurl(self):
+        if self._baseurl is None:
+            self._baseurl = get_baseurl(self.section)
+        return self._baseurl
+
+    def resize_pool(self, pool_size):
+        """Mount a keep-alive adapter whose pool holds `pool_size` connections per host."""
+        self.pool_size = pool_size
+        if self._session is not None:
+            adapter = KeepAliveAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self._session.mount('https://', adapter)
+            self._session.mount('http://', adapter)
+
+    def _backoff(self, attempt, response=None):
+        """Return the delay before the given retry attempt, honoring Retry-After."""
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1)
+        if response is not None:
+            requested = retry_after_seconds(response)
+            if requested is not None:
+                delay = max(delay, requested)
+        return delay
+
+    def request(self, method, path, headers=None, **kwargs):
+        """Send a request to the PAPI host, retrying throttled and transient failures."""
+        method = method.upper()
+        url = urljoin(self.baseurl, path)
+        kwargs.setdefault('timeout', self.timeout)
+        request_headers = dict(PAPI_HEADERS)
+        if headers:
+            request_headers.update(headers)
+        # A callable body is called once per attempt, so streamed uploads can be retried
+        data = kwargs.pop('data', None)
+        idempotent = method in IDEMPOTENT_METHODS and 'If-Match' not in request_headers
+
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            if data is not None:
+                kwargs['data'] = data() if callable(data) else data
+            start = time.monotonic()
+            try:
+                with span(endpoint_of(method, path), **{'http.method': method, 'http.url': url,
+                                                        'retry.attempt': attempt}) as current:
+                    response = self.session.request(method, url, headers=request_headers, **kwargs)
+                    if current is not None:
+                        current.set_attribute('http.status_code', response.status_code)
+            except (ConnectionError, Timeout) as e:
+                metrics.record_request(method, path, e.__class__.__name__, time.monotonic() - start, 0, 0, attempt)
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"{method} {path} failed ({e.__class__.__name__}). Retrying in {delay:.1f}s...")
+            else:
+                metrics.record_request(method, path, response.status_code, time.monotonic() - start,
+                                       int(response.request.headers.get('Content-Length') or 0),
+                                       _response_size(response, kwargs.get('stream')), attempt)
+                retryable = response.status_code == 429 or (
+                    response.status_code in RETRY_STATUSES and idempotent)
+                if not retryable or attempt >= self.max_retries:
+                    return response
+                delay = self._backoff(attempt, response)
+                print(f"{method} {path} returned {response.status_code}. Retrying in {delay:.1f}s...")
+
+            attempt += 1
+            time.sleep(delay)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request('PATCH', path, **kwargs)
+
+
+# Default client; nothing is read from .edgerc until its first request
+client = PapiClient()
@@ -0,0 +1,272 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from papi_client import client
+from state_store import get_connection, transaction
+
+# Catalog entries older than this many seconds are ignored by lookups and evicted by the next sync
+CATALOG_TTL = int(os.getenv('AKAMAI_CATALOG_TTL', '3600'))
+
+# Contract/group pairs listed concurrently during a sync
+SYNC_WORKERS = 8
+
+# catalog_etags row that records when the account was last synced completely
+LAST_SYNC_KEY = '<last sync>'
+
+CATALOG_COLUMNS = {
+    'propertyId': 'property_id',
+    'propertyName': 'property_name',
+    'accountId': 'account_id',
+    'contractId': 'contract_id',
+    'groupId': 'group_id',
+    'assetId': 'asset_id',
+    'latestVersion': 'latest_version',
+    'stagingVersion': 'staging_version',
+    'productionVersion': 'production_version',
+    'syncedAt': 'synced_at',
+}
+
+
+def _account_key(ASK):
+    return ASK or ''
+
+
+def _list_key(path, params):
+    """The key a list response's ETag is stored under."""
+    return f"{path}?{urlencode(sorted(params.items()))}" if params else path
+
+
+def get_list(ASK, path, params=None, etag=None):
+    """
+    GET a PAPI list endpoint, conditionally when an ETag from the last sync is known.
+
+    Returns:
+        tuple: (response body, ETag), or (None, etag) when the list has not changed since.
+    """
+    headers = {'If-None-Match': etag} if etag else {}
+    response = client.get(path, params=dict(params or {}, accountSwitchKey=ASK), headers=headers)
+
+    if response.status_code == 304:
+        return None, etag
+    if response.status_code != 200:
+        raise Exception(f"Listing {path} failed. Status code: {response.status_code}")
+    return response.json(), response.headers.get('ETag')
+
+
+def list_contract_groups(ASK):
+    """Return the (contractId, groupId) pairs the account switch key can see."""
+    body, _ = get_list(ASK, '/papi/v1/groups')
+    return sorted({(contract_id, group['groupId'])
+                   for group in body['groups']['items'] for contract_id in group.get('contractIds', [])})
+
+
+def list_hostnames(ASK, params, etag=None):
+    """List the hostnames of a contract/group, following nextLink across pages."""
+    body, new_etag = get_list(ASK, '/papi/v1/hostnames', params, etag)
+    if body is None:
+        return None, etag
+
+    items = list(body['hostnames']['items'])
+    next_link = body['hostnames'].get('nextLink')
+    while next_link:
+        response = client.get(next_link)
+        if response.status_code != 200:
+            raise Exception(f"Listing {next_link} failed. Status code: {response.status_code}")
+        page = response.json()['hostnames']
+        items.extend(page['items'])
+        next_link = page.get('nextLink')
+    return items, new_etag
+
+
+def _fetch_pair(ASK, contract_id, group_id, etags):
+    """Fetch the property and hostname lists of one contract/group pair."""
+    params = {'contractId': contract_id, 'groupId': group_id}
+    properties_key = _list_key('/papi/v1/properties', params)
+    hostnames_key = _list_key('/papi/v1/hostnames', params)
+
+    properties, properties_etag = get_list(ASK, '/papi/v1/properties', params, etags.get(properties_key))
+    hostnames, hostnames_etag = list_hostnames(ASK, params, etags.get(hostnames_key))
+    return {
+        'contractId': contract_id,
+        'groupId': group_id,
+        'properties': None if properties is None else properties['properties']['items'],
+        'hostnames': hostnames,
+        'etags': {properties_key: properties_etag, hostnames_key: hostnames_etag},
+    }
+
+
+def _store_pair(connection, account_key, pair, now, counts):
+    """Write one fetched contract/group pair inside an open transaction."""
+    scope = (account_key, pair['contractId'], pair['groupId'])
+
+    if pair['properties'] is None:
+        connection.execute('UPDATE catalog_properties SET synced_at = ? '
+                           'WHERE account_key = ? AND contract_id = ? AND group_id = ?', (now, *scope))
+        counts['unchanged_lists'] += 1
+    else:
+        known = {row['property_id']: row['latest_version'] for row in connection.execute(
+            'SELECT property_id, latest_version FROM catalog_properties '
+            'WHERE account_key = ? AND contract_id = ? AND group_id = ?', scope)}
+        for item in pair['properties']:
+            if known.get(item['propertyId']) != item.get('latestVersion'):
+                counts['changed'] += 1
+            connection.execute(
+                """
+                INSERT OR REPLACE INTO catalog_properties (account_key, property_id, property_name, account_id,
+                    contract_id, group_id, asset_id, latest_version, staging_version, production_version, synced_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (account_key, item['propertyId'], item['propertyName'], item.get('accountId'), pair['contractId'],
+                 pair['groupId'], item.get('assetId'), item.get('latestVersion'), item.get('stagingVersion'),
+                 item.get('productionVersion'), now))
+        # Properties missing from a fresh list were deleted or moved away
+        listed = [item['propertyId'] for item in pair['properties']]
+        connection.execute(
+            f"DELETE FROM catalog_properties WHERE account_key = ? AND contract_id = ? AND group_id = ? "
+            f"AND property_id NOT IN ({', '.join('?' * len(listed))})", (*scope, *listed))
+
+    if pair['hostnames'] is None:
+        connection.execute('UPDATE catalog_hostnames SET synced_at = ? '
+                           'WHERE account_key = ? AND contract_id = ? AND group_id = ?', (now, *scope))
+    else:
+        connection.execute('DELETE FROM catalog_hostnames WHERE account_key = ? AND contract_id = ? AND group_id = ?',
+                           scope)
+        connection.executemany(
+            """
+            INSERT OR REPLACE INTO catalog_hostnames (account_key, hostname, property_id, contract_id, group_id,
+                staging_cname_to, production_cname_to, synced_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(account_key, item['cnameFrom'].lower(), item['propertyId'], pair['contractId'], pair['groupId'],
+              item.get('stagingCnameTo'), item.get('productionCnameTo'), now) for item in pair['hostnames']])
+
+    for key, etag in pair['etags'].items():
+        if etag:
+            connection.execute('INSERT OR REPLACE INTO catalog_etags (account_key, path, etag, synced_at) '
+                               'VALUES (?, ?, ?, ?)', (account_key, key, etag, now))
+
+
+def sync_catalog(ASK, max_workers=SYNC_WORKERS, ttl=CATALOG_TTL):
+    """
+    Bring the catalog of the account up to date.
+
+    Every contract/group pair is listed concurrently. Lists that did not change since
+    the last sync answer 304 to If-None-Match and only have their timestamps refreshed.
+    Entries that were not seen for longer than the TTL are evicted afterwards.
+
+    Returns:
+        dict: Counts of synced properties, properties with a new latest version and unchanged lists.
+    """
+    account_key = _account_key(ASK)
+    etags = {row['path']: row['etag'] for row in get_connection().execute(
+        'SELECT path, etag FROM catalog_etags WHERE account_key = ?', (account_key,))}
+
+    pairs = list_contract_groups(ASK)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        fetched = list(executor.map(lambda pair: _fetch_pair(ASK, *pair, etags), pairs))
+
+    now = time.time()
+    counts = {'pairs': len(pairs), 'changed': 0, 'unchanged_lists': 0}
+    with transaction() as connection:
+        for pair in fetched:
+            _store_pair(connection, account_key, pair, now, counts)
+        connection.execute('INSERT OR REPLACE INTO catalog_etags (account_key, path, etag, synced_at) '
+                           'VALUES (?, ?, ?, ?)', (account_key, LAST_SYNC_KEY, '', now))
+    counts['evicted'] = evict_expired(ASK, ttl)
+    counts['properties'] = get_connection().execute(
+        'SELECT COUNT(*) FROM catalog_properties WHERE account_key = ?', (account_key,)).fetchone()[0]
+    return counts
+
+
+def evict_expired(ASK, ttl=CATALOG_TTL):
+    """Delete catalog entries of the account not refreshed within the TTL and return how many went."""
+    cutoff = time.time() - ttl
+    account_key = _account_key(ASK)
+    with transaction() as connection:
+        evicted = connection.execute('DELETE FROM catalog_properties WHERE account_key = ? AND synced_at < ?',
+                                     (account_key, cutoff)).rowcount
+        connection.execute('DELETE FROM catalog_hostnames WHERE account_key = ? AND synced_at < ?',
+                           (account_key, cutoff))
+    return evicted
+
+
+def catalog_age(ASK):
+    """Seconds since the last completed sync of the account, or None if it was never synced."""
+    row = get_connection().execute('SELECT synced_at FROM catalog_etags WHERE account_key = ? AND path = ?',
+                                   (_account_key(ASK), LAST_SYNC_KEY)).fetchone()
+    return None if row is None else time.time() - row['synced_at']
+
+
+def find_property(ASK, property_name=None, hostname=None, property_id=None, ttl=CATALOG_TTL):
+    """
+    Look a property up in the catalog by name, hostname or ID, without calling PAPI.
+
+    Returns:
+        dict: The catalog entry (propertyId, contractId, groupId, productionVersion, ...),
+            or None when it is not in the catalog or its entry is older than the TTL.
+    """
+    query = 'SELECT p.* FROM catalog_properties p'
+    if property_name:
+        query += ' WHERE p.account_key = ? AND p.property_name = ?'
+        args = (property_name,)
+    elif hostname:
+        query += (' JOIN catalog_hostnames h ON h.account_key = p.account_key AND h.property_id = p.property_id'
+                  ' WHERE p.account_key = ? AND h.hostname = ?')
+        args = (hostname.lower(),)
+    elif property_id:
+        query += ' WHERE p.account_key = ? AND p.property_id = ?'
+        args = (property_id,)
+    else:
+        raise Exception("A property name, hostname or property ID is needed.")
+
+    row = get_connection().execute(query + ' AND p.synced_at >= ? LIMIT 1',
+                                   (_account_key(ASK), *args, time.time() - ttl)).fetchone()
+    if row is None:
+        return None
+    return {field: row[column] for field, column in CATALOG_COLUMNS.items()}
+
+
+def resolve(ASK, value, ttl=CATALOG_TTL):
+    """Look a value up as a property name, then as a hostname, then as a property ID."""
+    return (find_property(ASK, property_name=value, ttl=ttl) or find_property(ASK, hostname=value, ttl=ttl)
+            or find_property(ASK, property_id=value, ttl=ttl))
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    if not argv or argv[0] not in ('sync', 'find') or (argv[0] == 'find' and len(argv) < 2):
+        print("Usage: python3 property_catalog.py sync")
+        print("       python3 property_catalog.py find <propertyName|hostname|propertyId>")
+        exit(1)
+
+    from credentials import load_switch_key
+
+    try:
+        switch_key_data = load_switch_key()
+        if switch_key_data is None:
+            raise Exception("No switch key found. Exiting.")
+        ASK = switch_key_data['switch_key']
+
+        if argv[0] == 'sync':
+            start = time.monotonic()
+            counts = sync_catalog(ASK)
+            print(f"Synced {counts['properties']} properties from {counts['pairs']} contract/group pairs "
+                  f"in {time.monotonic() - start:.1f}s: {counts['changed']} with a new version, "
+                  f"{counts['unchanged_lists']} unchanged lists, {counts['evicted']} evicted.")
+        else:
+            entry = resolve(ASK, argv[1])
+            if entry is None:
+                raise Exception(f"'{argv[1]}' is not in the catalog (or its entry expired). Run sync first.")
+            print(json.dumps(entry, indent=4))
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
-import os
-import json
-import pickle
+import sys
 from pprint import pprint
-from urllib.parse import urljoin
-from credentials import get_or_generate_switch_key, session, baseurl
+from credentials import get_or_generate_switch_key
+from papi_client import client
+from state_store import save_relevant_data, get_state_db_file
+from rule_tree_stream import download_rule_tree
+from property_catalog import resolve
 
 def get_property(active_item, ASK):
     qs = {'accountSwitchKey': ASK,
@@ -11,15 +12,9 @@ def get_property(active_item, ASK):
           'groupId': active_item['groupId']
           }
 
-    headers = {
-        "accept": "application/json",
-        "PAPI-Use-Prefixes": "false",
-        "content-type": "application/json"
-    }
-
-    response = session.get(
-        urljoin(baseurl, f"/papi/v1/properties/{active_item['propertyId']}/versions/{active_item['propertyVersion']}/rules"),
-        headers=headers, params=qs)
+    response = client.get(
+        f"/papi/v1/properties/{active_item['propertyId']}/versions/{active_item['propertyVersion']}/rules",
+        params=qs)
 
     if response.status_code != 200:
         print(f"Failed to fetch property rules. Status code: {response.status_code}")
@@ -30,16 +25,11 @@ def get_property(active_item, ASK):
 
 def property_search(property_name, ASK):
     qs = {'accountSwitchKey': ASK}
-    headers = {
-        "accept": "application/json",
-        "PAPI-Use-Prefixes": "false",
-        "content-type": "application/json"
-    }
 
     payload = {
         "propertyName": property_name
     }
-    response = session.post(urljoin(baseurl, "/papi/v1/search/find-by-value"), headers=headers, params=qs, json=payload)
+    response = client.post("/papi/v1/search/find-by-value", params=qs, json=payload)
 
     if response.status_code != 200:
         print(f"Property search failed. Status code: {response.status_code}")
@@ -48,28 +38,48 @@ def property_search(property_name, ASK):
     return response
 
 
-if __name__ == '__main__':
-    # Get or generate the account switch key (ASK) from the credentials
-    switch_key_data = get_or_generate_switch_key()
-    ASK = switch_key_data['switch_key']
-
-    # Get the property name from the user
-    property_name = input('Enter Property name to search: ')
+def find_active_version(property_name, ASK):
+    """
+    Return the search item of the version of the property active on production.
+
+    The property catalog is consulted first; PAPI is only searched when the property
+    is not in the catalog or its entry expired. A catalog entry can be up to
+    AKAMAI_CATALOG_TTL old, so the version live on production is always checked
+    before it is used as the base of a new version.
+    """
+    from rule_tree_hash import get_active_version
+
+    entry = resolve(ASK, property_name)
+    live_version = entry and get_active_version(ASK, entry['propertyId'], entry['contractId'], entry['groupId'],
+                                                'PRODUCTION')
+    if live_version:
+        if live_version != entry['productionVersion']:
+            print(f"Catalog lists version {entry['productionVersion']} of '{property_name}' on production, "
+                  f"but version {live_version} is live; using version {live_version}.")
+        print(f"Resolved '{property_name}' from the property catalog.")
+        return {
+            'accountId': entry['accountId'],
+            'contractId': entry['contractId'],
+            'groupId': entry['groupId'],
+            'propertyId': entry['propertyId'],
+            'propertyName': entry['propertyName'],
+            'propertyVersion': live_version,
+            'productionStatus': 'ACTIVE'
+        }
 
-    # Perform property search
     res = property_search(property_name, ASK)
 
     # Extract the item where productionStatus is 'ACTIVE'
-    active_item = next(item for item in res.json()['versions']['items'] if item['productionStatus'] == 'ACTIVE')
+    return next(item for item in res.json()['versions']['items'] if item['productionStatus'] == 'ACTIVE')
+
 
-    # Fetch the property rule tree for the active item
-    rule_tree = get_property(active_item, ASK)
+def find_active_property(property_name, ASK):
+    """Search for the property and return the rule tree of its version active on production."""
+    return get_property(find_active_version(property_name, ASK), ASK)
 
-    # Save the rule tree to a JSON file
-    with open(f"{rule_tree['propertyName']}.json", 'w') as outfile:
-        json.dump(rule_tree, outfile, indent=4)
 
-    # Create a dictionary with relevant fields from the rule tree
+def save_property_state(rule_tree):
+    """Save the relevant fields of a fetched rule tree to the state store and return them."""
     relevant_data = {
         'accountId': rule_tree['accountId'],
         'contractId': rule_tree['contractId'],
@@ -79,11 +89,34 @@ if __name__ == '__main__':
         'propertyVersion': rule_tree['propertyVersion'],
         'etag': rule_tree['etag']
     }
+    save_relevant_data(relevant_data)
+    return relevant_data
 
-    # Save the relevant fields to a pickle file
-    with open("property_fields.pkl", 'wb') as pklfile:
-        pickle.dump(relevant_data, pklfile)
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    # Get or generate the account switch key (ASK) from the credentials
+    switch_key_data = get_or_generate_switch_key()
+    ASK = switch_key_data['switch_key']
+
+    # Get the property name from the command line or from the user
+    property_name = argv[0] if argv else input('Enter Property name to search: ')
+
+    # Perform property search for the active version
+    active_item = find_active_version(property_name, ASK)
+
+    # Stream the rule tree of the active version to a JSON file
+    rule_tree_fields = download_rule_tree(ASK, active_item, f"{active_item['propertyName']}.json")
+
+    # Save the relevant fields to the state store
+    relevant_data = save_property_state(rule_tree_fields)
 
     # Print confirmation and the relevant fields
-    print(f"Relevant fields from the rule tree have been saved to {rule_tree['propertyName']}_fields.pkl")
+    print(f"Relevant fields from the rule tree have been saved to {get_state_db_file()}")
     pprint(relevant_data)
+
+
+if __name__ == '__main__':
+    main()
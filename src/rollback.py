@@ -0,0 +1,201 @@
+import sys
+import time
+from credentials import load_switch_key
+from papi_client import client
+from state_store import get_connection, transaction, load_relevant_data, save_relevant_data
+from activate_on_akamai import activate_on_akamai
+from activation_watcher import wait_for_activation
+
+NETWORKS = ('STAGING', 'PRODUCTION')
+
+
+def mark_known_good(propertyId, network, propertyVersion, activationId=None):
+    """Remember that the version passed its smoke test on the network."""
+    with transaction() as connection:
+        connection.execute(
+            'INSERT OR REPLACE INTO known_good_versions (property_id, network, property_version, activation_id, '
+            'verified_at) VALUES (?, ?, ?, ?, ?)',
+            (propertyId, network.upper(), int(propertyVersion), activationId, time.time()))
+
+
+def unmark_known_good(propertyId, network, propertyVersion):
+    """Forget that the version is known-good on the network, after rolling back from it."""
+    with transaction() as connection:
+        connection.execute('DELETE FROM known_good_versions WHERE property_id = ? AND network = ? '
+                           'AND property_version = ?', (propertyId, network.upper(), int(propertyVersion)))
+
+
+def known_good_versions(propertyId, network):
+    """Known-good versions of the property on the network, most recently verified first."""
+    rows = get_connection().execute(
+        'SELECT property_version FROM known_good_versions WHERE property_id = ? AND network = ? '
+        'ORDER BY verified_at DESC', (propertyId, network.upper()))
+    return [row['property_version'] for row in rows]
+
+
+def list_activations(ASK, propertyId, contractId, groupId):
+    """Fetch the activations of the property, newest first."""
+    qs = {'accountSwitchKey': ASK, 'contractId': contractId, 'groupId': groupId}
+    response = client.get(f"/papi/v1/properties/{propertyId}/activations", params=qs)
+    if response.status_code != 200:
+        raise Exception(f"Failed to list activations of {propertyId}. Status code: {response.status_code}")
+    return response.json()['activations']['items']
+
+
+def current_activation(activations, network):
+    """The activation that is live on the network, or None."""
+    for activation in activations:
+        if (activation['network'] == network.upper() and activation['status'] == 'ACTIVE'
+                and activation.get('activationType', 'ACTIVATE') == 'ACTIVATE'):
+            return activation
+    return None
+
+
+def can_fast_fallback(activation, propertyVersion, now=None):
+    """True if the activation can still fall back to the version in seconds."""
+    fallback = (activation or {}).get('fallbackInfo') or {}
+    expiration = fallback.get('fastFallbackExpirationTime')
+    return bool(fallback.get('canFastFallback') and fallback.get('fallbackVersion') == propertyVersion
+                and (expiration is None or (now or time.time()) < expiration))
+
+
+def choose_target(activations, network, known_good, propertyVersion=None):
+    """
+    Pick the version to roll back to.
+
+    An explicit version wins. Otherwise the most recently verified known-good version
+    older than the live one is used, then the fallback version of the live activation, then
+    the last version that was activated on the network before it. Without an explicit
+    version, only versions older than the live one are considered, so rolling back again
+    never goes forward to the version rolled back from.
+
+    Returns:
+        tuple: (live activation or None, target version or None)
+    """
+    current = current_activation(activations, network)
+    live_version = current['propertyVersion'] if current else None
+    if propertyVersion is not None:
+        return current, int(propertyVersion)
+
+    def is_older(version):
+        return live_version is None or version < live_version
+
+    for version in known_good:
+        if is_older(version):
+            return current, version
+
+    fallback_version = ((current or {}).get('fallbackInfo') or {}).get('fallbackVersion')
+    if fallback_version is not None and is_older(fallback_version):
+        return current, fallback_version
+
+    for activation in activations:
+        if (activation['network'] == network.upper() and activation['status'] in ('ACTIVE', 'INACTIVE')
+                and activation.get('activationType', 'ACTIVATE') == 'ACTIVATE'
+                and activation['propertyVersion'] != live_version and is_older(activation['propertyVersion'])):
+            return current, activation['propertyVersion']
+    return current, None
+
+
+def rollback(ASK, propertyId, contractId, groupId, network, propertyVersion=None, fast_fallback=True):
+    """
+    Put a previous version back live on the network without creating or editing a version.
+
+    Fast fallback is used when the target is the fallback version of the live activation
+    and its window is still open; otherwise the target version is activated again.
+
+    Returns:
+        tuple: (final status, target version, whether fast fallback was used)
+    """
+    activations = list_activations(ASK, propertyId, contractId, groupId)
+    current, target = choose_target(activations, network, known_good_versions(propertyId, network),
+                                    propertyVersion)
+    if target is None:
+        raise Exception(f"No previous version of {propertyId} to roll back to on {network.upper()}.")
+    if current is not None and current['propertyVersion'] == target:
+        print(f"Version {target} is already live on {network.upper()} network.")
+        return 'ACTIVE', target, False
+
+    use_fast_fallback = fast_fallback and can_fast_fallback(current, target)
+    print(f"Rolling back {network.upper()} from version {current['propertyVersion'] if current else '?'} "
+          f"to version {target}{' with fast fallback' if use_fast_fallback else ''}.")
+    activation_id = activate_on_akamai(ASK, propertyId, target, contractId, groupId, network, use_fast_fallback)
+    if activation_id is None and use_fast_fallback:
+        # The window can close between the check and the request; reactivate the version instead
+        print("Fast fallback was rejected; activating the version instead.")
+        use_fast_fallback = False
+        activation_id = activate_on_akamai(ASK, propertyId, target, contractId, groupId, network)
+    if activation_id is None:
+        raise Exception(f"Rollback activation on {network.upper()} network was rejected.")
+
+    status = wait_for_activation(ASK, propertyId, activation_id, contractId, groupId)
+    if status == 'ACTIVE' and current is not None:
+        # The version rolled back from is not a rollback target any more
+        unmark_known_good(propertyId, network, current['propertyVersion'])
+    return status, target, use_fast_fallback
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    options = {}
+    args = []
+    iterator = iter(argv)
+    for arg in iterator:
+        if arg == '--no-fast-fallback':
+            options[arg] = True
+        elif arg.startswith('--'):
+            options[arg] = next(iterator, '')
+        else:
+            args.append(arg)
+
+    command = args.pop(0) if args and args[0] in ('mark', 'list') else 'rollback'
+    network = args.pop(0).upper() if command != 'list' and args else None
+    if ((command != 'list' and network not in NETWORKS) or len(args) > 1
+            or set(options) - {'--version', '--no-fast-fallback'}):
+        print("Usage: python3 rollback.py <staging|production> [<propertyName>] [--version N] [--no-fast-fallback]")
+        print("       python3 rollback.py mark <staging|production> [<propertyName>] [--version N]")
+        print("       python3 rollback.py list [<propertyName>]")
+        exit(1)
+
+    try:
+        relevant_data = load_relevant_data(args[0] if args else None)
+        propertyId = relevant_data['propertyId']
+        version = int(options['--version']) if options.get('--version') else None
+
+        if command == 'mark':
+            mark_known_good(propertyId, network, version or relevant_data['propertyVersion'])
+            print(f"Version {version or relevant_data['propertyVersion']} of {relevant_data['propertyName']} "
+                  f"is known-good on {network} network.")
+            return
+
+        if command == 'list':
+            for known_network in NETWORKS:
+                versions = known_good_versions(propertyId, known_network)
+                print(f"{known_network}: {', '.join(f'v{v}' for v in versions) or 'no known-good versions'}")
+            return
+
+        switch_key_data = load_switch_key()
+        if switch_key_data is None:
+            raise Exception("No switch key found. Exiting.")
+
+        start = time.monotonic()
+        status, target, fast = rollback(switch_key_data['switch_key'], propertyId, relevant_data['contractId'],
+                                        relevant_data['groupId'], network, version,
+                                        not options.get('--no-fast-fallback'))
+        if status != 'ACTIVE':
+            raise Exception(f"Rollback to version {target} ended with status {status}.")
+
+        # A finished deploy checkpoint would make the next deploy of the same rule tree skip every step
+        if relevant_data.get('deployCheckpoint'):
+            save_relevant_data({'deployCheckpoint': None}, relevant_data['propertyName'])
+        print(f"Version {target} is live on {network} network{' (fast fallback)' if fast else ''} "
+              f"after {time.monotonic() - start:.1f}s.")
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
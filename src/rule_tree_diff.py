@@ -0,0 +1,89 @@
+import json
+import sys
+
+# Send a full PUT instead of a PATCH once the patch is this large relative to the whole rule tree
+PATCH_SIZE_RATIO = 0.5
+
+
+def _escape(token):
+    """Escape a key for use in a JSON Pointer (RFC 6901)."""
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def diff(old, new, path=''):
+    """
+    Build a JSON Patch (RFC 6902) that turns `old` into `new`.
+
+    Dicts are compared key by key and lists index by index, so only the
+    subtrees that actually changed end up in the patch.
+
+    Args:
+        old: The currently deployed document.
+        new: The desired document.
+        path (str): JSON Pointer of `old`/`new` inside the enclosing document.
+
+    Returns:
+        list: The JSON Patch operations.
+    """
+    if type(old) is not type(new):
+        return [{'op': 'replace', 'path': path, 'value': new}]
+
+    if isinstance(old, dict):
+        operations = []
+        for key in old:
+            if key not in new:
+                operations.append({'op': 'remove', 'path': f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            if key not in old:
+                operations.append({'op': 'add', 'path': f"{path}/{_escape(key)}", 'value': value})
+            else:
+                operations.extend(diff(old[key], value, f"{path}/{_escape(key)}"))
+        return operations
+
+    if isinstance(old, list):
+        operations = []
+        common = min(len(old), len(new))
+        for index in range(common):
+            operations.extend(diff(old[index], new[index], f"{path}/{index}"))
+        for index in range(common, len(new)):
+            operations.append({'op': 'add', 'path': f"{path}/{index}", 'value': new[index]})
+        # Remove from the end so earlier indexes stay valid while the patch is applied
+        for index in range(len(old) - 1, common - 1, -1):
+            operations.append({'op': 'remove', 'path': f"{path}/{index}"})
+        return operations
+
+    if old != new:
+        return [{'op': 'replace', 'path': path, 'value': new}]
+    return []
+
+
+def diff_rule_trees(deployed, local):
+    """Return the JSON Patch that turns the deployed rule tree into the local one (rules only)."""
+    return diff(deployed['rules'], local['rules'], '/rules')
+
+
+def patch_is_worthwhile(patch, local):
+    """Return True when sending the patch is cheaper than sending the whole rule tree."""
+    patch_size = len(json.dumps(patch, separators=(',', ':')))
+    full_size = len(json.dumps(local, separators=(',', ':')))
+    return patch_size < full_size * PATCH_SIZE_RATIO
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    if len(argv) < 2:
+        print("Usage: python3 rule_tree_diff.py <deployed.json> <local.json>")
+        exit(1)
+
+    with open(argv[0], 'r') as file:
+        deployed_tree = json.load(file)
+    with open(argv[1], 'r') as file:
+        local_tree = json.load(file)
+
+    print(json.dumps(diff_rule_trees(deployed_tree, local_tree), indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import sys
+from credentials import load_switch_key
+from papi_client import client
+from property_search import get_property
+from state_store import load_version_hash, save_version_hash
+
+
+def rules_hash(rule_tree):
+    """
+    Return the SHA-256 content hash of a rule tree's rules.
+
+    The rules are hashed in a canonical form: keys are sorted and whitespace is
+    dropped, so files that only differ in formatting or key ordering hash the same.
+    Metadata such as propertyVersion and etag is left out because it changes on every version.
+    """
+    # json.dumps uses the C encoder; iterencode would fall back to the much slower pure-Python one
+    canonical = json.dumps(rule_tree['rules'], sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def get_active_version(ASK, propertyId, contractId, groupId, network):
+    """Return the property version currently active on the network, or None if nothing is active."""
+    qs = {
+        'accountSwitchKey': ASK,
+        'contractId': contractId,
+        'groupId': groupId,
+        'activatedOn': network.upper(),
+    }
+
+    response = client.get(f"/papi/v1/properties/{propertyId}/versions/latest", params=qs)
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise Exception(f"Failed to fetch the version active on {network.upper()}. "
+                        f"Status code: {response.status_code}")
+
+    items = response.json().get('versions', {}).get('items', [])
+    return items[0]['propertyVersion'] if items else None
+
+
+def get_active_rules_hash(ASK, propertyId, contractId, groupId, network):
+    """
+    Return the content hash of the rule tree active on the network, or None if nothing is active.
+
+    The hash stored for the active version is used when there is one; the rule tree is
+    only downloaded on a miss, and its hash is stored for the next check.
+    """
+    active_version = get_active_version(ASK, propertyId, contractId, groupId, network)
+    if active_version is None:
+        return None
+
+    active_hash = load_version_hash(propertyId, active_version)
+    if active_hash is not None:
+        return active_hash
+
+    active_tree = get_property({'contractId': contractId, 'groupId': groupId,
+                                'propertyId': propertyId, 'propertyVersion': active_version}, ASK)
+    active_hash = rules_hash(active_tree)
+    save_version_hash(active_tree.get('accountId'), propertyId, active_version, active_hash, active_tree.get('etag'))
+    return active_hash
+
+
+def is_already_active(ASK, propertyId, contractId, groupId, network, local_hash):
+    """Return True if the rule tree active on the network has the given content hash."""
+    active_hash = get_active_rules_hash(ASK, propertyId, contractId, groupId, network)
+    print(f"Rule tree hash on {network.upper()}: {active_hash}")
+    return active_hash == local_hash
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    if not argv:
+        print("Usage: python3 rule_tree_hash.py <rule_tree.json> [<propertyId> <contractId> <groupId> <network>]")
+        exit(1)
+
+    with open(argv[0], 'r') as file:
+        local_hash = rules_hash(json.load(file))
+    print(f"Local rule tree hash: {local_hash}")
+
+    if len(argv) >= 5:
+        switch_key_data = load_switch_key()
+        if switch_key_data is None:
+            print("No switch key found. Exiting.")
+            exit(1)
+        same = is_already_active(switch_key_data['switch_key'], *argv[1:5], local_hash)
+        print("Unchanged" if same else "Changed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+import copy
+import json
+import os
+import sys
+
+# AKAMAI_OPTIMIZE_RULES=1 optimizes every rule tree load_rule_tree returns, so the validated,
+# hashed and uploaded tree is the optimized one
+OPTIMIZE = os.getenv('AKAMAI_OPTIMIZE_RULES', '0') == '1'
+
+# Behaviors that add to each other instead of overriding; they are never folded
+REPEATABLE_BEHAVIORS = {
+    'modifyIncomingRequestHeader',
+    'modifyIncomingResponseHeader',
+    'modifyOutgoingRequestHeader',
+    'modifyOutgoingResponseHeader',
+    'setVariable',
+    'advanced',
+}
+
+FOLDS = ['duplicate criteria', 'duplicate behaviors', 'overridden behaviors', 'empty rules', 'duplicate siblings']
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+def _body(rule):
+    """What a rule does, without its name and comments."""
+    return _canonical({key: value for key, value in rule.items() if key not in ('name', 'comments', 'uuid')})
+
+
+def _is_unconditional(rule):
+    return not rule.get('criteria')
+
+
+def _has_repeatable(rule):
+    return (any(b['name'] in REPEATABLE_BEHAVIORS for b in rule.get('behaviors', []))
+            or any(_has_repeatable(child) for child in rule.get('children', [])))
+
+
+def stats(rule_tree):
+    """Rule, behavior and criteria counts and compact JSON size of a rule tree."""
+    counts = {'rules': 0, 'behaviors': 0, 'criteria': 0}
+
+    def visit(rule):
+        counts['rules'] += 1
+        counts['behaviors'] += len(rule.get('behaviors', []))
+        counts['criteria'] += len(rule.get('criteria', []))
+        for child in rule.get('children', []):
+            visit(child)
+
+    visit(rule_tree['rules'])
+    counts['bytes'] = len(_canonical(rule_tree).encode('utf-8'))
+    return counts
+
+
+def _dedupe(items, folds, kind):
+    seen = set()
+    kept = []
+    for item in items:
+        key = _canonical(item)
+        if key in seen and not (kind == 'duplicate behaviors' and item['name'] in REPEATABLE_BEHAVIORS):
+            folds[kind] += 1
+            continue
+        seen.add(key)
+        kept.append(item)
+    return kept
+
+
+def fold_duplicates(rule, folds):
+    """Drop repeated identical criteria and behaviors within each rule."""
+    if 'criteria' in rule:
+        rule['criteria'] = _dedupe(rule['criteria'], folds, 'duplicate criteria')
+    if 'behaviors' in rule:
+        rule['behaviors'] = _dedupe(rule['behaviors'], folds, 'duplicate behaviors')
+    for child in rule.get('children', []):
+        fold_duplicates(child, folds)
+
+
+def _always_set(rule):
+    """Names of the behaviors a rule's subtree sets whenever the rule matches."""
+    names = {b['name'] for b in rule.get('behaviors', [])}
+    for child in rule.get('children', []):
+        if _is_unconditional(child):
+            names |= _always_set(child)
+    return names
+
+
+def fold_overridden(rule, folds, later=frozenset(), is_default=True):
+    """
+    Drop behaviors that a later rule always overrides.
+
+    A behavior is overridden when the same behavior is set again later in the same
+    rule, in a child without criteria, or in a later sibling (of the rule or of an
+    ancestor) without criteria: those always match when this rule does and run after it.
+    The default rule keeps all its behaviors, since PAPI requires some of them there.
+    """
+    children = rule.get('children', [])
+    below = set()
+    for child in children:
+        if _is_unconditional(child):
+            below |= _always_set(child)
+
+    if not is_default and rule.get('behaviors'):
+        kept = []
+        behaviors = rule['behaviors']
+        for index, behavior in enumerate(behaviors):
+            after = {b['name'] for b in behaviors[index + 1:]} | below | later
+            if behavior['name'] not in REPEATABLE_BEHAVIORS and behavior['name'] in after:
+                folds['overridden behaviors'] += 1
+                continue
+            kept.append(behavior)
+        rule['behaviors'] = kept
+
+    for index, child in enumerate(children):
+        following = set(later)
+        for sibling in children[index + 1:]:
+            if _is_unconditional(sibling):
+                following |= _always_set(sibling)
+        fold_overridden(child, folds, frozenset(following), is_default=False)
+
+
+def fold_empty(rule, folds):
+    """Drop child rules that have no behaviors and no children left."""
+    children = []
+    for child in rule.get('children', []):
+        fold_empty(child, folds)
+        if child.get('behaviors') or child.get('children'):
+            children.append(child)
+        else:
+            folds['empty rules'] += 1
+    if 'children' in rule:
+        rule['children'] = children
+
+
+def fold_duplicate_siblings(rule, folds):
+    """
+    Drop a child rule when a later sibling does exactly the same under the same criteria.
+
+    The later copy matches the same requests and sets the same behaviors after the
+    earlier one, so the earlier one has no effect. Subtrees with header modifications
+    or variables are kept, since those add up instead of overriding.
+    """
+    children = rule.get('children', [])
+    bodies = [_body(child) for child in children]
+    kept = []
+    for index, child in enumerate(children):
+        if bodies[index] in bodies[index + 1:] and not _has_repeatable(child):
+            folds['duplicate siblings'] += 1
+            continue
+        kept.append(child)
+        fold_duplicate_siblings(child, folds)
+    if 'children' in rule:
+        rule['children'] = kept
+
+
+def repeated_subtrees(rule_tree, min_rules=2):
+    """
+    Identical subtrees (of at least `min_rules` rules) found in more than one place.
+
+    These cannot be folded in place, but are good candidates for a shared snippet.
+
+    Returns:
+        list: (number of copies, rules per copy, rule names) for each repeated subtree.
+    """
+    found = {}
+
+    def visit(rule):
+        size = 1 + sum(visit(child) for child in rule.get('children', []))
+        if size >= min_rules:
+            found.setdefault(_body(rule), []).append((size, rule.get('name', '')))
+        return size
+
+    for child in rule_tree['rules'].get('children', []):
+        visit(child)
+    return sorted(((len(copies), copies[0][0], [name for _, name in copies])
+                   for copies in found.values() if len(copies) > 1), reverse=True)
+
+
+def optimize_rule_tree(rule_tree):
+    """
+    Return an optimized copy of the rule tree and a report of what was folded.
+
+    The passes repeat until nothing changes, since dropping overridden behaviors can
+    leave empty rules, and dropping those can make siblings identical.
+    """
+    optimized = copy.deepcopy(rule_tree)
+    folds = dict.fromkeys(FOLDS, 0)
+    while True:
+        before = sum(folds.values())
+        fold_duplicates(optimized['rules'], folds)
+        fold_overridden(optimized['rules'], folds)
+        fold_empty(optimized['rules'], folds)
+        fold_duplicate_siblings(optimized['rules'], folds)
+        if sum(folds.values()) == before:
+            break
+
+    report = {'before': stats(rule_tree), 'after': stats(optimized), 'folds': folds,
+              'repeated': repeated_subtrees(optimized)}
+    return optimized, report
+
+
+def print_report(report):
+    """Print the before/after counts and sizes, the folds and the repeated subtrees."""
+    before, after = report['before'], report['after']
+    print(f"{'':<10} {'before':>10} {'after':>10}")
+    for key in ('rules', 'behaviors', 'criteria', 'bytes'):
+        print(f"{key:<10} {before[key]:>10} {after[key]:>10}")
+    for fold, count in report['folds'].items():
+        if count:
+            print(f"Folded {count} {fold}.")
+    for copies, size, names in report['repeated']:
+        print(f"{copies} identical subtrees of {size} rules ({', '.join(names)}); consider a shared snippet.")
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    options = {}
+    args = []
+    iterator = iter(argv)
+    for arg in iterator:
+        if arg == '--write':
+            options[arg] = True
+        elif arg.startswith('--'):
+            options[arg] = next(iterator, '')
+        else:
+            args.append(arg)
+
+    if len(args) > 1 or set(options) - {'--write', '--rule-tree'}:
+        print("Usage: python3 rule_tree_optimizer.py [<propertyName>] [--write]")
+        print("       python3 rule_tree_optimizer.py --rule-tree <file.json> [--write]")
+        print("  --write  Replace the rule tree file with the optimized rule tree")
+        exit(1)
+
+    try:
+        file_path = options.get('--rule-tree')
+        if not file_path:
+            from state_store import load_relevant_data
+            from update_property_rule_tree import get_rule_tree_file
+            file_path = get_rule_tree_file(args[0] if args else load_relevant_data()['propertyName'])
+
+        with open(file_path, 'r') as file:
+            rule_tree = json.load(file)
+        optimized, report = optimize_rule_tree(rule_tree)
+        print_report(report)
+
+        if options.get('--write') and optimized != rule_tree:
+            with open(f'{file_path}.part', 'w') as file:
+                json.dump(optimized, file, indent=4)
+                file.write('\n')
+            os.replace(f'{file_path}.part', file_path)
+            print(f"Wrote the optimized rule tree to {file_path}.")
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+import json
+import os
+import posixpath
+import re
+import sys
+import time
+from urllib.parse import urlsplit
+
+# Criteria that read one request header
+HEADER_CRITERIA = {'userAgent': 'user-agent'}
+
+
+def wildcard_regex(values, case_sensitive):
+    """One compiled regex matching any of the values, where * and ? are wildcards."""
+    alternatives = '|'.join(re.escape(value).replace(r'\*', '.*').replace(r'\?', '.') for value in values)
+    return re.compile(f'(?:{alternatives})\\Z', 0 if case_sensitive else re.IGNORECASE)
+
+
+def value_matcher(values, case_sensitive=False, wildcard=True):
+    """
+    Compile a list of values into a predicate on one string.
+
+    Values without wildcards go into a set, so a long list of extensions or hostnames
+    costs one lookup; only the wildcard values are tried as a regex.
+    """
+    fold = (lambda text: text) if case_sensitive else str.lower
+    exact = {fold(value) for value in values if not (wildcard and ('*' in value or '?' in value))}
+    patterns = [value for value in values if wildcard and ('*' in value or '?' in value)]
+    regex = wildcard_regex(patterns, case_sensitive) if patterns else None
+    return lambda text: text is not None and (fold(text) in exact or (regex is not None and bool(regex.match(text))))
+
+
+def _negated(operator):
+    return operator.startswith(('IS_NOT', 'DOES_NOT'))
+
+
+def compile_criterion(criterion):
+    """
+    Compile a criterion into a function of the request returning True, False, or None when
+    the criterion cannot be evaluated offline.
+    """
+    name = criterion['name']
+    options = criterion.get('options', {})
+    operator = options.get('matchOperator', 'IS_ONE_OF')
+    negate = _negated(operator)
+
+    if name == 'path':
+        match = value_matcher(options.get('values', []), options.get('matchCaseSensitive', False))
+        return lambda request: match(request['path']) != negate
+
+    if name == 'hostname':
+        match = value_matcher(options.get('values', []))
+        return lambda request: match(request['host']) != negate
+
+    if name == 'fileExtension':
+        match = value_matcher(options.get('values', []), options.get('matchCaseSensitive', False), wildcard=False)
+        return lambda request: match(request['extension'] or 'EMPTY_STRING') != negate
+
+    if name in ('requestHeader', *HEADER_CRITERIA):
+        header = HEADER_CRITERIA.get(name) or options.get('headerName', '').lower()
+        if operator in ('EXISTS', 'DOES_NOT_EXIST'):
+            return lambda request: (header in request['headers']) != (operator == 'DOES_NOT_EXIST')
+        match = value_matcher(options.get('values', []),
+                              options.get('matchCaseSensitiveValue', options.get('matchCaseSensitive', False)),
+                              options.get('matchWildcardValue', options.get('matchWildcard', False)))
+        return lambda request: match(request['headers'].get(header)) != negate
+
+    if name == 'requestMethod':
+        value = options.get('value', '').upper()
+        return lambda request: (request['method'] == value) != negate
+
+    if name == 'requestProtocol':
+        value = options.get('value', '').lower()
+        return lambda request: (request['scheme'] == value) != negate
+
+    # Criteria that depend on the origin response (cacheability, contentType, ...) cannot be decided
+    # from the request alone; rules using them are reported as undetermined
+    return lambda request: None
+
+
+def compile_rule(rule):
+    """Compile a rule and its children once, so every request only runs the matchers."""
+    return {
+        'name': rule.get('name', ''),
+        'any': rule.get('criteriaMustSatisfy', 'all') == 'any',
+        'matchers': [compile_criterion(criterion) for criterion in rule.get('criteria', [])],
+        'behaviors': [(behavior['name'], behavior.get('options', {})) for behavior in rule.get('behaviors', [])],
+        'children': [compile_rule(child) for child in rule.get('children', [])],
+    }
+
+
+def compile_rule_tree(rule_tree):
+    return compile_rule(rule_tree['rules'])
+
+
+def rule_matches(compiled, request):
+    """True, False or None (undetermined) for the criteria of one rule."""
+    results = [matcher(request) for matcher in compiled['matchers']]
+    if not results:
+        return True
+    if compiled['any']:
+        return True if True in results else None if None in results else False
+    return False if False in results else None if None in results else True
+
+
+def parse_request(url, headers=None, method='GET'):
+    """Split a sample URL into the fields the matchers read."""
+    parts = urlsplit(url if '://' in url else f'https://{url}')
+    path = parts.path or '/'
+    last_segment = path.rsplit('/', 1)[-1]
+    extension = posixpath.splitext(last_segment)[1][1:] if '.' in last_segment else ''
+    return {
+        'url': url,
+        'scheme': parts.scheme.lower(),
+        'host': (parts.hostname or '').lower(),
+        'path': path,
+        'extension': extension,
+        'method': method.upper(),
+        'headers': {name.lower(): value for name, value in (headers or {}).items()},
+    }
+
+
+def evaluate(compiled, request):
+    """
+    Walk the compiled rule tree for one request.
+
+    Rules are evaluated top-down like on the edge: a child is only considered when its
+    parent matched, and a behavior in a later matching rule overrides the same behavior
+    set by an earlier one.
+
+    Returns:
+        dict: The matched rule names, the undetermined rule names and the resulting behaviors.
+    """
+    result = {'url': request['url'], 'matched': [], 'undetermined': [], 'behaviors': {}}
+
+    def visit(rule, names):
+        outcome = rule_matches(rule, request)
+        names = names + [rule['name']]
+        if outcome is None:
+            result['undetermined'].append(' > '.join(names))
+            return
+        if not outcome:
+            return
+        result['matched'].append(' > '.join(names))
+        for name, options in rule['behaviors']:
+            result['behaviors'][name] = options
+        for child in rule['children']:
+            visit(child, names)
+
+    visit(compiled, [])
+    return result
+
+
+def load_samples(sources):
+    """
+    Read sample requests from URLs, files with one URL per line, or JSON files.
+
+    A JSON file holds a list of URLs or of objects with `url` and optional `method`,
+    `headers` and `expect` (behavior name -> options that must be present).
+    """
+    samples = []
+    for source in sources:
+        if not os.path.isfile(source):
+            samples.append({'url': source})
+        elif source.endswith('.json'):
+            with open(source, 'r') as file:
+                samples.extend(item if isinstance(item, dict) else {'url': item} for item in json.load(file))
+        else:
+            with open(source, 'r') as file:
+                samples.extend({'url': line.strip()} for line in file if line.strip() and not line.startswith('#'))
+    return samples
+
+
+def check_expectations(result, expect):
+    """Return a message for every expected behavior option the simulated request does not get."""
+    errors = []
+    for name, options in (expect or {}).items():
+        if options is None:
+            if name in result['behaviors']:
+                errors.append(f"{name} applies but should not")
+            continue
+        actual = result['behaviors'].get(name)
+        if actual is None:
+            errors.append(f"{name} does not apply")
+            continue
+        for key, value in options.items():
+            if actual.get(key) != value:
+                errors.append(f"{name}.{key} is {actual.get(key)!r}, expected {value!r}")
+    return errors
+
+
+def simulate(rule_tree, samples):
+    """Evaluate every sample request against the rule tree and attach expectation failures."""
+    compiled = compile_rule_tree(rule_tree)
+    results = []
+    for sample in samples:
+        result = evaluate(compiled, parse_request(sample['url'], sample.get('headers'), sample.get('method', 'GET')))
+        result['errors'] = check_expectations(result, sample.get('expect'))
+        results.append(result)
+    return results
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    options = {}
+    args = []
+    iterator = iter(argv)
+    for arg in iterator:
+        if arg == '--json':
+            options[arg] = True
+        elif arg.startswith('--'):
+            options[arg] = next(iterator, '')
+        else:
+            args.append(arg)
+
+    if not args or set(options) - {'--property', '--rule-tree', '--json'}:
+        print("Usage: python3 rule_tree_simulator.py <url|urls.txt|cases.json> [...] "
+              "[--property <propertyName> | --rule-tree <file.json>] [--json]")
+        print("Example: python3 rule_tree_simulator.py https://www.cyberabstract.com/styles/site.css")
+        exit(1)
+
+    try:
+        if options.get('--rule-tree'):
+            with open(options['--rule-tree'], 'r') as file:
+                rule_tree = json.load(file)
+        else:
+            from state_store import load_relevant_data
+            from update_property_rule_tree import load_rule_tree
+            rule_tree = load_rule_tree(options.get('--property') or load_relevant_data()['propertyName'])
+
+        samples = load_samples(args)
+        start = time.monotonic()
+        results = simulate(rule_tree, samples)
+        elapsed = time.monotonic() - start
+
+        if options.get('--json'):
+            print(json.dumps(results, indent=4))
+        else:
+            for result in results:
+                print(result['url'])
+                for name in result['matched'][1:]:
+                    print(f"  matched       {name}")
+                for name in result['undetermined']:
+                    print(f"  undetermined  {name}")
+                for error in result['errors']:
+                    print(f"  FAILED        {error}")
+        failed = sum(1 for result in results if result['errors'])
+        print(f"Simulated {len(results)} requests in {elapsed * 1000:.0f} ms "
+              f"({len(results) / max(elapsed, 1e-9):.0f}/s), {failed} failed expectations.", file=sys.stderr)
+        exit(1 if failed else 0)
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import codecs
+import json
+import os
+import re
+import sys
+import zlib
+from papi_client import client
+
+CHUNK_SIZE = 64 * 1024
+
+# One JSON token: a complete string, a structural character, a literal (number, true, false, null) or whitespace
+TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\],:]|[^\s{}\[\],:"]+|\s+')
+
+
+class JsonStreamFormatter:
+    """
+    Re-indent a JSON document chunk by chunk, the way json.dump(indent=4) lays it out.
+
+    Only the current token and a partial token at a chunk boundary are held in
+    memory, so the size of the document does not matter. Top-level scalar fields
+    (accountId, propertyVersion, etag, ...) are collected in `metadata` on the way.
+    """
+
+    def __init__(self, write, indent=4):
+        self.write = write
+        self.indent = ' ' * indent
+        self.depth = 0
+        self.pending_open = None
+        self.buffer = ''
+        self.key = None
+        self.expect_key = False
+        self.metadata = {}
+
+    def feed(self, text, final=False):
+        """Format the next piece of the document. Pass final=True with the last piece."""
+        self.buffer += text
+        position = 0
+        while position < len(self.buffer):
+            match = TOKEN.match(self.buffer, position)
+            if match is None or (match.end() == len(self.buffer) and not final):
+                break  # Incomplete token; wait for the next chunk
+            self._emit(match.group())
+            position = match.end()
+        self.buffer = self.buffer[position:]
+        if final and self.buffer.strip():
+            raise ValueError("Unexpected end of JSON document")
+
+    def _newline(self):
+        self.write('\n' + self.indent * self.depth)
+
+    def _emit(self, token):
+        if token.isspace():
+            return
+
+        if self.pending_open is not None:
+            opener, self.pending_open = self.pending_open, None
+            if token in '}]':
+                self.write(opener + token)  # Empty container stays on one line
+                self._after_value()
+                return
+            self.write(opener)
+            self.depth += 1
+            self.expect_key = self.depth == 1 and opener == '{'
+            self._newline()
+
+        if token in '{[':
+            self.pending_open = token
+        elif token in '}]':
+            self.depth -= 1
+            self._newline()
+            self.write(token)
+            self._after_value()
+        elif token == ',':
+            self.write(',')
+            self._newline()
+            self.expect_key = self.depth == 1
+        elif token == ':':
+            self.write(': ')
+        else:
+            self.write(token)
+            if self.depth == 1 and self.expect_key:
+                self.key = json.loads(token)
+                self.expect_key = False
+            elif self.depth == 1 and self.key is not None:
+                self.metadata[self.key] = json.loads(token)
+                self.key = None
+
+    def _after_value(self):
+        if self.depth == 1:
+            self.key = None
+
+
+def download_rule_tree(ASK, active_item, file_path):
+    """
+    Stream the rule tree of a property version straight to disk.
+
+    The response is written indented as it arrives, through a temporary file that
+    replaces `file_path` only once the download completed.
+
+    Returns:
+        dict: The top-level fields of the rule tree (everything except rules and lists).
+    """
+    qs = {'accountSwitchKey': ASK,
+          'contractId': active_item['contractId'],
+          'groupId': active_item['groupId']
+          }
+
+    response = client.get(
+        f"/papi/v1/properties/{active_item['propertyId']}/versions/{active_item['propertyVersion']}/rules",
+        params=qs, stream=True)
+
+    if response.status_code != 200:
+        print(f"Failed to fetch property rules. Status code: {response.status_code}")
+        exit(1)
+
+    temporary_path = f"{file_path}.part"
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with response, open(temporary_path, 'w', encoding='utf-8') as outfile:
+        formatter = JsonStreamFormatter(outfile.write)
+        for chunk in response.iter_content(CHUNK_SIZE):
+            formatter.feed(decoder.decode(chunk))
+        formatter.feed(decoder.decode(b'', final=True), final=True)
+        outfile.write('\n')
+    os.replace(temporary_path, file_path)
+
+    return formatter.metadata
+
+
+def iter_gzip_chunks(file, chunk_size=CHUNK_SIZE):
+    """Yield the gzip-compressed content of an open file, one chunk at a time."""
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def upload_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, file_path, compress=False):
+    """
+    PUT the rule tree file as the request body without loading it into memory.
+
+    With compress=True the body is gzip-compressed on the fly and sent with chunked
+    transfer encoding; otherwise the file is streamed as is with a Content-Length.
+    """
+    qs = {
+        'accountSwitchKey': ASK,
+        'contractId': contractId,
+        'groupId': groupId,
+        "validateMode": "full",
+        "validateRules": "false",
+        "dryRun": "false"
+    }
+
+    headers = {}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+
+    with open(file_path, 'rb') as file:
+        def body():
+            # Called once per attempt, so a retried request re-reads the file from the start
+            file.seek(0)
+            return iter_gzip_chunks(file) if compress else file
+
+        return client.put(f"/papi/v1/properties/{propertyId}/versions/{propertyVersion}/rules",
+                          headers=headers, params=qs, data=body)
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    if len(argv) < 2:
+        print("Usage: python3 rule_tree_stream.py <input.json> <output.json>")
+        print("Re-indents a rule tree file with bounded memory and prints its top-level fields.")
+        exit(1)
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(argv[0], 'rb') as infile, open(argv[1], 'w', encoding='utf-8') as outfile:
+        formatter = JsonStreamFormatter(outfile.write)
+        for chunk in iter(lambda: infile.read(CHUNK_SIZE), b''):
+            formatter.feed(decoder.decode(chunk))
+        formatter.feed(decoder.decode(b'', final=True), final=True)
+        outfile.write('\n')
+    print(json.dumps(formatter.metadata, indent=4))
+
+
+if __name__ == '__main__':
+    main()
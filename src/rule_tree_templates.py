@@ -0,0 +1,224 @@
+import copy
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from state_store import get_connection, transaction
+
+TEMPLATE_SUFFIX = '.template.json'
+
+# "${name}" in a string is replaced by the variable; a string that is only "${name}" takes the variable's type
+VARIABLE = re.compile(r'\$\{([A-Za-z0-9_.-]+)\}')
+
+# Parsed snippets, keyed by path and invalidated by modification time and size
+_snippet_cache = {}
+_snippet_lock = threading.Lock()
+
+
+def get_rule_tree_dir():
+    """Directory of the rule tree files and templates (AKAMAI_RULE_TREE_DIR, default src)."""
+    return os.getenv('AKAMAI_RULE_TREE_DIR', 'src')
+
+
+def get_snippet_dir():
+    """Directory of the shared snippets (AKAMAI_SNIPPET_DIR, default <rule tree dir>/snippets)."""
+    return os.getenv('AKAMAI_SNIPPET_DIR', os.path.join(get_rule_tree_dir(), 'snippets'))
+
+
+def get_template_file(property_name):
+    return os.path.join(get_rule_tree_dir(), f'{property_name}{TEMPLATE_SUFFIX}')
+
+
+def has_template(property_name):
+    return os.path.exists(get_template_file(property_name))
+
+
+def list_templates():
+    """Names of the properties whose rule tree is rendered from a template."""
+    return sorted(os.path.basename(path)[:-len(TEMPLATE_SUFFIX)]
+                  for path in glob.glob(os.path.join(get_rule_tree_dir(), f'*{TEMPLATE_SUFFIX}')))
+
+
+def _read(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def load_snippet(name):
+    """Return the parsed snippet, re-reading the file only when it changed."""
+    path = os.path.join(get_snippet_dir(), name)
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _snippet_lock:
+        cached = _snippet_cache.get(path)
+        if cached is None or cached[0] != key:
+            cached = (key, json.loads(_read(path)))
+            _snippet_cache[path] = cached
+    return copy.deepcopy(cached[1])
+
+
+def _substitute(text, variables, location):
+    whole = VARIABLE.fullmatch(text)
+    if whole:
+        if whole.group(1) not in variables:
+            raise Exception(f"{location}: undefined variable '{whole.group(1)}'")
+        return copy.deepcopy(variables[whole.group(1)])
+
+    def replace(match):
+        if match.group(1) not in variables:
+            raise Exception(f"{location}: undefined variable '{match.group(1)}'")
+        return str(variables[match.group(1)])
+    return VARIABLE.sub(replace, text)
+
+
+def expand(node, variables, used, stack=(), location='template'):
+    """
+    Expand includes and variables in a template node.
+
+    {"$include": "origin.json"} is replaced by the snippet; inside a list, a snippet
+    that holds a list is spliced in, so one snippet can add several behaviors.
+    Snippets may include other snippets; every snippet used is added to `used`.
+    """
+    if isinstance(node, dict):
+        if set(node) == {'$include'}:
+            name = node['$include']
+            if name in stack:
+                raise Exception(f"{location}: include cycle {' -> '.join(stack + (name,))}")
+            used.add(name)
+            return expand(load_snippet(name), variables, used, stack + (name,), f"snippets/{name}")
+        return {key: expand(value, variables, used, stack, location) for key, value in node.items()}
+
+    if isinstance(node, list):
+        expanded = []
+        for item in node:
+            value = expand(item, variables, used, stack, location)
+            is_include = isinstance(item, dict) and set(item) == {'$include'}
+            expanded.extend(value if is_include and isinstance(value, list) else [value])
+        return expanded
+
+    if isinstance(node, str) and '${' in node:
+        return _substitute(node, variables, location)
+    return node
+
+
+def render(property_name):
+    """
+    Render the template of the property.
+
+    The template is a rule tree that may contain includes and variables; its
+    top-level "$variables" object holds the per-property variable values.
+
+    Returns:
+        tuple: (rendered rule tree, set of snippet names used)
+    """
+    template = json.loads(_read(get_template_file(property_name)))
+    variables = dict(template.pop('$variables', {}), propertyName=property_name)
+    used = set()
+    return expand(template, variables, used, location=f"{property_name}{TEMPLATE_SUFFIX}"), used
+
+
+def input_hash(property_name, snippets):
+    """Hash of everything a render depends on: the template and the snippets it used last time."""
+    digest = hashlib.sha256(_read(get_template_file(property_name)))
+    for name in sorted(snippets):
+        path = os.path.join(get_snippet_dir(), name)
+        digest.update(name.encode('utf-8'))
+        digest.update(_read(path) if os.path.exists(path) else b'<missing>')
+    return digest.hexdigest()
+
+
+def _output_file(property_name):
+    return os.path.join(get_rule_tree_dir(), f'{property_name}.json')
+
+
+def render_if_changed(property_name, force=False):
+    """
+    Render the template to <propertyName>.json unless nothing it depends on changed.
+
+    The last render's input hash and the snippets it used are kept in the state store,
+    so an unchanged property costs a few file reads and no JSON processing.
+
+    Returns:
+        bool: True if the rule tree file was (re)written.
+    """
+    connection = get_connection()
+    snippets = {row['snippet'] for row in connection.execute(
+        'SELECT snippet FROM snippet_dependencies WHERE property_name = ?', (property_name,))}
+    previous = connection.execute('SELECT * FROM template_renders WHERE property_name = ?',
+                                  (property_name,)).fetchone()
+    output_file = _output_file(property_name)
+
+    if not force and previous is not None and os.path.exists(output_file):
+        output_hash = hashlib.sha256(_read(output_file)).hexdigest()
+        if previous['input_hash'] == input_hash(property_name, snippets):
+            if output_hash == previous['output_hash']:
+                return False
+            print(f"{output_file} was edited by hand; rendering it again from its template.")
+
+    rule_tree, used = render(property_name)
+    content = (json.dumps(rule_tree, indent=4) + '\n').encode('utf-8')
+    with open(f'{output_file}.part', 'wb') as file:
+        file.write(content)
+    os.replace(f'{output_file}.part', output_file)
+
+    with transaction():
+        connection.execute('DELETE FROM snippet_dependencies WHERE property_name = ?', (property_name,))
+        connection.executemany('INSERT INTO snippet_dependencies (snippet, property_name) VALUES (?, ?)',
+                               [(name, property_name) for name in sorted(used)])
+        connection.execute(
+            'INSERT OR REPLACE INTO template_renders (property_name, input_hash, output_hash, rendered_at) '
+            'VALUES (?, ?, ?, ?)',
+            (property_name, input_hash(property_name, used), hashlib.sha256(content).hexdigest(), time.time()))
+    return True
+
+
+def render_all(property_names=None, force=False):
+    """Render every template (or the given ones) that changed and return the names of those rewritten."""
+    return [name for name in (property_names or list_templates()) if render_if_changed(name, force)]
+
+
+def affected_properties(snippets):
+    """Properties whose last render used any of the snippets (names relative to the snippet directory)."""
+    snippets = list(snippets)
+    if not snippets:
+        return []
+    rows = get_connection().execute(
+        f"SELECT DISTINCT property_name FROM snippet_dependencies WHERE snippet IN ({', '.join('?' * len(snippets))}) "
+        f"ORDER BY property_name", snippets)
+    return [row['property_name'] for row in rows]
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    force = '--force' in argv
+    args = [arg for arg in argv if arg != '--force']
+    if not args or args[0] not in ('render', 'affected') or (args[0] == 'affected' and len(args) < 2):
+        print("Usage: python3 rule_tree_templates.py render [<propertyName> ...] [--force]")
+        print("       python3 rule_tree_templates.py affected <snippet> [...]")
+        exit(1)
+
+    try:
+        if args[0] == 'render':
+            start = time.monotonic()
+            names = args[1:] or list_templates()
+            rendered = render_all(names, force)
+            for name in rendered:
+                print(name)
+            print(f"Rendered {len(rendered)} of {len(names)} templates in {time.monotonic() - start:.2f}s.",
+                  file=sys.stderr)
+        else:
+            for name in affected_properties(args[1:]):
+                print(name)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from papi_client import client
+
+try:
+    import jsonschema
+except ImportError:  # Without jsonschema only the structural check runs
+    jsonschema = None
+
+# Rule format schemas are cached here; 'latest' is fetched again after SCHEMA_TTL seconds
+SCHEMA_DIR = os.getenv('AKAMAI_SCHEMA_DIR', str(Path.home().joinpath('.akamai', 'schemas')))
+SCHEMA_TTL = int(os.getenv('AKAMAI_SCHEMA_TTL', str(24 * 3600)))
+
+# AKAMAI_DRY_RUN=1 also validates the rule tree on PAPI (dryRun=true) against the editable version,
+# after create-version and before the rule tree is written to it
+DRY_RUN = os.getenv('AKAMAI_DRY_RUN', '0') == '1'
+
+VARIABLE_NAME = re.compile(r'^PMUSER_[A-Z0-9_]+$')
+
+# One lock per schema file, so a download only holds up validations that need the same schema
+_schema_lock = threading.Lock()
+_schema_file_locks = {}
+_product_ids = {}
+
+
+def get_product_id(ASK, propertyId, contractId, groupId):
+    """Return the product ID of the property (fetched once per process)."""
+    if propertyId not in _product_ids:
+        qs = {'accountSwitchKey': ASK, 'contractId': contractId, 'groupId': groupId}
+        response = client.get(f"/papi/v1/properties/{propertyId}", params=qs)
+        if response.status_code != 200:
+            raise Exception(f"Failed to fetch property {propertyId}. Status code: {response.status_code}")
+        _product_ids[propertyId] = response.json()['properties']['items'][0]['productId']
+    return _product_ids[propertyId]
+
+
+def get_schema_file(productId, ruleFormat):
+    return os.path.join(SCHEMA_DIR, f"{productId}-{ruleFormat}.json")
+
+
+def _lock_schema_file(schema_file):
+    with _schema_lock:
+        return _schema_file_locks.setdefault(schema_file, threading.Lock())
+
+
+def load_schema(ASK, productId, ruleFormat='latest'):
+    """
+    Return the PAPI JSON schema of the rule format for the product, from the local cache when possible.
+
+    Frozen rule formats never change and are cached for good. If the schema cannot be
+    fetched, a stale cached copy is used, or None when there is none.
+    """
+    schema_file = get_schema_file(productId, ruleFormat)
+    with _lock_schema_file(schema_file):
+        if os.path.exists(schema_file):
+            age = time.time() - os.path.getmtime(schema_file)
+            if ruleFormat != 'latest' or age < SCHEMA_TTL:
+                with open(schema_file, 'r') as file:
+                    return json.load(file)
+
+        response = client.get(f"/papi/v1/schemas/products/{productId}/{ruleFormat}", params={'accountSwitchKey': ASK})
+        if response.status_code != 200:
+            print(f"Failed to fetch the {ruleFormat} rule format schema. Status code: {response.status_code}")
+            if os.path.exists(schema_file):
+                with open(schema_file, 'r') as file:
+                    return json.load(file)
+            return None
+
+        os.makedirs(SCHEMA_DIR, exist_ok=True)
+        with open(f"{schema_file}.part", 'w') as file:
+            file.write(response.text)
+        os.replace(f"{schema_file}.part", schema_file)
+        return response.json()
+
+
+def _catalog_names(schema, kind):
+    """Behavior or criteria names the schema allows, or None if the schema does not list them."""
+    catalog = ((schema or {}).get('definitions') or {}).get('catalog') or {}
+    return set(catalog[kind]) if kind in catalog else None
+
+
+def structural_errors(rule, schema=None, path='#/rules'):
+    """
+    Check the shape of a rule and its children without jsonschema.
+
+    Returns:
+        list: Error messages, each prefixed with the JSON pointer of the offending element.
+    """
+    if not isinstance(rule, dict):
+        return [f"{path}: a rule must be an object"]
+
+    errors = []
+    if not isinstance(rule.get('name'), str) or not rule.get('name'):
+        errors.append(f"{path}/name: every rule needs a name")
+    if path == '#/rules' and rule.get('criteria'):
+        errors.append(f"{path}/criteria: the default rule cannot have criteria")
+    if rule.get('criteriaMustSatisfy', 'all') not in ('all', 'any'):
+        errors.append(f"{path}/criteriaMustSatisfy: must be 'all' or 'any'")
+
+    for kind in ('behaviors', 'criteria'):
+        items = rule.get(kind, [])
+        if not isinstance(items, list):
+            errors.append(f"{path}/{kind}: must be a list")
+            continue
+        allowed = _catalog_names(schema, kind)
+        for index, item in enumerate(items):
+            item_path = f"{path}/{kind}/{index}"
+            if not isinstance(item, dict) or not isinstance(item.get('name'), str):
+                errors.append(f"{item_path}: needs a name")
+            elif allowed is not None and item['name'] not in allowed:
+                errors.append(f"{item_path}: unknown {kind[:-1] if kind == 'behaviors' else 'criterion'} "
+                              f"'{item['name']}'")
+            elif not isinstance(item.get('options', {}), dict):
+                errors.append(f"{item_path}/options: must be an object")
+
+    for index, variable in enumerate(rule.get('variables', [])):
+        if not isinstance(variable, dict) or not VARIABLE_NAME.match(str(variable.get('name', ''))):
+            errors.append(f"{path}/variables/{index}: variable names must match PMUSER_[A-Z0-9_]+")
+
+    children = rule.get('children', [])
+    if not isinstance(children, list):
+        errors.append(f"{path}/children: must be a list")
+    else:
+        for index, child in enumerate(children):
+            errors.extend(structural_errors(child, schema, f"{path}/children/{index}"))
+    return errors
+
+
+def schema_errors(rule_tree, schema):
+    """Validate the rule tree against the schema with jsonschema; None when jsonschema is not installed."""
+    if jsonschema is None or schema is None:
+        return None
+    validator = jsonschema.validators.validator_for(schema)(schema)
+    return [f"#/{'/'.join(str(p) for p in error.absolute_path)}: {error.message}"
+            for error in validator.iter_errors({'rules': rule_tree['rules']})]
+
+
+def validate_locally(rule_tree, schema=None):
+    """Return the local validation errors of the rule tree (structural, plus jsonschema when available)."""
+    if 'rules' not in rule_tree:
+        return ["#/rules: the rule tree has no rules"]
+    errors = structural_errors(rule_tree['rules'], schema)
+    errors.extend(schema_errors(rule_tree, schema) or [])
+    return errors
+
+
+def dry_run(ASK, propertyId, propertyVersion, contractId, groupId, rule_tree):
+    """
+    Validate the rule tree on PAPI without saving it (dryRun=true, validateRules=true).
+
+    Returns:
+        tuple: (errors, warnings) as reported by PAPI, or None when the version does not
+            accept a dry run (e.g. it is active and locked).
+    """
+    qs = {
+        'accountSwitchKey': ASK,
+        'contractId': contractId,
+        'groupId': groupId,
+        "validateMode": "full",
+        "validateRules": "true",
+        "dryRun": "true"
+    }
+    response = client.put(f"/papi/v1/properties/{propertyId}/versions/{propertyVersion}/rules",
+                          params=qs, json={'rules': rule_tree['rules']})
+    if response.status_code in (403, 409):
+        return None
+    try:
+        body = response.json()
+    except ValueError:
+        # Gateways and proxies can answer with an HTML or empty error page
+        body = {'detail': response.text or f"Status code {response.status_code}"}
+    errors = body.get('errors', [])
+    if response.status_code not in (200, 201) and not errors:
+        errors = [body]
+    return errors, body.get('warnings', [])
+
+
+def validate_on_server(ASK, propertyId, propertyVersion, contractId, groupId, rule_tree):
+    """
+    Validate the rule tree on PAPI in a dry run against an editable version, raising on errors.
+
+    Activated versions are locked and reject a dry run; that is reported as a failure
+    rather than skipped, so a requested server-side check never silently does nothing.
+    """
+    result = dry_run(ASK, propertyId, propertyVersion, contractId, groupId, rule_tree)
+    if result is None:
+        raise Exception(f"Version {propertyVersion} is locked and does not accept a dry run; "
+                        f"the server-side check needs an editable version.")
+    errors, warnings = result
+    for warning in warnings:
+        print(f"Warning at {warning.get('errorLocation', '?')}: {warning.get('detail', warning)}")
+    if errors:
+        raise Exception("Rule tree failed server-side validation:\n  " + "\n  ".join(
+            f"{error.get('errorLocation', '?')}: {error.get('detail', error)}" for error in errors))
+    print("Server-side dry run passed.")
+
+
+def validate_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, rule_tree, server=False):
+    """
+    Validate the rule tree, raising on the first failing stage.
+
+    The local check runs against the cached rule format schema when it can be obtained,
+    and as a structural check only otherwise. With server=True, PAPI then validates the
+    rule tree in a dry run against the version, which must still be editable.
+    """
+    schema = None
+    try:
+        productId = get_product_id(ASK, propertyId, contractId, groupId)
+        schema = load_schema(ASK, productId, rule_tree.get('ruleFormat', 'latest'))
+    except Exception as e:
+        print(f"Rule format schema unavailable ({e}); running the structural check only.")
+
+    start = time.monotonic()
+    errors = validate_locally(rule_tree, schema)
+    print(f"Local validation found {len(errors)} errors in {(time.monotonic() - start) * 1000:.0f} ms.")
+    if errors:
+        raise Exception("Rule tree failed local validation:\n  " + "\n  ".join(errors))
+
+    if server:
+        validate_on_server(ASK, propertyId, propertyVersion, contractId, groupId, rule_tree)
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    flags = [arg for arg in argv if arg.startswith('--')]
+    args = [arg for arg in argv if not arg.startswith('--')]
+    if set(flags) - {'--dry-run', '--offline'}:
+        print("Usage: python3 rule_tree_validation.py [<propertyName>] [--dry-run] [--offline]")
+        print("  --dry-run  Also validate on PAPI without saving (dryRun=true); the stored version must be editable")
+        print("  --offline  Only run the structural check, without fetching the schema")
+        exit(1)
+
+    from credentials import load_switch_key
+    from state_store import load_relevant_data
+    from update_property_rule_tree import load_rule_tree
+
+    try:
+        relevant_data = load_relevant_data(args[0] if args else None)
+        rule_tree = load_rule_tree(relevant_data['propertyName'])
+
+        if '--offline' in flags:
+            errors = validate_locally(rule_tree)
+            for error in errors:
+                print(error)
+            exit(1 if errors else 0)
+
+        switch_key_data = load_switch_key()
+        if switch_key_data is None:
+            raise Exception("No switch key found. Exiting.")
+
+        validate_rule_tree(switch_key_data['switch_key'], relevant_data['propertyId'],
+                           relevant_data['propertyVersion'], relevant_data['contractId'], relevant_data['groupId'],
+                           rule_tree, server='--dry-run' in flags)
+        print(f"Rule tree for {relevant_data['propertyName']} is valid.")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
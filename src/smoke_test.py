@@ -0,0 +1,210 @@
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from requests import Session
+from requests.adapters import HTTPAdapter
+from instrumentation import percentile
+
+# Edge URL used to reach the property on each network
+SMOKE_URLS = {
+    'staging': 'http://{hostname}.edgesuite-staging.net',
+    'production': 'http://{hostname}',
+}
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_WORKERS = 20
+
+# Paths checked by run_smoke_test, comma-separated
+SMOKE_PATHS = os.getenv('AKAMAI_SMOKE_PATHS', '/').split(',')
+
+# Ask the edge to report cache status and cache key in the response headers
+PRAGMA_DEBUG = 'akamai-x-cache-on, akamai-x-check-cacheable, akamai-x-get-cache-key'
+
+_session = Session()
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def resize_pool(pool_size):
+    """
+    Keep up to `pool_size` connections alive per edge server.
+
+    The pool only grows. Bulk deploy workers smoke test concurrently over this session,
+    and remounting the adapters would drop the connections their requests are using.
+    """
+    global _pool_size
+    with _pool_lock:
+        if pool_size <= _pool_size:
+            return
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+        _pool_size = pool_size
+
+
+def get_smoke_url(hostname, environment):
+    """Return the URL that reaches the hostname on the given network."""
+    return SMOKE_URLS[environment.lower()].format(hostname=hostname)
+
+
+def resolve_edge_ips(hostname, environment):
+    """Return the IP addresses of the edge servers that serve the hostname on the network."""
+    edge_host = urlparse(get_smoke_url(hostname, environment)).hostname
+    return sorted(set(socket.gethostbyname_ex(edge_host)[2]))
+
+
+def check_response(url, hostname, timeout=DEFAULT_TIMEOUT):
+    """
+    Send a GET request for the hostname to the URL and check the status code.
+
+    A status code in the 2xx or 3xx range, or a 404, counts as a success.
+
+    Returns:
+        tuple: (passed, status_code)
+    """
+    passed, response = _get(url, hostname, timeout)
+    return passed, response.status_code
+
+
+def _get(url, hostname, timeout):
+    headers = {
+        'Connection': 'keep-alive',
+        'Host': hostname,
+        'Pragma': PRAGMA_DEBUG
+    }
+
+    response = _session.get(url, headers=headers, timeout=timeout, allow_redirects=False)
+    passed = (200 <= response.status_code < 400) or response.status_code == 404
+    return passed, response
+
+
+def build_matrix(hostnames, paths, environments, edge_ips=None, resolve=False):
+    """
+    Build the smoke test cases for hostnames x paths x edge targets.
+
+    By default each hostname is reached through the edge URL of each network. With
+    edge_ips, every request goes straight to those edge servers (an IP, or IP:port)
+    with the hostname in the Host header, so production hostnames can be tested on
+    staging edge servers before DNS points at them. With resolve, the edge URL of each
+    network is resolved and every edge server behind it is tested.
+    """
+    cases = []
+    for environment in environments:
+        for hostname in hostnames:
+            if edge_ips:
+                targets = [f'http://{ip}' for ip in edge_ips]
+            elif resolve:
+                targets = [f'http://{ip}' for ip in resolve_edge_ips(hostname, environment)]
+            else:
+                targets = [get_smoke_url(hostname, environment)]
+            for target in targets:
+                for path in paths:
+                    cases.append({'environment': environment, 'hostname': hostname, 'path': path,
+                                  'url': target + (path if path.startswith('/') else '/' + path)})
+    return cases
+
+
+def run_case(case, timeout=DEFAULT_TIMEOUT):
+    """Run one smoke test case and return it with status, latency and cache status filled in."""
+    result = dict(case, passed=False, status=None, seconds=None, cache=None, error=None)
+    start = time.monotonic()
+    try:
+        passed, response = _get(case['url'], case['hostname'], timeout)
+        result.update(passed=passed, status=response.status_code,
+                      cache=(response.headers.get('X-Cache') or '').split(' ')[0] or None)
+    except Exception as e:
+        result['error'] = str(e) or e.__class__.__name__
+    result['seconds'] = time.monotonic() - start
+    return result
+
+
+def run_matrix(cases, max_workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT):
+    """Run all cases concurrently over one pooled session and return the results in case order."""
+    resize_pool(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda case: run_case(case, timeout), cases))
+
+
+def summarize(results):
+    """Latency percentiles and cache status counts of a set of results."""
+    latencies = [r['seconds'] for r in results if r['error'] is None]
+    cache = {}
+    for result in results:
+        if result['cache']:
+            cache[result['cache']] = cache.get(result['cache'], 0) + 1
+    return {
+        'requests': len(results),
+        'failed': sum(1 for r in results if not r['passed']),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'cache': cache,
+    }
+
+
+def print_report(results):
+    """Print every failure and a latency and cache status summary per network."""
+    for result in results:
+        if not result['passed']:
+            print(f"FAILED {result['url']} (Host: {result['hostname']}): "
+                  f"{result['error'] or result['status']}")
+
+    for environment in sorted({r['environment'] for r in results}):
+        summary = summarize([r for r in results if r['environment'] == environment])
+        cache = ', '.join(f"{status} {count}" for status, count in sorted(summary['cache'].items())) or 'n/a'
+        print(f"{environment.upper()}: {summary['requests'] - summary['failed']}/{summary['requests']} passed, "
+              f"p50 {summary['p50_ms']:.0f} ms, p95 {summary['p95_ms']:.0f} ms, p99 {summary['p99_ms']:.0f} ms, "
+              f"cache: {cache}")
+
+
+def run_smoke_test(hostname, environment, paths=None, edge_ips=None):
+    """Run the smoke test for the hostname on the network and return True if it passed."""
+    results = run_matrix(build_matrix([hostname], paths or SMOKE_PATHS, [environment.lower()], edge_ips))
+    for result in results:
+        outcome = 'PASSED' if result['passed'] else 'FAILED'
+        print(f"Smoke test {result['url']} (Host: {hostname}): {result['error'] or result['status']} {outcome}")
+    return all(result['passed'] for result in results)
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    options = {}
+    args = []
+    iterator = iter(argv)
+    for arg in iterator:
+        if arg == '--resolve':
+            options[arg] = True
+        elif arg.startswith('--'):
+            options[arg] = next(iterator, '')
+        else:
+            args.append(arg)
+
+    if len(args) < 2 or args[0].lower() not in list(SMOKE_URLS) + ['both']:
+        print("Usage: python3 smoke_test.py <staging|production|both> <hostname>[,<hostname>...] "
+              "[--paths /,/about] [--edge-ips IP,IP:port] [--resolve] [--workers N] [--timeout S]")
+        print("Example: python3 smoke_test.py staging www.cyberabstract.com")
+        print("Example: python3 smoke_test.py production www.cyberabstract.com --edge-ips 23.50.48.10")
+        exit(1)
+
+    environments = list(SMOKE_URLS) if args[0].lower() == 'both' else [args[0].lower()]
+    edge_ips = options['--edge-ips'].split(',') if options.get('--edge-ips') else None
+    cases = build_matrix(args[1].split(','), options.get('--paths', ','.join(SMOKE_PATHS)).split(','),
+                         environments, edge_ips, options.get('--resolve', False))
+
+    start = time.monotonic()
+    results = run_matrix(cases, int(options.get('--workers', DEFAULT_WORKERS)),
+                         float(options.get('--timeout', DEFAULT_TIMEOUT)))
+    print_report(results)
+    print(f"{len(results)} requests in {time.monotonic() - start:.1f}s")
+
+    exit(0 if all(result['passed'] for result in results) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,404 @@
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Fields of a property that get their own indexed column; anything else (rulesHash, ...) lives in `data`
+PROPERTY_COLUMNS = {
+    'accountId': 'account_id',
+    'propertyId': 'property_id',
+    'propertyName': 'property_name',
+    'contractId': 'contract_id',
+    'groupId': 'group_id',
+    'propertyVersion': 'property_version',
+    'etag': 'etag',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS properties (
+    account_id TEXT NOT NULL,
+    property_id TEXT NOT NULL,
+    property_name TEXT NOT NULL,
+    contract_id TEXT,
+    group_id TEXT,
+    property_version INTEGER,
+    etag TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (account_id, property_id)
+);
+CREATE INDEX IF NOT EXISTS properties_by_name ON properties (property_name);
+CREATE INDEX IF NOT EXISTS properties_by_updated_at ON properties (updated_at);
+
+CREATE TABLE IF NOT EXISTS property_versions (
+    account_id TEXT NOT NULL,
+    property_id TEXT NOT NULL,
+    property_version INTEGER NOT NULL,
+    etag TEXT,
+    rules_hash TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (account_id, property_id, property_version)
+);
+
+CREATE TABLE IF NOT EXISTS catalog_properties (
+    account_key TEXT NOT NULL,
+    property_id TEXT NOT NULL,
+    property_name TEXT NOT NULL,
+    account_id TEXT,
+    contract_id TEXT,
+    group_id TEXT,
+    asset_id TEXT,
+    latest_version INTEGER,
+    staging_version INTEGER,
+    production_version INTEGER,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (account_key, property_id)
+);
+CREATE INDEX IF NOT EXISTS catalog_properties_by_name ON catalog_properties (property_name);
+CREATE INDEX IF NOT EXISTS catalog_properties_by_synced_at ON catalog_properties (synced_at);
+
+CREATE TABLE IF NOT EXISTS catalog_hostnames (
+    account_key TEXT NOT NULL,
+    hostname TEXT NOT NULL,
+    property_id TEXT NOT NULL,
+    contract_id TEXT,
+    group_id TEXT,
+    staging_cname_to TEXT,
+    production_cname_to TEXT,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (account_key, hostname, property_id)
+);
+CREATE INDEX IF NOT EXISTS catalog_hostnames_by_hostname ON catalog_hostnames (hostname);
+
+CREATE TABLE IF NOT EXISTS catalog_etags (
+    account_key TEXT NOT NULL,
+    path TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (account_key, path)
+);
+
+CREATE TABLE IF NOT EXISTS template_renders (
+    property_name TEXT PRIMARY KEY,
+    input_hash TEXT NOT NULL,
+    output_hash TEXT NOT NULL,
+    rendered_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS snippet_dependencies (
+    snippet TEXT NOT NULL,
+    property_name TEXT NOT NULL,
+    PRIMARY KEY (snippet, property_name)
+);
+CREATE INDEX IF NOT EXISTS snippet_dependencies_by_property ON snippet_dependencies (property_name);
+
+CREATE TABLE IF NOT EXISTS activation_history (
+    activation_id TEXT PRIMARY KEY,
+    property_id TEXT NOT NULL,
+    property_name TEXT,
+    property_version INTEGER,
+    network TEXT NOT NULL,
+    status TEXT NOT NULL,
+    submitted_at REAL NOT NULL,
+    finished_at REAL,
+    duration REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS activation_history_by_submitted_at ON activation_history (network, submitted_at);
+
+CREATE TABLE IF NOT EXISTS activation_events (
+    activation_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (activation_id, status)
+);
+
+CREATE TABLE IF NOT EXISTS known_good_versions (
+    property_id TEXT NOT NULL,
+    network TEXT NOT NULL,
+    property_version INTEGER NOT NULL,
+    activation_id TEXT,
+    verified_at REAL NOT NULL,
+    PRIMARY KEY (property_id, network, property_version)
+);
+
+CREATE TABLE IF NOT EXISTS deploy_steps (
+    run_id TEXT NOT NULL,
+    command TEXT NOT NULL,
+    step TEXT NOT NULL,
+    runs INTEGER NOT NULL,
+    total_seconds REAL NOT NULL,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (run_id, step)
+);
+CREATE INDEX IF NOT EXISTS deploy_steps_by_recorded_at ON deploy_steps (recorded_at);
+
+CREATE TABLE IF NOT EXISTS switch_keys (
+    account_name TEXT PRIMARY KEY,
+    switch_key TEXT NOT NULL,
+    selected INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+"""
+
+_local = threading.local()
+
+
+def get_state_db_file():
+    """Get the file path of the state database (override with AKAMAI_STATE_DB)."""
+    return os.getenv('AKAMAI_STATE_DB', os.path.join(SRC_DIR, 'state.db'))
+
+
+def get_connection():
+    """
+    Return this thread's connection to the state database, creating it on first use.
+
+    The database runs in WAL mode so readers never block the single writer, and a
+    busy timeout lets concurrent pipelines wait for each other instead of failing.
+    """
+    path = get_state_db_file()
+    connection = getattr(_local, 'connection', None)
+    if connection is not None and _local.path == path:
+        return connection
+
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    _local.connection = connection
+    _local.path = path
+    return connection
+
+
+@contextmanager
+def transaction():
+    """Run a write transaction that takes the database lock up front."""
+    connection = get_connection()
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield connection
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def _row_to_property(row):
+    """Convert a `properties` row into the dict format the scripts use."""
+    relevant_data = json.loads(row['data'])
+    for field, column in PROPERTY_COLUMNS.items():
+        relevant_data[field] = row[column]
+    return relevant_data
+
+
+def load_relevant_data(property_name=None):
+    """
+    Load the state of a property.
+
+    Args:
+        property_name (str): The property to load. Defaults to AKAMAI_PROPERTY_NAME. There is
+            no other default, so concurrent pipelines never act on each other's property.
+
+    Returns:
+        dict: The property fields (contractId, groupId, propertyId, propertyVersion, etag, ...).
+    """
+    property_name = property_name or os.getenv('AKAMAI_PROPERTY_NAME')
+    if not property_name:
+        raise Exception("No property name given. Pass the property name or set AKAMAI_PROPERTY_NAME.")
+
+    row = get_connection().execute('SELECT * FROM properties WHERE property_name = ? '
+                                   'ORDER BY updated_at DESC LIMIT 1', (property_name,)).fetchone()
+    if row is None:
+        raise Exception(f"No state found for property '{property_name}' in {get_state_db_file()}.")
+    return _row_to_property(row)
+
+
+def save_relevant_data(new_data, property_name=None):
+    """
+    Atomically merge new fields into the state of a property and return the merged state.
+
+    If new_data identifies a property (accountId and propertyId) it is upserted directly;
+    otherwise the fields are merged into the state of the named property.
+    """
+    with transaction():
+        if 'propertyId' in new_data and 'accountId' in new_data:
+            existing = get_connection().execute(
+                'SELECT * FROM properties WHERE account_id = ? AND property_id = ?',
+                (new_data['accountId'], new_data['propertyId'])).fetchone()
+            relevant_data = _row_to_property(existing) if existing else {}
+        else:
+            relevant_data = load_relevant_data(property_name)
+
+        relevant_data.update(new_data)
+        _upsert_property(relevant_data)
+
+    return relevant_data
+
+
+def _upsert_property(relevant_data):
+    """Write a full property state inside an open transaction."""
+    now = time.time()
+    extra = {k: v for k, v in relevant_data.items() if k not in PROPERTY_COLUMNS}
+    connection = get_connection()
+    connection.execute(
+        """
+        INSERT INTO properties (account_id, property_id, property_name, contract_id, group_id,
+                                property_version, etag, data, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (account_id, property_id) DO UPDATE SET
+            property_name = excluded.property_name,
+            contract_id = excluded.contract_id,
+            group_id = excluded.group_id,
+            property_version = excluded.property_version,
+            etag = excluded.etag,
+            data = excluded.data,
+            updated_at = excluded.updated_at
+        """,
+        (relevant_data.get('accountId', ''), relevant_data['propertyId'], relevant_data['propertyName'],
+         relevant_data.get('contractId'), relevant_data.get('groupId'), relevant_data.get('propertyVersion'),
+         relevant_data.get('etag'), json.dumps(extra), now))
+
+    if relevant_data.get('propertyVersion') is not None:
+        # The merged state can carry the rulesHash of an earlier version, so version hashes are only
+        # written by save_version_hash once the rules are known to be on the version
+        connection.execute(
+            """
+            INSERT INTO property_versions (account_id, property_id, property_version, etag, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (account_id, property_id, property_version) DO UPDATE SET
+                etag = COALESCE(excluded.etag, property_versions.etag),
+                updated_at = excluded.updated_at
+            """,
+            (relevant_data.get('accountId', ''), relevant_data['propertyId'], relevant_data['propertyVersion'],
+             relevant_data.get('etag'), now))
+
+
+def load_version_hash(propertyId, propertyVersion):
+    """Return the stored rule tree hash of a property version, or None if it is not known."""
+    row = get_connection().execute(
+        'SELECT rules_hash FROM property_versions WHERE property_id = ? AND property_version = ? '
+        'AND rules_hash IS NOT NULL ORDER BY updated_at DESC LIMIT 1', (propertyId, int(propertyVersion))).fetchone()
+    return row['rules_hash'] if row else None
+
+
+def save_version_hash(accountId, propertyId, propertyVersion, rules_hash, etag=None):
+    """Store the rule tree hash of a property version without touching the property's state."""
+    with transaction() as connection:
+        connection.execute(
+            """
+            INSERT INTO property_versions (account_id, property_id, property_version, etag, rules_hash, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (account_id, property_id, property_version) DO UPDATE SET
+                etag = COALESCE(excluded.etag, property_versions.etag),
+                rules_hash = excluded.rules_hash,
+                updated_at = excluded.updated_at
+            """,
+            (accountId or '', propertyId, int(propertyVersion), etag, rules_hash, time.time()))
+
+
+def load_switch_key_data(account_name=None):
+    """Return the stored switch key for the account (or the selected one), or None."""
+    connection = get_connection()
+    if account_name:
+        row = connection.execute('SELECT * FROM switch_keys WHERE account_name = ?', (account_name,)).fetchone()
+    else:
+        row = connection.execute('SELECT * FROM switch_keys ORDER BY selected DESC, updated_at DESC '
+                                 'LIMIT 1').fetchone()
+    if row is None:
+        return None
+    return {'switch_key': row['switch_key'], 'account_name': row['account_name']}
+
+
+def save_switch_key_data(switch_key_data):
+    """Store a switch key and make it the selected one."""
+    with transaction() as connection:
+        connection.execute('UPDATE switch_keys SET selected = 0')
+        connection.execute(
+            """
+            INSERT INTO switch_keys (account_name, switch_key, selected, updated_at) VALUES (?, ?, 1, ?)
+            ON CONFLICT (account_name) DO UPDATE SET
+                switch_key = excluded.switch_key, selected = 1, updated_at = excluded.updated_at
+            """,
+            (switch_key_data['account_name'], switch_key_data['switch_key'], time.time()))
+
+
+def save_switch_keys(switch_keys):
+    """Store a batch of switch keys without changing which one is selected."""
+    now = time.time()
+    with transaction() as connection:
+        connection.executemany(
+            """
+            INSERT INTO switch_keys (account_name, switch_key, selected, updated_at) VALUES (?, ?, 0, ?)
+            ON CONFLICT (account_name) DO UPDATE SET
+                switch_key = excluded.switch_key, updated_at = excluded.updated_at
+            """,
+            [(data['account_name'], data['switch_key'], now) for data in switch_keys])
+
+
+def list_switch_keys():
+    """Return every stored switch key, the selected one first."""
+    rows = get_connection().execute('SELECT * FROM switch_keys ORDER BY selected DESC, account_name')
+    return [{'switch_key': row['switch_key'], 'account_name': row['account_name'], 'selected': bool(row['selected'])}
+            for row in rows]
+
+
+def switch_keys_age():
+    """Seconds since switch keys were last stored, or None if there are none."""
+    updated_at = get_connection().execute('SELECT MAX(updated_at) FROM switch_keys').fetchone()[0]
+    return None if updated_at is None else time.time() - updated_at
+
+
+def import_pickles(directory):
+    """
+    Import property_fields.pkl and switch_key.pkl from the directory, if present.
+
+    This only runs from `state_store.py import`; a new database starts empty.
+    """
+    property_pkl = os.path.join(directory, 'property_fields.pkl')
+    switch_key_pkl = os.path.join(directory, 'switch_key.pkl')
+    imported = []
+
+    if os.path.exists(property_pkl):
+        with open(property_pkl, 'rb') as pklfile:
+            relevant_data = pickle.load(pklfile)
+        with transaction():
+            _upsert_property(relevant_data)
+        imported.append(property_pkl)
+
+    if os.path.exists(switch_key_pkl):
+        with open(switch_key_pkl, 'rb') as pklfile:
+            save_switch_key_data(pickle.load(pklfile))
+        imported.append(switch_key_pkl)
+
+    return imported
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    if not argv or argv[0] not in ('import', 'show'):
+        print("Usage: python3 state_store.py import [<directory>]")
+        print("       python3 state_store.py show [<propertyName>]")
+        exit(1)
+
+    try:
+        if argv[0] == 'import':
+            for path in import_pickles(argv[1] if len(argv) > 1 else SRC_DIR):
+                print(f"Imported {path} into {get_state_db_file()}")
+        else:
+            print(json.dumps(load_relevant_data(argv[1] if len(argv) > 1 else None), indent=4))
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
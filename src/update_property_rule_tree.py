@@ -1,43 +1,126 @@
+import hashlib
 import json
-import pickle
 import os
-from credentials import load_switch_key, session, baseurl
-from urllib.parse import urljoin
+import sys
+import tempfile
+from credentials import load_switch_key
+from papi_client import client
+from state_store import load_relevant_data, save_relevant_data, save_version_hash
+from rule_tree_hash import rules_hash
+from property_search import get_property
+from rule_tree_diff import diff_rule_trees, patch_is_worthwhile
+from rule_tree_stream import CHUNK_SIZE, upload_rule_tree
+from instrumentation import logger
+from rule_tree_templates import get_rule_tree_dir, has_template, render_if_changed
+import rule_tree_optimizer
+
+# Rule tree files larger than this are uploaded straight from disk
+STREAM_THRESHOLD = int(os.getenv('AKAMAI_STREAM_THRESHOLD', str(20 * 1024 * 1024)))
+
+
+def get_rule_tree_file(property_name):
+    """Get the path of the local rule tree file (the directory can be changed with AKAMAI_RULE_TREE_DIR)."""
+    return os.path.join(get_rule_tree_dir(), f'{property_name}.json')
+
+
+def load_rule_tree(property_name):
+    """
+    Load the local rule tree for the property from src/<propertyName>.json.
+
+    If the property has a template (<propertyName>.template.json), the file is
+    rendered from it first whenever the template or one of its snippets changed.
+    With AKAMAI_OPTIMIZE_RULES=1 the optimized rule tree is returned.
+    """
+    json_file_path = get_rule_tree_file(property_name)
+    if has_template(property_name):
+        render_if_changed(property_name)
 
+    try:
+        with open(json_file_path, 'r') as file:
+            rule_tree = json.load(file)
+    except FileNotFoundError:
+        print(f"JSON file for property '{property_name}' not found at {json_file_path}. Exiting.")
+        exit(1)
 
-def get_property_pkl_file():
-    """Get the file path of the property pickle file."""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(current_dir, 'property_fields.pkl')
+    if rule_tree_optimizer.OPTIMIZE:
+        rule_tree, report = rule_tree_optimizer.optimize_rule_tree(rule_tree)
+        if any(report['folds'].values()):
+            print(f"Optimized {property_name}: {report['before']['rules']} -> {report['after']['rules']} rules, "
+                  f"{report['before']['bytes']} -> {report['after']['bytes']} bytes.")
+    return rule_tree
 
 
-def load_relevant_data_from_pkl():
-    """Load the relevant data for the property from the pickle file."""
-    pkl_file_path = get_property_pkl_file()
+def is_streamed(property_name):
+    """Return True if the rule tree file is larger than STREAM_THRESHOLD and is uploaded from disk."""
+    file_path = get_rule_tree_file(property_name)
+    return os.path.exists(file_path) and os.path.getsize(file_path) > STREAM_THRESHOLD
 
-    if not os.path.exists(pkl_file_path):
-        raise FileNotFoundError(f"Pickle file '{pkl_file_path}' not found for the property.")
 
-    try:
-        with open(pkl_file_path, 'rb') as pklfile:
-            relevant_data = pickle.load(pklfile)
-        return relevant_data
-    except pickle.UnpicklingError as e:
-        raise Exception(f"Error while unpickling the file: {e}")
+def prepare_rule_tree(property_name):
+    """
+    Load the rule tree to deploy, or snapshot it when it is too large to hold in memory.
+
+    The decision is made on the file size before anything is loaded. A file above
+    STREAM_THRESHOLD bytes is copied to a private temporary file that push_rule_tree
+    streams, so later changes to the checkout do not affect the deployment. Its hash is
+    a SHA-256 of the file bytes, computed while copying, so reformatting it counts as a change.
+
+    Returns:
+        tuple: (rule tree or None, snapshot path or None, hash)
+    """
+    if has_template(property_name):
+        render_if_changed(property_name)
+    if not is_streamed(property_name):
+        rule_tree = load_rule_tree(property_name)
+        return rule_tree, None, rules_hash(rule_tree)
+
+    digest = hashlib.sha256()
+    fd, snapshot = tempfile.mkstemp(prefix=f'{property_name}.', suffix='.json')
+    with open(get_rule_tree_file(property_name), 'rb') as source, os.fdopen(fd, 'wb') as target:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            target.write(chunk)
+    return None, snapshot, digest.hexdigest()
+
+
+def load_snapshot(snapshot):
+    """Load a snapshot taken by prepare_rule_tree, for the steps that need the parsed rule tree."""
+    with open(snapshot, 'r') as file:
+        return json.load(file)
 
 
-def update_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, property_name):
-    """Update the rule tree for a specific property version."""
+def remove_snapshot(snapshot):
+    """Delete a snapshot taken by prepare_rule_tree, if there is one."""
+    if snapshot and os.path.exists(snapshot):
+        os.remove(snapshot)
+
+
+def update_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, property_name, payload=None, etag=None):
+    """Update the rule tree for a specific property version, only if it still has `etag` when one is given."""
     # Dynamically load the rule tree payload using propertyName from relevant data
-    json_file_path = os.path.join('src', f'{property_name}.json')
+    if payload is None:
+        payload = load_rule_tree(property_name)
 
-    try:
-        with open(json_file_path, 'r') as file:
-            payload = json.load(file)
-    except FileNotFoundError:
-        print(f"JSON file for property '{property_name}' not found at {json_file_path}. Exiting.")
-        exit(1)
+    qs = {
+        'accountSwitchKey': ASK,
+        'contractId': contractId,
+        'groupId': groupId,
+        "validateMode": "full",
+        "validateRules": "false",
+        "dryRun": "false"
+    }
+
+    headers = {"If-Match": f'"{etag}"'} if etag else {}
+
+    # Send the PUT request to update the rule tree
+    response = client.put(f"/papi/v1/properties/{propertyId}/versions/{propertyVersion}/rules",
+                          headers=headers, params=qs, json=payload)
+
+    return response
 
+
+def patch_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, patch, etag):
+    """Apply a JSON Patch to the rule tree of a specific property version."""
     qs = {
         'accountSwitchKey': ASK,
         'contractId': contractId,
@@ -48,19 +131,65 @@ def update_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, prop
     }
 
     headers = {
-        "accept": "application/json",
-        "PAPI-Use-Prefixes": "false",
-        "content-type": "application/json"
+        "content-type": "application/json-patch+json",
+        "If-Match": f'"{etag}"'
     }
 
-    # Send the PUT request to update the rule tree
-    response = session.put(urljoin(baseurl, f"/papi/v1/properties/{propertyId}/versions/{propertyVersion}/rules"),
-                           headers=headers, params=qs, json=payload)
+    response = client.patch(f"/papi/v1/properties/{propertyId}/versions/{propertyVersion}/rules",
+                            headers=headers, params=qs, json=patch)
 
     return response
 
 
-if __name__ == '__main__':
+def push_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, property_name, local_tree=None,
+                   snapshot=None):
+    """
+    Push the local rule tree, sending only the changed subtrees when possible.
+
+    The rule tree currently stored on the version is diffed against the local
+    file. A small diff is sent as a JSON Patch; a large one falls back to a full PUT.
+    Files above STREAM_THRESHOLD bytes are streamed from disk without diffing.
+    Pass the `local_tree` or `snapshot` from prepare_rule_tree to push what was loaded
+    before instead of reading the file again.
+
+    Returns:
+        Response: The PATCH or PUT response, or None if the rule trees are already identical.
+    """
+    file_path = snapshot or get_rule_tree_file(property_name)
+    if snapshot or (local_tree is None and is_streamed(property_name)):
+        # Diffing needs both trees in memory; stream very large files straight from disk instead
+        print(f"{file_path} is larger than {STREAM_THRESHOLD} bytes; streaming the full rule tree.")
+        return upload_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, file_path,
+                                compress=os.getenv('AKAMAI_GZIP_UPLOAD') == '1')
+
+    if local_tree is None:
+        local_tree = load_rule_tree(property_name)
+    deployed_tree = get_property({'contractId': contractId, 'groupId': groupId,
+                                  'propertyId': propertyId, 'propertyVersion': propertyVersion}, ASK)
+
+    patch = diff_rule_trees(deployed_tree, local_tree)
+    if not patch:
+        print(f"Rule tree of version {propertyVersion} already matches {property_name}.json. Nothing to update.")
+        return None
+
+    if patch_is_worthwhile(patch, local_tree):
+        print(f"Sending JSON Patch with {len(patch)} operations.")
+        return patch_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, patch, deployed_tree['etag'])
+
+    print(f"Diff has {len(patch)} operations; sending the full rule tree instead.")
+    return update_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, property_name, local_tree,
+                            deployed_tree['etag'])
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    if len(argv) > 1 or any(arg.startswith('-') for arg in argv):
+        print("Usage: python3 update_property_rule_tree.py [<propertyName>]")
+        print("  The property defaults to AKAMAI_PROPERTY_NAME.")
+        exit(1)
+
     try:
         # Step 1: Load the existing account switch key (ASK)
         switch_key_data = load_switch_key()
@@ -68,10 +197,10 @@ if __name__ == '__main__':
             raise Exception("No switch key found. Exiting.")
         ASK = switch_key_data['switch_key']
 
-        # Step 2: Load relevant data from the pickle file for the property
-        relevant_data = load_relevant_data_from_pkl()
+        # Step 2: Load relevant data from the state store for the property
+        relevant_data = load_relevant_data(argv[0] if argv else None)
 
-        # Extract relevant fields from the pickle file
+        # Extract relevant fields from the state store
         contractId = relevant_data['contractId']
         groupId = relevant_data['groupId']
         propertyId = relevant_data['propertyId']
@@ -79,11 +208,29 @@ if __name__ == '__main__':
         property_name = relevant_data['propertyName']  # Dynamically load property name
 
         # Step 3: Update the rule tree for the specific property version using the loaded data
-        response = update_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, property_name)
-
-        # Step 4: Print the status of the API response
-        print(f"Response status code: {response.status_code}")
-        print(response.json())  # Optionally, print the full response for debugging
+        local_tree, snapshot, local_hash = prepare_rule_tree(property_name)
+        try:
+            response = push_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, property_name,
+                                      local_tree, snapshot)
+        finally:
+            remove_snapshot(snapshot)
+
+        # Step 4: Print the status of the API response and keep the etag the write gave the version,
+        # so the next create-version or rule tree write sends a matching etag
+        etag = relevant_data['etag']
+        if response is not None:
+            print(f"Response status code: {response.status_code}")
+            logger.debug("Rule tree update response", extra={'event': 'response', 'body': response.text})
+            if response.status_code != 200:
+                raise Exception(f"Rule tree update failed. Status code: {response.status_code}")
+            etag = response.json().get('etag', etag)
+            save_relevant_data({'etag': etag}, property_name)
+        save_version_hash(relevant_data.get('accountId'), propertyId, propertyVersion, local_hash, etag)
 
     except Exception as e:
         print(f"An error occurred: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+End-to-end deploy benchmark against the local PAPI mock server.
+
+    python3 tests/benchmark_deploy.py [--sizes 1,10,500] [--workers 20] [--latency 0.02]
+                                      [--pending 1] [--throttle 0.01] [--rate 1000]
+
+For every fleet size it runs the bulk pipeline (create version, update rules,
+activate on staging) against a fresh mock and reports API calls/sec, p50/p99
+request latency and the total deploy time.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from instrumentation import percentile  # noqa: E402
+from papi_mock_server import MockPapi, start_mock_server  # noqa: E402
+
+
+def write_rule_trees(papi, directory):
+    """Write a local rule tree per mock property that differs from the deployed one."""
+    for entry in papi.manifest():
+        tree = papi.rule_tree(entry['propertyId'], 1)
+        tree['rules']['behaviors'][1]['options']['ttl'] = '7d'
+        with open(os.path.join(directory, f"{entry['propertyName']}.json"), 'w') as file:
+            json.dump(tree, file)
+
+
+def run_benchmark(size, workers, latency, pending, throttle, rate):
+    """Deploy `size` properties against a fresh mock and return the measurements."""
+    import bulk_deploy
+    from papi_client import client, TokenBucket
+
+    papi = MockPapi([f'www{i}.example.com' for i in range(size)], latency=latency,
+                    pending_duration=pending, throttle_rate=throttle)
+    server, base_url = start_mock_server(papi)
+    client._baseurl = base_url
+    client.bucket = TokenBucket(rate, rate)
+
+    latencies = []
+    hook = lambda response, *args, **kwargs: latencies.append(response.elapsed.total_seconds())  # noqa: E731
+    client.session.hooks['response'].append(hook)
+
+    try:
+        with tempfile.TemporaryDirectory() as rule_tree_dir:
+            os.environ['AKAMAI_RULE_TREE_DIR'] = rule_tree_dir
+            write_rule_trees(papi, rule_tree_dir)
+
+            # Only PAPI is measured; the mock hostnames are not served anywhere
+            bulk_deploy.run_smoke_test = lambda hostname, network: True
+            start = time.monotonic()
+            results = bulk_deploy.run_bulk_deploy('MOCK-ASK', papi.manifest(), 'staging', workers)
+            elapsed = time.monotonic() - start
+    finally:
+        client.session.hooks['response'].remove(hook)
+        server.shutdown()
+
+    return {
+        'properties': size,
+        'failed': sum(1 for r in results if r['status'] == 'FAILED'),
+        'calls': papi.request_count,
+        'throttled': papi.throttled_count,
+        'calls_per_sec': papi.request_count / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'total_s': elapsed,
+    }
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+    options = dict(zip(argv[::2], argv[1::2]))
+
+    os.environ.setdefault('AKAMAI_API_BASEURL', 'http://127.0.0.1')
+    os.environ.setdefault('AKAMAI_STATE_DB', os.path.join(tempfile.mkdtemp(), 'state.db'))
+    os.environ.setdefault('AKAMAI_SCHEMA_DIR', tempfile.mkdtemp())
+
+    import activation_watcher
+    # Activations in the mock finish in seconds, so poll at that scale
+    activation_watcher.INITIAL_INTERVAL = float(options.get('--poll', 0.2))
+    activation_watcher.MAX_INTERVAL = activation_watcher.INITIAL_INTERVAL * 4
+
+    sizes = [int(size) for size in options.get('--sizes', '1,10,500').split(',')]
+    results = []
+    for size in sizes:
+        results.append(run_benchmark(size, int(options.get('--workers', 20)),
+                                     float(options.get('--latency', 0.02)), float(options.get('--pending', 1)),
+                                     float(options.get('--throttle', 0.01)), float(options.get('--rate', 1000))))
+
+    print()
+    print(f"{'properties':>10} {'failed':>7} {'calls':>7} {'429s':>6} {'calls/s':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'total s':>8}")
+    for r in results:
+        print(f"{r['properties']:>10} {r['failed']:>7} {r['calls']:>7} {r['throttled']:>6} "
+              f"{r['calls_per_sec']:>9.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['total_s']:>8.2f}")
+
+    exit(0 if all(r['failed'] == 0 for r in results) else 1)
+
+
+if __name__ == '__main__':
+    main()
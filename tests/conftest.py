@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+# The scripts in src/ import each other as top-level modules, so put src/ on the path for the tests.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+
+@pytest.fixture
+def start_mock_papi(tmp_path, monkeypatch):
+    """
+    Start a mock PAPI server and point the scripts at it.
+
+    Call it with the mock property names and any MockPapi options. The state store,
+    the rule tree directory and the schema cache go to tmp_path, and the rate limit,
+    retry backoff and activation poll intervals are shortened for the tests.
+    """
+    import activation_watcher
+    from papi_client import client, TokenBucket
+    from papi_mock_server import MockPapi, start_mock_server
+
+    servers = []
+
+    def start(property_names=('www0.example.com',), **options):
+        papi = MockPapi(list(property_names), **options)
+        server, base_url = start_mock_server(papi)
+        servers.append(server)
+
+        monkeypatch.setenv('AKAMAI_API_BASEURL', base_url)
+        monkeypatch.setenv('AKAMAI_STATE_DB', str(tmp_path / 'state.db'))
+        monkeypatch.setenv('AKAMAI_RULE_TREE_DIR', str(tmp_path))
+        monkeypatch.setattr(client, '_baseurl', base_url)
+        monkeypatch.setattr(client, 'bucket', TokenBucket(1000, 1000))
+        monkeypatch.setattr(activation_watcher, 'INITIAL_INTERVAL', 0.05)
+        monkeypatch.setattr(activation_watcher, 'MAX_INTERVAL', 0.1)
+        monkeypatch.setattr('papi_client.BACKOFF_BASE', 0.01)
+        monkeypatch.setattr('rule_tree_validation.SCHEMA_DIR', str(tmp_path / 'schemas'))
+        return papi
+
+    yield start
+    for server in servers:
+        server.shutdown()
@@ -0,0 +1,425 @@
+"""
+Local stand-in for the PAPI endpoints used by the scripts in src/.
+
+Start it and point the scripts at it with AKAMAI_API_BASEURL:
+
+    python3 tests/papi_mock_server.py 8080 --properties 10 --latency 0.05 --pending 5
+    AKAMAI_API_BASEURL=http://127.0.0.1:8080 python3 src/deploy.py www0.example.com
+
+No EdgeGrid credentials are needed; any signature is accepted.
+"""
+import copy
+import hashlib
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+ACCOUNT_ID = '1-MOCK'
+CONTRACT_ID = 'ctr_1-MOCK'
+GROUP_ID = 'grp_1'
+PRODUCT_ID = 'prd_Mock'
+
+# Enough of a rule format schema for the structural check: the behavior and criteria catalog
+RULE_FORMAT_SCHEMA = {
+    'type': 'object',
+    'required': ['rules'],
+    'definitions': {'catalog': {
+        'behaviors': {name: {} for name in ('origin', 'caching', 'cpCode', 'gzipResponse', 'downstreamCache')},
+        'criteria': {name: {} for name in ('path', 'hostname', 'fileExtension', 'requestHeader')},
+    }},
+}
+
+
+def _etag(rules):
+    return hashlib.sha1(json.dumps(rules, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _papi_date(timestamp):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
+
+
+def _apply_patch(document, patch):
+    """Apply the JSON Patch operations produced by rule_tree_diff (add, remove, replace)."""
+    for operation in patch:
+        tokens = [t.replace('~1', '/').replace('~0', '~') for t in operation['path'].split('/')[1:]]
+        parent = document
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        key = int(tokens[-1]) if isinstance(parent, list) else tokens[-1]
+        if operation['op'] == 'remove':
+            del parent[key]
+        elif operation['op'] == 'add' and isinstance(parent, list):
+            parent.insert(key, operation['value'])
+        else:
+            parent[key] = operation['value']
+    return document
+
+
+def default_rules(name):
+    """A small rule tree used for every mock property."""
+    return {
+        'name': 'default',
+        'children': [],
+        'behaviors': [
+            {'name': 'origin', 'options': {'hostname': f'origin.{name}', 'originType': 'CUSTOMER'}},
+            {'name': 'caching', 'options': {'behavior': 'MAX_AGE', 'ttl': '1d'}},
+        ],
+        'criteria': [],
+        'options': {},
+        'variables': [],
+    }
+
+
+class MockPapi:
+    """In-memory PAPI state shared by all request handler threads."""
+
+    def __init__(self, property_names, latency=0.0, pending_duration=0.0, throttle_rate=0.0, fallback_window=3600):
+        self.latency = latency
+        self.pending_duration = pending_duration
+        self.fallback_window = fallback_window
+        self.throttle_rate = throttle_rate
+        self.lock = threading.Lock()
+        self.activation_ids = itertools.count(1)
+        self.properties = {}
+        self.activations = {}
+        self.request_count = 0
+        self.throttled_count = 0
+
+        for index, name in enumerate(property_names):
+            rules = default_rules(name)
+            property_id = str(100000 + index)
+            self.properties[property_id] = {
+                'propertyName': name,
+                'versions': {1: {'rules': rules, 'etag': _etag(rules),
+                                 'stagingStatus': 'ACTIVE', 'productionStatus': 'ACTIVE'}},
+                'active': {'STAGING': 1, 'PRODUCTION': 1},
+                'activations': {},
+            }
+
+    def property_by_name(self, name):
+        for property_id, prop in self.properties.items():
+            if prop['propertyName'] == name:
+                return property_id, prop
+        return None, None
+
+    def manifest(self):
+        """Manifest entries for bulk_deploy, one per mock property."""
+        return [{'propertyName': prop['propertyName'], 'propertyId': property_id, 'propertyVersion': 1,
+                 'contractId': CONTRACT_ID, 'groupId': GROUP_ID, 'etag': prop['versions'][1]['etag']}
+                for property_id, prop in self.properties.items()]
+
+    def version_item(self, property_id, version):
+        data = self.properties[property_id]['versions'][version]
+        return {'propertyVersion': version, 'etag': data['etag'],
+                'stagingStatus': data['stagingStatus'], 'productionStatus': data['productionStatus']}
+
+    def rule_tree(self, property_id, version):
+        prop = self.properties[property_id]
+        data = prop['versions'][version]
+        return {'accountId': ACCOUNT_ID, 'contractId': CONTRACT_ID, 'groupId': GROUP_ID,
+                'propertyId': property_id, 'propertyName': prop['propertyName'], 'propertyVersion': version,
+                'etag': data['etag'], 'ruleFormat': 'latest', 'rules': copy.deepcopy(data['rules'])}
+
+    def activation_status(self, activation):
+        if activation['status'] == 'PENDING' and time.monotonic() >= activation['ready_at']:
+            activation['status'] = 'ACTIVE'
+            prop = self.properties[activation['propertyId']]
+            network = activation['network']
+            previous = prop['active'].get(network)
+            if previous is not None:
+                prop['versions'][previous][f'{network.lower()}Status'] = 'INACTIVE'
+            prop['versions'][activation['propertyVersion']][f'{network.lower()}Status'] = 'ACTIVE'
+            prop['active'][network] = activation['propertyVersion']
+            superseded = self.activations.get(prop['activations'].get(network))
+            if superseded is not None:
+                superseded['status'] = 'INACTIVE'
+            prop['activations'][network] = activation['activationId']
+            activation['activated_at'] = time.time()
+        return activation['status']
+
+    def activation_item(self, activation):
+        """The activation as PAPI returns it, with the fast fallback window of an active activation."""
+        status = self.activation_status(activation)
+        activated_at = activation.get('activated_at')
+        expiration = int(activated_at + self.fallback_window) if activated_at else None
+        return {
+            'activationId': activation['activationId'], 'propertyId': activation['propertyId'],
+            'propertyName': self.properties[activation['propertyId']]['propertyName'],
+            'propertyVersion': activation['propertyVersion'], 'network': activation['network'],
+            'activationType': 'ACTIVATE', 'status': status, 'submitDate': activation['submitDate'],
+            'updateDate': _papi_date(time.time()),
+            'fallbackInfo': {
+                'fastFallbackAttempted': activation['useFastFallback'],
+                'fallbackVersion': activation['fallbackVersion'],
+                'canFastFallback': (status == 'ACTIVE' and activation['fallbackVersion'] is not None
+                                    and not activation['useFastFallback'] and time.time() < expiration),
+                'steadyStateTime': int(activated_at) if activated_at else None,
+                'fastFallbackExpirationTime': expiration,
+            },
+        }
+
+
+ROUTES = [
+    ('GET', re.compile(r'^/papi/v1/groups$'), 'list_groups'),
+    ('GET', re.compile(r'^/papi/v1/properties$'), 'list_properties'),
+    ('GET', re.compile(r'^/papi/v1/hostnames$'), 'list_hostnames'),
+    ('GET', re.compile(r'^/papi/v1/properties/(\w+)$'), 'get_property'),
+    ('GET', re.compile(r'^/papi/v1/schemas/products/(\w+)/([\w.-]+)$'), 'get_schema'),
+    ('POST', re.compile(r'^/papi/v1/search/find-by-value$'), 'search'),
+    ('GET', re.compile(r'^/papi/v1/properties/(\w+)/versions/latest$'), 'latest_version'),
+    ('GET', re.compile(r'^/papi/v1/properties/(\w+)/versions/(\d+)$'), 'get_version'),
+    ('POST', re.compile(r'^/papi/v1/properties/(\w+)/versions$'), 'create_version'),
+    ('GET', re.compile(r'^/papi/v1/properties/(\w+)/versions/(\d+)/rules$'), 'get_rules'),
+    ('PUT', re.compile(r'^/papi/v1/properties/(\w+)/versions/(\d+)/rules$'), 'put_rules'),
+    ('PATCH', re.compile(r'^/papi/v1/properties/(\w+)/versions/(\d+)/rules$'), 'patch_rules'),
+    ('GET', re.compile(r'^/papi/v1/properties/(\w+)/activations$'), 'list_activations'),
+    ('POST', re.compile(r'^/papi/v1/properties/(\w+)/activations$'), 'activate'),
+    ('GET', re.compile(r'^/papi/v1/properties/(\w+)/activations/(\w+)$'), 'get_activation'),
+]
+
+
+class MockPapiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_list(self, body):
+        """Send a list response with an ETag, or 304 when the client already has it."""
+        etag = f'"{_etag(body)}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_json(200, body, {'ETag': etag})
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'null')
+
+    def dispatch(self, method):
+        papi = self.server.papi
+        with papi.lock:
+            papi.request_count += 1
+            throttled = papi.throttle_rate and random.random() < papi.throttle_rate
+            if throttled:
+                papi.throttled_count += 1
+        if papi.latency:
+            time.sleep(papi.latency)
+
+        if throttled:
+            self.read_json()
+            self.send_json(429, {'title': 'Too Many Requests'}, {'Retry-After': '0'})
+            return
+
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        for route_method, pattern, name in ROUTES:
+            match = pattern.match(url.path)
+            if route_method == method and match:
+                with papi.lock:
+                    getattr(self, name)(papi, query, *match.groups())
+                return
+        self.read_json()
+        self.send_json(404, {'title': 'Not Found', 'path': url.path})
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+
+    def list_groups(self, papi, query):
+        self.send_json(200, {'accountId': ACCOUNT_ID, 'groups': {'items': [
+            {'groupId': GROUP_ID, 'groupName': 'Mock group', 'contractIds': [CONTRACT_ID]}]}})
+
+    def list_properties(self, papi, query):
+        items = [{'accountId': ACCOUNT_ID, 'contractId': CONTRACT_ID, 'groupId': GROUP_ID,
+                  'propertyId': property_id, 'propertyName': prop['propertyName'],
+                  'latestVersion': max(prop['versions']), 'stagingVersion': prop['active'].get('STAGING'),
+                  'productionVersion': prop['active'].get('PRODUCTION')}
+                 for property_id, prop in papi.properties.items()]
+        self.send_list({'properties': {'items': items}})
+
+    def list_hostnames(self, papi, query):
+        items = [{'cnameFrom': prop['propertyName'], 'propertyId': property_id,
+                  'propertyName': prop['propertyName'], 'stagingCnameTo': f"{prop['propertyName']}.edgesuite.net",
+                  'productionCnameTo': f"{prop['propertyName']}.edgesuite.net"}
+                 for property_id, prop in papi.properties.items()]
+        self.send_list({'hostnames': {'items': items}})
+
+    def get_property(self, papi, query, property_id):
+        prop = papi.properties.get(property_id)
+        if prop is None:
+            return self.send_json(404, {'title': 'Property not found'})
+        self.send_json(200, {'properties': {'items': [{
+            'accountId': ACCOUNT_ID, 'contractId': CONTRACT_ID, 'groupId': GROUP_ID, 'propertyId': property_id,
+            'propertyName': prop['propertyName'], 'productId': PRODUCT_ID, 'latestVersion': max(prop['versions'])}]}})
+
+    def get_schema(self, papi, query, product_id, rule_format):
+        self.send_json(200, RULE_FORMAT_SCHEMA)
+
+    def search(self, papi, query):
+        name = self.read_json().get('propertyName')
+        property_id, prop = papi.property_by_name(name)
+        items = []
+        if prop is not None:
+            for version in prop['versions']:
+                item = papi.version_item(property_id, version)
+                item.update({'propertyId': property_id, 'propertyName': name,
+                             'contractId': CONTRACT_ID, 'groupId': GROUP_ID, 'accountId': ACCOUNT_ID})
+                items.append(item)
+        self.send_json(200, {'versions': {'items': items}})
+
+    def latest_version(self, papi, query, property_id):
+        prop = papi.properties.get(property_id)
+        if prop is None:
+            return self.send_json(404, {'title': 'Property not found'})
+        network = query.get('activatedOn')
+        version = prop['active'].get(network) if network else max(prop['versions'])
+        if version is None:
+            return self.send_json(404, {'title': f'No version active on {network}'})
+        self.send_json(200, {'versions': {'items': [papi.version_item(property_id, version)]}})
+
+    def get_version(self, papi, query, property_id, version):
+        prop = papi.properties.get(property_id)
+        if prop is None or int(version) not in prop['versions']:
+            return self.send_json(404, {'title': 'Version not found'})
+        self.send_json(200, {'versions': {'items': [papi.version_item(property_id, int(version))]}})
+
+    def create_version(self, papi, query, property_id):
+        body = self.read_json()
+        prop = papi.properties[property_id]
+        source = prop['versions'].get(body['createFromVersion'])
+        if source is None or source['etag'] != body['createFromVersionEtag']:
+            return self.send_json(400, {'title': 'Version or etag does not match'})
+        version = max(prop['versions']) + 1
+        # Every version has its own etag, even with the same rules as its source
+        prop['versions'][version] = {'rules': copy.deepcopy(source['rules']), 'etag': _etag([version, source['rules']]),
+                                     'stagingStatus': 'INACTIVE', 'productionStatus': 'INACTIVE'}
+        self.send_json(201, {'versionLink': f'/papi/v1/properties/{property_id}/versions/{version}'})
+
+    def get_rules(self, papi, query, property_id, version):
+        self.send_json(200, papi.rule_tree(property_id, int(version)))
+
+    def _store_rules(self, papi, property_id, version, rules):
+        data = papi.properties[property_id]['versions'][version]
+        if data['stagingStatus'] != 'INACTIVE' or data['productionStatus'] != 'INACTIVE':
+            return self.send_json(403, {'title': 'Version is locked', 'detail': 'Activated versions cannot change'})
+        if_match = self.headers.get('If-Match')
+        if if_match and if_match.strip('"') != data['etag']:
+            return self.send_json(412, {'title': 'Precondition Failed', 'detail': 'The etag does not match'})
+        data['rules'] = rules
+        data['etag'] = _etag([version, rules])
+        self.send_json(200, papi.rule_tree(property_id, version))
+
+    def put_rules(self, papi, query, property_id, version):
+        rules = self.read_json()['rules']
+        data = papi.properties[property_id]['versions'][int(version)]
+        if data['stagingStatus'] != 'INACTIVE' or data['productionStatus'] != 'INACTIVE':
+            return self.send_json(403, {'title': 'Version is locked', 'detail': 'Activated versions cannot change'})
+        if query.get('dryRun') == 'true':
+            # Validate only: report unknown behaviors the way PAPI reports errors
+            known = RULE_FORMAT_SCHEMA['definitions']['catalog']['behaviors']
+            errors = [{'errorLocation': f'#/rules/behaviors/{i}', 'detail': f"Unknown behavior {b['name']}"}
+                      for i, b in enumerate(rules.get('behaviors', [])) if b['name'] not in known]
+            return self.send_json(200, {'errors': errors, 'warnings': []})
+        self._store_rules(papi, property_id, int(version), rules)
+
+    def patch_rules(self, papi, query, property_id, version):
+        tree = papi.rule_tree(property_id, int(version))
+        self._store_rules(papi, property_id, int(version), _apply_patch(tree, self.read_json())['rules'])
+
+    def activate(self, papi, query, property_id):
+        body = self.read_json()
+        prop = papi.properties[property_id]
+        network = body['network']
+        fast_fallback = body.get('useFastFallback', False)
+        if fast_fallback:
+            # Fast fallback only returns to the version the current activation replaced, within its window
+            current = papi.activations.get(prop['activations'].get(network))
+            if current is None or not papi.activation_item(current)['fallbackInfo']['canFastFallback'] \
+                    or current['fallbackVersion'] != body['propertyVersion']:
+                return self.send_json(422, {'title': 'Fast fallback is not available'})
+        activation_id = f'atv_{next(papi.activation_ids)}'
+        papi.activations[activation_id] = {
+            'activationId': activation_id, 'propertyId': property_id, 'propertyVersion': body['propertyVersion'],
+            'network': network, 'status': 'PENDING', 'useFastFallback': fast_fallback,
+            'fallbackVersion': prop['active'].get(network),
+            'ready_at': time.monotonic() + (0 if fast_fallback else papi.pending_duration),
+            'submitDate': _papi_date(time.time()),
+        }
+        self.send_json(201, {'activationLink': f'/papi/v1/properties/{property_id}/activations/{activation_id}'
+                                               f'?contractId={CONTRACT_ID}&groupId={GROUP_ID}'})
+
+    def get_activation(self, papi, query, property_id, activation_id):
+        activation = papi.activations.get(activation_id)
+        if activation is None:
+            return self.send_json(404, {'title': 'Activation not found'})
+        self.send_json(200, {'activations': {'items': [papi.activation_item(activation)]}})
+
+    def list_activations(self, papi, query, property_id):
+        items = [papi.activation_item(activation) for activation in papi.activations.values()
+                 if activation['propertyId'] == property_id]
+        self.send_json(200, {'activations': {'items': items[::-1]}})
+
+
+def start_mock_server(papi, port=0):
+    """Start the mock in a background thread and return (server, base_url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockPapiHandler)
+    server.daemon_threads = True
+    server.papi = papi
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    if not argv:
+        print("Usage: python3 papi_mock_server.py <port> [--properties N] [--latency S] [--pending S] "
+              "[--throttle RATE]")
+        exit(1)
+
+    options = dict(zip(argv[1::2], argv[2::2]))
+    count = int(options.get('--properties', 1))
+    papi = MockPapi([f'www{i}.example.com' for i in range(count)],
+                    latency=float(options.get('--latency', 0)),
+                    pending_duration=float(options.get('--pending', 0)),
+                    throttle_rate=float(options.get('--throttle', 0)))
+    server, base_url = start_mock_server(papi, int(argv[0]))
+    print(f"Mock PAPI with {count} properties listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
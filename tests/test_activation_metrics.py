@@ -0,0 +1,53 @@
+import pytest
+
+import activation_metrics
+import instrumentation
+
+
+@pytest.fixture(autouse=True)
+def state_db(tmp_path, monkeypatch):
+    monkeypatch.setenv('AKAMAI_STATE_DB', str(tmp_path / 'state.db'))
+    return tmp_path
+
+
+def activate(activation_id, network, minutes, status='ACTIVE'):
+    submitted = '2026-01-05T10:00:00Z'
+    activation_metrics.record_submission(activation_id, 'prp_1', 3, network, 'www.example.com')
+    for current in ('PENDING', 'ZONE_1', status):
+        activation_metrics.record_status({
+            'activationId': activation_id, 'network': network.upper(), 'status': current,
+            'submitDate': submitted, 'updateDate': f'2026-01-05T10:{minutes:02d}:00Z',
+        })
+
+
+def test_durations_come_from_the_papi_dates():
+    activate('atv_1', 'staging', 4)
+    activate('atv_2', 'staging', 8)
+    activate('atv_3', 'production', 30)
+    activate('atv_4', 'production', 50, status='FAILED')
+
+    stats = activation_metrics.activation_stats()
+
+    assert stats['STAGING'] == {'activations': 2, 'failed': 0, 'p50': 240.0, 'p95': 480.0, 'max': 480.0}
+    assert stats['PRODUCTION']['activations'] == 2
+    assert stats['PRODUCTION']['failed'] == 1
+    assert stats['PRODUCTION']['p50'] == 1800.0
+    assert list(activation_metrics.progress_stats()['STAGING']) == ['SUBMITTED', 'PENDING', 'ZONE_1', 'ACTIVE']
+    assert [row['activations'] for row in activation_metrics.trend(bucket='day')] == [1, 2]
+
+
+def test_final_duration_is_not_overwritten_by_later_polls():
+    activate('atv_1', 'staging', 4)
+    activation_metrics.record_status({'activationId': 'atv_1', 'status': 'ACTIVE',
+                                      'submitDate': '2026-01-05T10:00:00Z', 'updateDate': '2026-01-05T11:00:00Z'})
+
+    assert activation_metrics.history()[0]['duration'] == 240.0
+
+
+def test_step_timings_are_recorded_per_run(monkeypatch):
+    monkeypatch.setattr(instrumentation.metrics, 'phases', {'validate': {'count': 2, 'total': 3.0}})
+
+    activation_metrics.record_steps('bulk-deploy', run_id='run-1')
+    activation_metrics.record_steps('bulk-deploy', run_id='run-2')
+
+    assert activation_metrics.step_stats() == {'validate': {'runs': 2, 'p50': 1.5, 'p95': 1.5}}
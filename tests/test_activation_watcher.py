@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip('requests')
+import activation_watcher  # noqa: E402
+
+
+class FakeResponse:
+    headers = {}
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+def test_a_failing_watch_does_not_stop_the_others(monkeypatch):
+    def fetch_activation(propertyId, activationId, contractId, groupId, ASK):
+        if activationId == 'atv_broken':
+            raise ConnectionError('connection reset')
+        if activationId == 'atv_empty':
+            return FakeResponse(200, {'activations': {'items': []}})
+        return FakeResponse(200, {'activations': {'items': [{'activationId': activationId, 'status': 'ACTIVE'}]}})
+
+    monkeypatch.setattr(activation_watcher, 'fetch_activation', fetch_activation)
+    monkeypatch.setattr(activation_watcher, 'record_status', lambda item, propertyId: None)
+    monkeypatch.setattr(activation_watcher, 'INITIAL_INTERVAL', 0)
+    monkeypatch.setattr(activation_watcher, 'MAX_CONSECUTIVE_ERRORS', 2)
+    activations = [{'propertyId': '1', 'activationId': activation_id, 'contractId': 'ctr', 'groupId': 'grp'}
+                   for activation_id in ('atv_broken', 'atv_empty', 'atv_ok')]
+
+    assert activation_watcher.wait_for_activations('ASK', activations) == {
+        'atv_broken': 'ERROR', 'atv_empty': 'ERROR', 'atv_ok': 'ACTIVE'}
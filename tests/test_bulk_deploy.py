@@ -0,0 +1,185 @@
+import copy
+import json
+import time
+
+import pytest
+
+pytest.importorskip('requests')
+import bulk_deploy  # noqa: E402
+
+
+@pytest.fixture
+def mock_papi(start_mock_papi, monkeypatch):
+    # The mock hostnames do not resolve; tests that look at smoke tests patch this again
+    monkeypatch.setattr(bulk_deploy, 'run_smoke_test', lambda hostname, network: True)
+    return start_mock_papi([f'www{i}.example.com' for i in range(5)], pending_duration=0.2, throttle_rate=0.05)
+
+
+def write_rule_tree(papi, tmp_path, entry, ttl):
+    tree = papi.rule_tree(entry['propertyId'], 1)
+    tree['rules']['behaviors'][1]['options']['ttl'] = ttl
+    with open(tmp_path / f"{entry['propertyName']}.json", 'w') as file:
+        json.dump(tree, file)
+
+
+def test_bulk_deploy_activates_changed_properties(mock_papi, tmp_path):
+    manifest = mock_papi.manifest()
+    for index, entry in enumerate(manifest):
+        # Leave the first property unchanged
+        write_rule_tree(mock_papi, tmp_path, entry, '1d' if index == 0 else '7d')
+
+    results = {r['propertyName']: r for r in bulk_deploy.run_bulk_deploy('ASK', manifest, 'staging', 3)}
+
+    assert results['www0.example.com']['status'] == 'UNCHANGED'
+    for entry in manifest[1:]:
+        assert results[entry['propertyName']]['status'] == 'SUCCESS'
+        prop = mock_papi.properties[entry['propertyId']]
+        assert prop['active']['STAGING'] == 2
+        assert prop['versions'][2]['rules']['behaviors'][1]['options']['ttl'] == '7d'
+
+
+def test_bulk_deploy_reports_missing_rule_tree(mock_papi):
+    results = bulk_deploy.run_bulk_deploy('ASK', mock_papi.manifest()[:1], None, 1)
+
+    assert results[0]['status'] == 'FAILED'
+    assert results[0]['step'] == 'compare-hash'
+
+
+def test_pipeline_rolls_out_to_staging_then_production(mock_papi, tmp_path, monkeypatch):
+    smoke_tests = []
+    monkeypatch.setattr(bulk_deploy, 'run_smoke_test',
+                        lambda hostname, network: smoke_tests.append((hostname, network)) or True)
+    manifest = mock_papi.manifest()
+    for entry in manifest:
+        write_rule_tree(mock_papi, tmp_path, entry, '7d')
+
+    results = bulk_deploy.run_bulk_deploy('ASK', manifest, 'both', 5, staging_slots=2, production_slots=1)
+
+    assert all(r['status'] == 'SUCCESS' for r in results)
+    for entry in manifest:
+        assert mock_papi.properties[entry['propertyId']]['active'] == {'STAGING': 2, 'PRODUCTION': 2}
+        hostname = entry['propertyName']
+        assert smoke_tests.index((hostname, 'staging')) < smoke_tests.index((hostname, 'production'))
+
+
+def test_pipeline_halts_production_after_a_failure(mock_papi, tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_deploy, 'run_smoke_test', lambda hostname, network: False)
+    manifest = mock_papi.manifest()[:2]
+    for entry in manifest:
+        write_rule_tree(mock_papi, tmp_path, entry, '7d')
+
+    results = bulk_deploy.run_bulk_deploy('ASK', manifest, 'both', 1, halt_on_failure=True)
+
+    steps = sorted(r['step'] for r in results)
+    assert [r['status'] for r in results] == ['FAILED', 'FAILED']
+    assert steps == ['activate-staging', 'smoke-test-staging']
+    assert all(prop['active']['PRODUCTION'] == 1 for prop in mock_papi.properties.values())
+
+
+def test_a_property_waiting_for_a_slot_does_not_activate_after_a_failure(mock_papi, tmp_path, monkeypatch):
+    activations = []
+
+    def activate_and_wait(ASK, entry, version, network):
+        activations.append(entry['propertyName'])
+        time.sleep(0.2)
+        raise Exception(f"Activation on {network.upper()} network ended with status FAILED.")
+
+    monkeypatch.setattr(bulk_deploy, 'activate_and_wait', activate_and_wait)
+    manifest = mock_papi.manifest()[:3]
+    for entry in manifest:
+        write_rule_tree(mock_papi, tmp_path, entry, '7d')
+
+    results = bulk_deploy.run_bulk_deploy('ASK', manifest, 'staging', 3, staging_slots=1, halt_on_failure=True)
+
+    assert len(activations) == 1
+    assert sorted(r['error'].startswith('Halted') for r in results) == [False, True, True]
+
+
+def test_a_single_network_rollout_records_a_known_good_version(mock_papi, tmp_path):
+    from rollback import known_good_versions
+    entry = mock_papi.manifest()[0]
+    write_rule_tree(mock_papi, tmp_path, entry, '7d')
+
+    results = bulk_deploy.run_bulk_deploy('ASK', [entry], 'production', 1)
+
+    assert results[0]['status'] == 'SUCCESS'
+    assert known_good_versions(entry['propertyId'], 'production') == [2]
+
+
+def test_consecutive_runs_start_from_the_stored_version_and_etag(mock_papi, tmp_path):
+    from change_impact import build_manifest
+    from state_store import save_relevant_data
+    entry = mock_papi.manifest()[0]
+    save_relevant_data(dict(entry, accountId='1-MOCK'))
+
+    for version, ttl in ((2, '7d'), (3, '8d')):
+        write_rule_tree(mock_papi, tmp_path, entry, ttl)
+        manifest, unresolved = build_manifest([entry['propertyName']])
+        results = bulk_deploy.run_bulk_deploy('ASK', manifest, 'staging', 1)
+        assert results[0]['status'] == 'SUCCESS', results[0]['error']
+        assert results[0]['propertyVersion'] == version
+
+
+def test_a_rerun_resumes_where_the_failed_run_stopped(mock_papi, tmp_path, monkeypatch):
+    from change_impact import build_manifest
+    from state_store import save_relevant_data
+    entry = mock_papi.manifest()[0]
+    save_relevant_data(dict(entry, accountId='1-MOCK'))
+    write_rule_tree(mock_papi, tmp_path, entry, '7d')
+    activations = []
+    activate = bulk_deploy.activate_and_wait
+
+    def activate_and_wait(ASK, entry, version, network):
+        activations.append((version, network))
+        if network == 'production' and len(activations) == 2:
+            raise Exception("Activation on PRODUCTION network ended with status FAILED.")
+        activate(ASK, entry, version, network)
+
+    monkeypatch.setattr(bulk_deploy, 'activate_and_wait', activate_and_wait)
+    for status in ('FAILED', 'SUCCESS'):
+        manifest, unresolved = build_manifest([entry['propertyName']])
+        assert bulk_deploy.run_bulk_deploy('ASK', manifest, 'both', 1)[0]['status'] == status
+
+    assert sorted(mock_papi.properties[entry['propertyId']]['versions']) == [1, 2]
+    assert activations == [(2, 'staging'), (2, 'production'), (2, 'production')]
+
+
+def test_a_large_rule_tree_is_streamed_from_a_snapshot(mock_papi, tmp_path, monkeypatch):
+    import os
+    import update_property_rule_tree
+    entry = mock_papi.manifest()[0]
+    write_rule_tree(mock_papi, tmp_path, entry, '7d')
+    uploads = []
+    upload = update_property_rule_tree.upload_rule_tree
+
+    def upload_rule_tree(ASK, propertyId, propertyVersion, contractId, groupId, file_path, compress=False):
+        uploads.append(file_path)
+        return upload(ASK, propertyId, propertyVersion, contractId, groupId, file_path, compress)
+
+    monkeypatch.setattr(update_property_rule_tree, 'STREAM_THRESHOLD', 100)
+    monkeypatch.setattr(update_property_rule_tree, 'upload_rule_tree', upload_rule_tree)
+    results = bulk_deploy.run_bulk_deploy('ASK', [entry], 'staging', 1)
+
+    assert results[0]['status'] == 'SUCCESS', results[0]['error']
+    assert len(uploads) == 1 and uploads[0] != str(tmp_path / f"{entry['propertyName']}.json")
+    assert not os.path.exists(uploads[0])
+    assert mock_papi.rule_tree(entry['propertyId'], 2)['rules']['behaviors'][1]['options']['ttl'] == '7d'
+
+    # The stored hash of the snapshot finds the live version unchanged
+    assert bulk_deploy.run_bulk_deploy('ASK', [entry], 'staging', 1)[0]['status'] == 'UNCHANGED'
+
+
+def test_editable_draft_is_reused_instead_of_creating_a_version(mock_papi, tmp_path):
+    entry = mock_papi.manifest()[0]
+    prop = mock_papi.properties[entry['propertyId']]
+    prop['versions'][2] = {'rules': copy.deepcopy(prop['versions'][1]['rules']), 'etag': 'draft',
+                           'stagingStatus': 'INACTIVE', 'productionStatus': 'INACTIVE'}
+    entry.update(propertyVersion=2, etag='draft')
+    write_rule_tree(mock_papi, tmp_path, entry, '7d')
+
+    results = bulk_deploy.run_bulk_deploy('ASK', [entry], 'staging', 1)
+
+    assert results[0]['status'] == 'SUCCESS'
+    assert results[0]['propertyVersion'] == 2
+    assert sorted(prop['versions']) == [1, 2]
+    assert prop['active']['STAGING'] == 2
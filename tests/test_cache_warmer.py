@@ -0,0 +1,58 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+import cache_warmer  # noqa: E402
+
+
+class EdgeHandler(BaseHTTPRequestHandler):
+    """Answers like an edge server: a miss the first time a host and path are requested, a hit afterwards."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        key = (self.headers['Host'], self.path)
+        with self.server.lock:
+            cached = key in self.server.cache
+            self.server.cache.add(key)
+        self.send_response(404 if self.path.startswith('/missing') else 200)
+        self.send_header('X-Cache', f"{'TCP_HIT' if cached else 'TCP_MISS'} from a23-0-0-1 (AkamaiGHost)")
+        self.send_header('Content-Length', '5')
+        self.end_headers()
+        self.wfile.write(b'hello')
+
+
+@pytest.fixture
+def edge():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), EdgeHandler)
+    server.lock = threading.Lock()
+    server.cache = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+
+
+def test_top_paths_are_taken_from_an_access_log(tmp_path):
+    log = tmp_path / 'access.log'
+    log.write_text(
+        '1.2.3.4 - - [18/Oct/2026:10:00:00 +0000] "GET /a.css HTTP/1.1" 200 512 "-" "Mozilla"\n'
+        '1.2.3.4 - - [18/Oct/2026:10:00:01 +0000] "GET /b.js HTTP/1.1" 200 512 "-" "Mozilla"\n'
+        '1.2.3.4 - - [18/Oct/2026:10:00:02 +0000] "GET /b.js HTTP/1.1" 304 0 "-" "Mozilla"\n'
+        '1.2.3.4 - - [18/Oct/2026:10:00:03 +0000] "GET /gone HTTP/1.1" 404 0 "-" "Mozilla"\n'
+        '1.2.3.4 - - [18/Oct/2026:10:00:04 +0000] "POST /form HTTP/1.1" 200 0 "-" "Mozilla"\n')
+
+    assert cache_warmer.load_urls(str(log), 'www.example.com', top=5) == [
+        'https://www.example.com/b.js', 'https://www.example.com/a.css']
+
+
+def test_edge_servers_are_warmed_and_hits_are_counted(edge):
+    urls = [f'https://www.example.com/{i}.css' for i in range(20)] + ['https://www.example.com/missing']
+
+    first = cache_warmer.summarize(cache_warmer.warm_urls(urls, edge_ips=[edge], concurrency=5, rate=1000))
+    second = cache_warmer.summarize(cache_warmer.warm_urls(urls, edge_ips=[edge], concurrency=5, rate=1000))
+
+    assert (first['requests'], first['hits'], first['misses'], first['errors']) == (21, 0, 21, 1)
+    assert second['hit_ratio'] == 1.0
@@ -0,0 +1,69 @@
+import json
+import subprocess
+
+import pytest
+
+import change_impact
+import state_store
+
+
+@pytest.fixture(autouse=True)
+def rule_tree_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('AKAMAI_STATE_DB', str(tmp_path / 'state.db'))
+    monkeypatch.setenv('AKAMAI_RULE_TREE_DIR', str(tmp_path / 'src'))
+    monkeypatch.delenv('AKAMAI_SNIPPET_DIR', raising=False)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'src' / 'snippets').mkdir(parents=True)
+    write(tmp_path / 'src' / 'snippets' / 'origin.json', {'name': 'origin', 'options': {}})
+    write(tmp_path / 'src' / 'snippets' / 'unused.json', {'name': 'unused', 'options': {}})
+    write(tmp_path / 'src' / 'api.example.com.template.json',
+          {'rules': {'name': 'default', 'behaviors': [{'$include': 'origin.json'}], 'children': []}})
+    return tmp_path
+
+
+def write(path, content):
+    with open(path, 'w') as file:
+        json.dump(content, file)
+
+
+def test_changed_files_map_to_the_properties_they_affect():
+    assert change_impact.impacted_properties([
+        'src/www.example.com.json',
+        'src/shop.example.com.template.json',
+        'src/snippets/origin.json',
+        'src/snippets/unused.json',
+        'README.md',
+        'tests/fixtures/other.json',
+    ]) == ['api.example.com', 'shop.example.com', 'www.example.com']
+
+
+def test_nothing_is_impacted_by_unrelated_changes():
+    assert change_impact.impacted_properties(['README.md', 'src/deploy.py']) == []
+
+
+def test_deleted_rule_trees_are_not_impacted(rule_tree_dir):
+    def git(*args):
+        subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                       check=True, capture_output=True)
+
+    git('init', '-q')
+    write(rule_tree_dir / 'src' / 'www.example.com.json', {'rules': {}})
+    write(rule_tree_dir / 'src' / 'old.example.com.json', {'rules': {}})
+    git('add', '-A')
+    git('commit', '-q', '-m', 'Add rule trees')
+    write(rule_tree_dir / 'src' / 'www.example.com.json', {'rules': {'name': 'default'}})
+    (rule_tree_dir / 'src' / 'old.example.com.json').unlink()
+    git('commit', '-q', '-a', '-m', 'Change one rule tree and delete the other')
+
+    assert change_impact.impacted_properties(change_impact.changed_files()) == ['www.example.com']
+
+
+def test_manifest_is_built_from_the_state_store():
+    state_store.save_relevant_data({'accountId': 'act_1', 'propertyId': 'prp_1', 'propertyName': 'www.example.com',
+                                    'propertyVersion': 3, 'contractId': 'ctr_1', 'groupId': 'grp_1', 'etag': 'e1'})
+
+    manifest, unresolved = change_impact.build_manifest(['www.example.com', 'api.example.com'])
+
+    assert manifest == [{'accountId': 'act_1', 'propertyName': 'www.example.com', 'propertyId': 'prp_1',
+                         'propertyVersion': 3, 'contractId': 'ctr_1', 'groupId': 'grp_1', 'etag': 'e1'}]
+    assert unresolved == ['api.example.com']
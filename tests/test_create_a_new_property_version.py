@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+pytest.importorskip('requests')
+import create_a_new_property_version  # noqa: E402
+import state_store  # noqa: E402
+import update_property_rule_tree  # noqa: E402
+
+
+@pytest.fixture
+def mock_papi(start_mock_papi, monkeypatch):
+    papi = start_mock_papi()
+    entry = papi.manifest()[0]
+    state_store.save_relevant_data(dict(entry, accountId='1-MOCK'))
+    monkeypatch.setenv('AKAMAI_ACCOUNT_SWITCH_KEY', 'ASK')
+    monkeypatch.setenv('AKAMAI_PROPERTY_NAME', entry['propertyName'])
+    return papi, entry
+
+
+def write_rule_tree(papi, tmp_path, entry, ttl):
+    tree = papi.rule_tree(entry['propertyId'], 1)
+    tree['rules']['behaviors'][1]['options']['ttl'] = ttl
+    with open(tmp_path / f"{entry['propertyName']}.json", 'w') as file:
+        json.dump(tree, file)
+
+
+def test_step_by_step_commands_keep_the_etag_current(mock_papi, tmp_path):
+    papi, entry = mock_papi
+    versions = papi.properties[entry['propertyId']]['versions']
+    write_rule_tree(papi, tmp_path, entry, '7d')
+
+    create_a_new_property_version.main([])
+    assert state_store.load_relevant_data()['etag'] == versions[2]['etag'] != versions[1]['etag']
+    update_property_rule_tree.main([])
+    assert state_store.load_relevant_data()['etag'] == versions[2]['etag']
+
+    # The draft is still editable and the stored etag matches, so it is reused
+    write_rule_tree(papi, tmp_path, entry, '8d')
+    create_a_new_property_version.main([])
+    assert sorted(versions) == [1, 2]
+
+    # Once activated, the next version is created from it with its current etag
+    versions[2]['stagingStatus'] = 'ACTIVE'
+    create_a_new_property_version.main([])
+    assert sorted(versions) == [1, 2, 3]
+    assert state_store.load_relevant_data()['propertyVersion'] == 3
+
+
+def test_a_failed_create_exits_non_zero(mock_papi, tmp_path):
+    papi, entry = mock_papi
+    write_rule_tree(papi, tmp_path, entry, '7d')
+    state_store.save_relevant_data({'etag': 'stale'}, entry['propertyName'])
+
+    with pytest.raises(SystemExit) as exited:
+        create_a_new_property_version.main([])
+    assert exited.value.code == 1
+
+
+def test_a_failed_rule_tree_update_exits_non_zero(mock_papi, tmp_path):
+    papi, entry = mock_papi
+    write_rule_tree(papi, tmp_path, entry, '7d')
+    # Version 1 is active, so PAPI rejects the write
+    papi.properties[entry['propertyId']]['versions'][1]['stagingStatus'] = 'ACTIVE'
+
+    with pytest.raises(SystemExit) as exited:
+        update_property_rule_tree.main([])
+    assert exited.value.code == 1
+
+
+def test_unknown_arguments_are_rejected(mock_papi):
+    papi, entry = mock_papi
+
+    for main in (create_a_new_property_version.main, update_property_rule_tree.main):
+        with pytest.raises(SystemExit):
+            main(['--help'])
+    assert sorted(papi.properties[entry['propertyId']]['versions']) == [1]
+
+
+def test_a_loaded_rule_tree_is_pushed_instead_of_the_file(mock_papi, tmp_path):
+    papi, entry = mock_papi
+    write_rule_tree(papi, tmp_path, entry, '7d')
+    local_tree = update_property_rule_tree.load_rule_tree(entry['propertyName'])
+    create_a_new_property_version.main([])
+
+    # The checkout moved on after the tree was loaded, e.g. a pull for another deployment
+    write_rule_tree(papi, tmp_path, entry, '8d')
+    response = update_property_rule_tree.push_rule_tree('ASK', entry['propertyId'], 2, entry['contractId'],
+                                                        entry['groupId'], entry['propertyName'], local_tree)
+
+    assert response.status_code == 200
+    assert papi.rule_tree(entry['propertyId'], 2)['rules']['behaviors'][1]['options']['ttl'] == '7d'
@@ -0,0 +1,44 @@
+import pytest
+
+import credentials
+import state_store
+
+SWITCH_KEYS = [
+    {'accountSwitchKey': '1-ABC:1-2RBL', 'accountName': 'Example Corp'},
+    {'accountSwitchKey': '1-DEF:1-2RBL', 'accountName': 'Example Media'},
+    {'accountSwitchKey': '1-GHI:1-2RBL', 'accountName': 'Other Inc'},
+]
+
+
+@pytest.fixture(autouse=True)
+def switch_key_api(tmp_path, monkeypatch):
+    monkeypatch.setenv('AKAMAI_STATE_DB', str(tmp_path / 'state.db'))
+    monkeypatch.delenv('AKAMAI_ACCOUNT', raising=False)
+    monkeypatch.delenv('AKAMAI_ACCOUNT_SWITCH_KEY', raising=False)
+    calls = []
+    monkeypatch.setattr(credentials, '_get_all_switch_keys', lambda my_account=None: calls.append(1) or SWITCH_KEYS)
+    return calls
+
+
+def test_account_is_resolved_by_name_id_or_part_of_name(switch_key_api):
+    assert credentials.resolve_switch_key('Other Inc')['switch_key'] == '1-GHI:1-2RBL'
+    assert credentials.resolve_switch_key('1-DEF')['account_name'] == 'Example Media'
+    assert credentials.resolve_switch_key('corp')['switch_key'] == '1-ABC:1-2RBL'
+    # All keys were prefetched by the first lookup
+    assert len(switch_key_api) == 1
+
+
+def test_ambiguous_account_is_rejected():
+    with pytest.raises(Exception, match='matches 2 accounts'):
+        credentials.resolve_switch_key('example')
+
+
+def test_environment_selects_the_account(monkeypatch):
+    state_store.save_switch_key_data({'switch_key': '1-ABC:1-2RBL', 'account_name': 'Example Corp'})
+    assert credentials.resolve_switch_key()['account_name'] == 'Example Corp'
+
+    monkeypatch.setenv('AKAMAI_ACCOUNT', 'Other Inc')
+    assert credentials.resolve_switch_key()['switch_key'] == '1-GHI:1-2RBL'
+
+    monkeypatch.setenv('AKAMAI_ACCOUNT_SWITCH_KEY', '9-XYZ:1-2RBL')
+    assert credentials.resolve_switch_key()['switch_key'] == '9-XYZ:1-2RBL'
@@ -0,0 +1,145 @@
+import json
+import threading
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from deploy_daemon import DeployQueue, start_daemon
+from instrumentation import metrics, phase
+from state_store import get_connection
+
+
+class FakeDeploy:
+    """Records deployments; each one blocks until released, like an activation in flight."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+        self.calls = []
+
+    def __call__(self, ASK, request):
+        with self.lock:
+            self.calls.append(request)
+        self.started.release()
+        self.release.wait(5)
+        if request['propertyName'] == 'broken':
+            exit(1)
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    # Finished deployments record the phase timings of the run so far in the state store
+    monkeypatch.setenv('AKAMAI_STATE_DB', str(tmp_path / 'state.db'))
+    deploy = FakeDeploy()
+    queue = DeployQueue('ASK', max_workers=2, deploy=deploy)
+    queue.start()
+    yield queue, deploy
+    deploy.release.set()
+    queue.stop()
+
+
+def test_a_burst_of_requests_during_a_deployment_costs_one_more_deployment(daemon):
+    queue, deploy = daemon
+    assert queue.submit({'propertyName': 'www.example.com', 'commit': 'a1'}) == 'queued'
+    assert deploy.started.acquire(timeout=5)
+
+    outcomes = [queue.submit({'propertyName': 'www.example.com', 'commit': f'b{i}'}) for i in range(5)]
+    assert outcomes == ['queued'] + ['coalesced'] * 4
+    assert queue.status()['pending']['www.example.com']['commit'] == 'b4'
+
+    deploy.release.set()
+    assert queue.wait_idle(5)
+    assert [call['commit'] for call in deploy.calls] == ['a1', 'b4']
+    result = queue.status()['results']['www.example.com']
+    assert result['status'] == 'SUCCESS' and result['commit'] == 'b4' and result['coalesced'] == 4
+
+
+def test_properties_deploy_in_parallel_and_failures_keep_the_daemon_alive(daemon):
+    queue, deploy = daemon
+    queue.submit({'propertyName': 'broken'})
+    queue.submit({'propertyName': 'www.example.com'})
+    assert deploy.started.acquire(timeout=5) and deploy.started.acquire(timeout=5)
+    assert set(queue.status()['running']) == {'broken', 'www.example.com'}
+
+    deploy.release.set()
+    assert queue.wait_idle(5)
+    results = queue.status()['results']
+    assert results['broken']['status'] == 'FAILED'
+    assert results['www.example.com']['status'] == 'SUCCESS'
+
+
+def test_step_timings_are_recorded_per_batch_of_deployments(tmp_path, monkeypatch):
+    monkeypatch.setenv('AKAMAI_STATE_DB', str(tmp_path / 'state.db'))
+    metrics.reset()
+
+    def deploy(ASK, request):
+        with phase('activate-staging'):
+            pass
+
+    queue = DeployQueue('ASK', max_workers=2, deploy=deploy)
+    queue.start()
+    try:
+        for name in ('a.example.com', 'b.example.com'):
+            queue.submit({'propertyName': name})
+            assert queue.wait_idle(5)
+    finally:
+        queue.stop()
+
+    rows = get_connection().execute("SELECT run_id, runs FROM deploy_steps WHERE command = 'daemon'").fetchall()
+    assert len({row['run_id'] for row in rows}) == 2
+    assert [row['runs'] for row in rows] == [1, 1]
+    assert metrics.phases == {}
+
+
+def test_step_timings_are_written_without_holding_the_queue(monkeypatch):
+    import deploy_daemon
+    answered = []
+
+    def record_steps(command, run_id, phases):
+        # Another thread can still read the status while the timings are written
+        reader = threading.Thread(target=lambda: answered.append(queue.status()))
+        reader.start()
+        reader.join(1)
+
+    def deploy(ASK, request):
+        with phase('activate-staging'):
+            pass
+
+    monkeypatch.setattr(deploy_daemon, 'record_steps', record_steps)
+    queue = DeployQueue('ASK', max_workers=1, deploy=deploy)
+    queue.start()
+    try:
+        queue.submit({'propertyName': 'a.example.com'})
+        assert queue.wait_idle(5)
+    finally:
+        queue.stop()
+    assert len(answered) == 1
+
+
+def test_http_interface(daemon):
+    queue, deploy = daemon
+    deploy.release.set()
+    server = start_daemon(DeployQueue('ASK', max_workers=1, deploy=deploy), port=0)
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        request = Request(f'{base}/deploy', data=json.dumps({'properties': ['a.example.com']}).encode('utf-8'),
+                          headers={'Content-Type': 'application/json'})
+        with urlopen(request, timeout=5) as response:
+            assert response.status == 202
+            assert json.load(response) == {'a.example.com': 'queued'}
+        server.queue.wait_idle(5)
+        with urlopen(f'{base}/status', timeout=5) as response:
+            assert json.load(response)['results']['a.example.com']['status'] == 'SUCCESS'
+
+        for body in ({'properties': 'www.example.com'}, {'properties': ['', 7]}, ['a.example.com'], {}):
+            request = Request(f'{base}/deploy', data=json.dumps(body).encode('utf-8'),
+                              headers={'Content-Type': 'application/json'})
+            with pytest.raises(HTTPError) as rejected:
+                urlopen(request, timeout=5)
+            assert rejected.value.code == 400
+        assert server.queue.status()['pending'] == {}
+    finally:
+        server.shutdown()
+        server.queue.stop()
@@ -0,0 +1,91 @@
+import pytest
+
+pytest.importorskip('requests')
+import papi_client  # noqa: E402
+from papi_client import PapiClient  # noqa: E402
+
+
+class FakeRequest:
+    headers = {'Content-Length': '10'}
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.request = FakeRequest()
+        self.content = b'{}'
+
+
+class FakeSession:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = []
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs['headers']))
+        return FakeResponse(self.statuses.pop(0))
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(papi_client.time, 'sleep', lambda seconds: None)
+
+
+def test_get_is_retried_on_server_errors():
+    session = FakeSession([503, 502, 200])
+    response = PapiClient(session, 'https://papi.example.com').get('/papi/v1/contracts')
+
+    assert response.status_code == 200
+    assert len(session.calls) == 3
+    assert session.calls[0][1] == 'https://papi.example.com/papi/v1/contracts'
+    assert session.calls[0][2]['PAPI-Use-Prefixes'] == 'false'
+
+
+def test_post_is_only_retried_when_throttled():
+    session = FakeSession([429, 503])
+    response = PapiClient(session, 'https://papi.example.com').post('/papi/v1/properties/1/versions')
+
+    assert response.status_code == 503
+    assert len(session.calls) == 2
+
+
+def test_conditional_writes_are_only_retried_when_throttled():
+    session = FakeSession([429, 503, 503])
+    client = PapiClient(session, 'https://papi.example.com')
+
+    assert client.patch('/papi/v1/properties/1/versions/2/rules', headers={'If-Match': '"e1"'}).status_code == 503
+    assert client.put('/papi/v1/properties/1/versions/2/rules', headers={'If-Match': '"e1"'}).status_code == 503
+    assert len(session.calls) == 3
+
+
+def test_retries_are_bounded():
+    session = FakeSession([503] * 10)
+    response = PapiClient(session, 'https://papi.example.com', max_retries=2).get('/papi/v1/groups')
+
+    assert response.status_code == 503
+    assert len(session.calls) == 3
+
+
+def test_retry_after_header_is_honored():
+    client = PapiClient(FakeSession([]), 'https://papi.example.com')
+    assert client._backoff(0, FakeResponse(429, {'Retry-After': '30'})) >= 30
+
+
+def test_calls_are_recorded_per_endpoint(monkeypatch):
+    metrics = papi_client.metrics
+    monkeypatch.setattr(metrics, 'endpoints', {})
+    session = FakeSession([503, 200, 200])
+    client = PapiClient(session, 'https://papi.example.com')
+    client.get('/papi/v1/properties/prp_1/versions/3/rules?contractId=ctr_1')
+    client.get('/papi/v1/properties/prp_2/versions/4/rules')
+
+    stats = metrics.endpoints['GET /papi/v1/properties/{id}/versions/{id}/rules']
+    assert stats['calls'] == 3
+    assert stats['retries'] == 1
+    assert stats['statuses'] == {503: 1, 200: 2}
+    assert stats['sent'] == 30
+    assert stats['received'] == 6
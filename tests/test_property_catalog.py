@@ -0,0 +1,58 @@
+import pytest
+
+pytest.importorskip('requests')
+import property_catalog  # noqa: E402
+import property_search  # noqa: E402
+
+
+@pytest.fixture
+def mock_papi(start_mock_papi):
+    return start_mock_papi([f'www{i}.example.com' for i in range(3)])
+
+
+def test_sync_indexes_by_name_hostname_and_id(mock_papi):
+    counts = property_catalog.sync_catalog('ASK')
+
+    assert counts['properties'] == 3
+    assert counts['changed'] == 3
+    by_name = property_catalog.find_property('ASK', property_name='www1.example.com')
+    assert by_name['productionVersion'] == 1
+    assert property_catalog.find_property('ASK', hostname='WWW1.example.com') == by_name
+    assert property_catalog.find_property('ASK', property_id=by_name['propertyId']) == by_name
+    assert property_catalog.find_property('OTHER-ASK', property_name='www1.example.com') is None
+
+
+def test_unchanged_lists_are_not_downloaded_again(mock_papi):
+    property_catalog.sync_catalog('ASK')
+    counts = property_catalog.sync_catalog('ASK')
+
+    assert counts['unchanged_lists'] == 1
+    assert counts['changed'] == 0
+    assert counts['properties'] == 3
+
+
+def test_expired_entries_are_ignored_and_evicted(mock_papi):
+    property_catalog.sync_catalog('ASK')
+
+    assert property_catalog.find_property('ASK', property_name='www0.example.com', ttl=-1) is None
+    assert property_catalog.evict_expired('ASK', ttl=-1) == 3
+
+
+def test_property_search_resolves_from_the_catalog(mock_papi):
+    property_catalog.sync_catalog('ASK')
+    calls = mock_papi.request_count
+
+    item = property_search.find_active_version('www2.example.com', 'ASK')
+
+    # Only the live production version is checked; the property is not searched
+    assert item['propertyVersion'] == 1
+    assert mock_papi.request_count == calls + 1
+
+
+def test_a_stale_catalog_entry_uses_the_live_version(mock_papi):
+    property_catalog.sync_catalog('ASK')
+    property_id, prop = mock_papi.property_by_name('www2.example.com')
+    prop['versions'][2] = dict(prop['versions'][1], stagingStatus='INACTIVE', productionStatus='ACTIVE')
+    prop['active']['PRODUCTION'] = 2
+
+    assert property_search.find_active_version('www2.example.com', 'ASK')['propertyVersion'] == 2
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+pytest.importorskip('requests')
+import bulk_deploy  # noqa: E402
+import rollback  # noqa: E402
+
+
+@pytest.fixture
+def mock_papi(start_mock_papi, tmp_path, monkeypatch):
+    papi = start_mock_papi(['www.example.com'], pending_duration=0.2)
+    monkeypatch.setattr(bulk_deploy, 'run_smoke_test', lambda hostname, network: True)
+
+    # Deploy version 2 to both networks; it passes its smoke tests and becomes known-good
+    entry = papi.manifest()[0]
+    tree = papi.rule_tree(entry['propertyId'], 1)
+    tree['rules']['behaviors'][1]['options']['ttl'] = '7d'
+    with open(tmp_path / 'www.example.com.json', 'w') as file:
+        json.dump(tree, file)
+    assert bulk_deploy.deploy_property('ASK', entry, 'both')['status'] == 'SUCCESS'
+
+    return papi, entry
+
+
+def test_rollback_uses_fast_fallback_within_the_window(mock_papi):
+    papi, entry = mock_papi
+    assert rollback.known_good_versions(entry['propertyId'], 'production') == [2]
+
+    status, target, fast = rollback.rollback('ASK', entry['propertyId'], entry['contractId'], entry['groupId'],
+                                             'production')
+
+    assert (status, target, fast) == ('ACTIVE', 1, True)
+    assert papi.properties[entry['propertyId']]['active'] == {'STAGING': 2, 'PRODUCTION': 1}
+
+
+def test_rollback_reactivates_the_version_after_the_window(mock_papi):
+    papi, entry = mock_papi
+    papi.fallback_window = 0
+
+    status, target, fast = rollback.rollback('ASK', entry['propertyId'], entry['contractId'], entry['groupId'],
+                                             'staging')
+
+    assert (status, target, fast) == ('ACTIVE', 1, False)
+    assert papi.properties[entry['propertyId']]['active']['STAGING'] == 1
+
+
+def test_rolling_back_twice_never_returns_to_the_bad_version(mock_papi, tmp_path):
+    papi, entry = mock_papi
+    tree = papi.rule_tree(entry['propertyId'], 1)
+    tree['rules']['behaviors'][1]['options']['ttl'] = '8d'
+    with open(tmp_path / 'www.example.com.json', 'w') as file:
+        json.dump(tree, file)
+    entry = dict(entry, propertyVersion=2, etag=papi.properties[entry['propertyId']]['versions'][2]['etag'])
+    assert bulk_deploy.deploy_property('ASK', entry, 'production')['status'] == 'SUCCESS'
+    assert rollback.known_good_versions(entry['propertyId'], 'production') == [3, 2]
+
+    first = rollback.rollback('ASK', entry['propertyId'], entry['contractId'], entry['groupId'], 'production')
+    assert first[:2] == ('ACTIVE', 2)
+    assert rollback.known_good_versions(entry['propertyId'], 'production') == [2]
+
+    # Version 1 was live before any recorded activation, so nothing older is left to roll back to
+    with pytest.raises(Exception, match='No previous version'):
+        rollback.rollback('ASK', entry['propertyId'], entry['contractId'], entry['groupId'], 'production')
+    assert papi.properties[entry['propertyId']]['active']['PRODUCTION'] == 2
+
+
+def test_known_good_version_is_preferred_over_the_fallback_version():
+    activations = [
+        {'network': 'PRODUCTION', 'status': 'ACTIVE', 'propertyVersion': 5,
+         'fallbackInfo': {'canFastFallback': True, 'fallbackVersion': 4}},
+        {'network': 'PRODUCTION', 'status': 'INACTIVE', 'propertyVersion': 4},
+    ]
+
+    assert rollback.choose_target(activations, 'production', [5, 3])[1] == 3
+    assert rollback.choose_target(activations, 'production', [6, 3])[1] == 3
+    assert rollback.choose_target(activations, 'production', [5])[1] == 4
+    assert rollback.can_fast_fallback(activations[0], 4)
+    assert not rollback.can_fast_fallback(activations[0], 3)
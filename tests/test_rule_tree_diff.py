@@ -0,0 +1,75 @@
+import copy
+import json
+import os
+
+from rule_tree_diff import diff, diff_rule_trees, patch_is_worthwhile
+
+RULE_TREE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'www.cyberabstract.com.json')
+
+
+def apply_patch(document, patch):
+    """Minimal JSON Patch applier covering the operations emitted by diff()."""
+    document = copy.deepcopy(document)
+    for operation in patch:
+        tokens = [t.replace('~1', '/').replace('~0', '~') for t in operation['path'].split('/')[1:]]
+        if not tokens:
+            document = operation['value']
+            continue
+        parent = document
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        key = int(tokens[-1]) if isinstance(parent, list) else tokens[-1]
+        if operation['op'] == 'remove':
+            del parent[key]
+        elif operation['op'] == 'add' and isinstance(parent, list):
+            parent.insert(key, operation['value'])
+        else:
+            parent[key] = operation['value']
+    return document
+
+
+def load_rule_tree():
+    with open(RULE_TREE_FILE, 'r') as file:
+        return json.load(file)
+
+
+def test_identical_trees_produce_empty_patch():
+    tree = load_rule_tree()
+    assert diff_rule_trees(tree, copy.deepcopy(tree)) == []
+
+
+def test_single_option_change_is_a_single_replace():
+    deployed = load_rule_tree()
+    local = copy.deepcopy(deployed)
+    local['rules']['children'][0]['children'][0]['behaviors'][0]['options']['timeout'] = '2h'
+
+    patch = diff_rule_trees(deployed, local)
+
+    assert patch == [{'op': 'replace',
+                      'path': '/rules/children/0/children/0/behaviors/0/options/timeout',
+                      'value': '2h'}]
+    assert patch_is_worthwhile(patch, local)
+
+
+def test_patch_round_trips_added_and_removed_rules():
+    deployed = load_rule_tree()
+    local = copy.deepcopy(deployed)
+    del local['rules']['children'][1]['children'][3]
+    local['rules']['children'].append({'name': 'New rule', 'children': [], 'behaviors': [],
+                                       'criteria': [], 'criteriaMustSatisfy': 'all'})
+    local['rules']['options']['is_secure'] = True
+
+    patch = diff_rule_trees(deployed, local)
+
+    assert apply_patch(deployed, patch) == local
+
+
+def test_keys_are_escaped_as_json_pointers():
+    assert diff({'a/b': 1, 'c~d': 1}, {'a/b': 2, 'c~d': 2}) == [
+        {'op': 'replace', 'path': '/a~1b', 'value': 2},
+        {'op': 'replace', 'path': '/c~0d', 'value': 2},
+    ]
+
+
+def test_type_change_replaces_whole_value():
+    assert diff({'a': [1]}, {'a': {'b': 1}}) == [{'op': 'replace', 'path': '/a', 'value': {'b': 1}}]
@@ -0,0 +1,51 @@
+import copy
+import json
+import os
+
+import pytest
+
+RULE_TREE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'www.cyberabstract.com.json')
+
+# rule_tree_hash talks to PAPI through the shared client, which needs requests
+pytest.importorskip('requests')
+from rule_tree_hash import is_already_active, rules_hash  # noqa: E402
+
+
+def load_rule_tree():
+    with open(RULE_TREE_FILE, 'r') as file:
+        return json.load(file)
+
+
+def test_hash_ignores_formatting_and_key_order():
+    tree = load_rule_tree()
+    reordered = json.loads(json.dumps(tree['rules'], sort_keys=True, indent=1))
+    assert rules_hash(tree) == rules_hash({'rules': dict(reversed(list(reordered.items())))})
+
+
+def test_hash_ignores_version_metadata():
+    tree = load_rule_tree()
+    bumped = copy.deepcopy(tree)
+    bumped['propertyVersion'] += 1
+    bumped['etag'] = 'another-etag'
+    assert rules_hash(tree) == rules_hash(bumped)
+
+
+def test_hash_changes_with_rules():
+    tree = load_rule_tree()
+    changed = copy.deepcopy(tree)
+    changed['rules']['behaviors'][0]['options']['hostname'] = 'origin.example.com'
+    assert rules_hash(tree) != rules_hash(changed)
+
+
+def test_the_active_rule_tree_is_downloaded_once(start_mock_papi):
+    papi = start_mock_papi()
+    entry = papi.manifest()[0]
+    args = ('ASK', entry['propertyId'], entry['contractId'], entry['groupId'], 'STAGING')
+    active_hash = rules_hash(papi.rule_tree(entry['propertyId'], 1))
+
+    assert is_already_active(*args, active_hash)
+    calls = papi.request_count
+    assert is_already_active(*args, active_hash)
+
+    # Only the active version is looked up; its hash comes from the state store
+    assert papi.request_count == calls + 1
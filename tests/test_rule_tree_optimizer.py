@@ -0,0 +1,69 @@
+import rule_tree_optimizer
+
+
+def behavior(name, **options):
+    return {'name': name, 'options': options}
+
+
+def extension(*values):
+    return {'name': 'fileExtension', 'options': {'matchOperator': 'IS_ONE_OF', 'values': list(values)}}
+
+
+def make_tree():
+    return {'rules': {
+        'name': 'default',
+        'behaviors': [behavior('origin', hostname='o'), behavior('caching', ttl='1d')],
+        'children': [
+            {'name': 'Static', 'criteria': [extension('css'), extension('css')],
+             'behaviors': [behavior('caching', ttl='1d'), behavior('caching', ttl='7d'), behavior('gzipResponse')],
+             'children': [{'name': 'Always', 'criteria': [], 'behaviors': [behavior('gzipResponse', on=True)],
+                           'children': []}]},
+            {'name': 'Empty', 'criteria': [extension('html')], 'behaviors': [], 'children': []},
+            {'name': 'Images', 'criteria': [extension('png')], 'behaviors': [behavior('caching', ttl='30d')],
+             'children': []},
+            {'name': 'Images again', 'criteria': [extension('png')], 'behaviors': [behavior('caching', ttl='30d')],
+             'children': []},
+            {'name': 'Headers', 'criteria': [extension('js')],
+             'behaviors': [behavior('modifyOutgoingResponseHeader', action='ADD', customHeaderName='X-A'),
+                           behavior('modifyOutgoingResponseHeader', action='ADD', customHeaderName='X-A')],
+             'children': []},
+        ],
+    }}
+
+
+def test_redundant_rules_and_behaviors_are_folded():
+    tree = make_tree()
+    optimized, report = rule_tree_optimizer.optimize_rule_tree(tree)
+
+    rules = optimized['rules']
+    assert rules['behaviors'] == tree['rules']['behaviors']
+    static = rules['children'][0]
+    assert static['criteria'] == [extension('css')]
+    assert static['behaviors'] == [behavior('caching', ttl='7d')]
+    assert [child['name'] for child in rules['children']] == ['Static', 'Images again', 'Headers']
+    assert len(rules['children'][2]['behaviors']) == 2
+    assert report['folds'] == {'duplicate criteria': 1, 'duplicate behaviors': 0, 'overridden behaviors': 2,
+                               'empty rules': 1, 'duplicate siblings': 1}
+    assert report['after']['rules'] == report['before']['rules'] - 2
+    assert report['after']['bytes'] < report['before']['bytes']
+
+
+def test_the_input_is_not_modified_and_optimizing_twice_changes_nothing():
+    tree = make_tree()
+    optimized, _ = rule_tree_optimizer.optimize_rule_tree(tree)
+
+    assert tree == make_tree()
+    again, report = rule_tree_optimizer.optimize_rule_tree(optimized)
+    assert again == optimized
+    assert not any(report['folds'].values())
+
+
+def test_repeated_subtrees_are_reported():
+    subtree = {'criteria': [extension('css')], 'behaviors': [behavior('caching', ttl='7d')],
+               'children': [{'name': 'Gzip', 'behaviors': [behavior('gzipResponse')], 'children': []}]}
+    tree = {'rules': {'name': 'default', 'behaviors': [], 'children': [
+        {'name': 'A', 'criteria': [extension('js')], 'behaviors': [], 'children': [dict(subtree, name='Static')]},
+        {'name': 'B', 'criteria': [extension('svg')], 'behaviors': [], 'children': [dict(subtree, name='Static')]},
+    ]}}
+
+    assert rule_tree_optimizer.repeated_subtrees(tree) == [(2, 2, ['Static', 'Static'])]
@@ -0,0 +1,48 @@
+import rule_tree_simulator
+
+RULE_TREE = {'rules': {
+    'name': 'default',
+    'behaviors': [{'name': 'caching', 'options': {'behavior': 'NO_STORE'}}],
+    'children': [
+        {'name': 'Static', 'criteriaMustSatisfy': 'any',
+         'criteria': [{'name': 'fileExtension', 'options': {'matchOperator': 'IS_ONE_OF', 'values': ['css', 'JS']}},
+                      {'name': 'path', 'options': {'matchOperator': 'MATCHES_ONE_OF', 'values': ['/static/*']}}],
+         'behaviors': [{'name': 'caching', 'options': {'behavior': 'MAX_AGE', 'ttl': '7d'}}],
+         'children': [
+             {'name': 'Bots', 'criteria': [{'name': 'userAgent', 'options': {
+                 'matchOperator': 'IS_ONE_OF', 'matchWildcard': True, 'values': ['*bot*']}}],
+              'behaviors': [{'name': 'denyAccess', 'options': {'enabled': True}}]},
+         ]},
+        {'name': 'API', 'criteria': [
+            {'name': 'hostname', 'options': {'matchOperator': 'IS_ONE_OF', 'values': ['api.*']}},
+            {'name': 'requestHeader', 'options': {'matchOperator': 'EXISTS', 'headerName': 'Authorization'}}],
+         'behaviors': [{'name': 'origin', 'options': {'hostname': 'api-origin'}}]},
+        {'name': 'Compressible', 'criteria': [{'name': 'contentType', 'options': {'values': ['text/*']}}],
+         'behaviors': [{'name': 'gzipResponse', 'options': {'behavior': 'ALWAYS'}}]},
+    ],
+}}
+
+
+def simulate(url, **sample):
+    return rule_tree_simulator.simulate(RULE_TREE, [dict(sample, url=url)])[0]
+
+
+def test_static_rule_matches_by_extension_or_path():
+    assert simulate('https://www.example.com/app.js')['behaviors']['caching']['ttl'] == '7d'
+    assert simulate('https://www.example.com/static/logo')['behaviors']['caching']['ttl'] == '7d'
+    assert simulate('https://www.example.com/index.html')['behaviors']['caching'] == {'behavior': 'NO_STORE'}
+
+
+def test_children_and_header_criteria():
+    result = simulate('https://www.example.com/app.css', headers={'User-Agent': 'Googlebot/2.1'})
+    assert result['matched'] == ['default', 'default > Static', 'default > Static > Bots']
+
+    assert 'origin' not in simulate('https://api.example.com/v1/items')['behaviors']
+    assert simulate('https://api.example.com/v1/items', headers={'authorization': 'x'})['behaviors']['origin']
+
+
+def test_response_criteria_are_undetermined_and_expectations_are_checked():
+    result = simulate('https://www.example.com/', expect={'caching': {'ttl': '7d'}, 'denyAccess': None})
+
+    assert result['undetermined'] == ['default > Compressible']
+    assert result['errors'] == ["caching.ttl is None, expected '7d'"]
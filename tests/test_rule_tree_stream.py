@@ -0,0 +1,45 @@
+import io
+import json
+import os
+
+import pytest
+
+RULE_TREE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'www.cyberabstract.com.json')
+
+# rule_tree_stream talks to PAPI through the shared client, which needs requests
+pytest.importorskip('requests')
+from rule_tree_stream import JsonStreamFormatter  # noqa: E402
+
+
+def format_in_chunks(text, chunk_size):
+    output = io.StringIO()
+    formatter = JsonStreamFormatter(output.write)
+    for start in range(0, len(text), chunk_size):
+        formatter.feed(text[start:start + chunk_size])
+    formatter.feed('', final=True)
+    return output.getvalue(), formatter.metadata
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_output_matches_json_dump(chunk_size):
+    with open(RULE_TREE_FILE, 'r') as file:
+        tree = json.load(file)
+
+    output, _ = format_in_chunks(json.dumps(tree, separators=(',', ':')), chunk_size)
+
+    assert output == json.dumps(tree, indent=4)
+
+
+def test_metadata_holds_top_level_scalars():
+    tree = {'propertyId': 'prp_1', 'propertyVersion': 3, 'etag': 'abc',
+            'rules': {'name': 'default', 'options': {'is_secure': True}}, 'comments': []}
+
+    _, metadata = format_in_chunks(json.dumps(tree), 5)
+
+    assert metadata == {'propertyId': 'prp_1', 'propertyVersion': 3, 'etag': 'abc'}
+
+
+def test_truncated_document_is_rejected():
+    formatter = JsonStreamFormatter(io.StringIO().write)
+    with pytest.raises(ValueError):
+        formatter.feed('{"rules": "unterminated', final=True)
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+import rule_tree_templates
+
+
+@pytest.fixture(autouse=True)
+def template_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('AKAMAI_STATE_DB', str(tmp_path / 'state.db'))
+    monkeypatch.setenv('AKAMAI_RULE_TREE_DIR', str(tmp_path))
+    monkeypatch.delenv('AKAMAI_SNIPPET_DIR', raising=False)
+    (tmp_path / 'snippets').mkdir()
+    write(tmp_path / 'snippets' / 'origin.json', {'name': 'origin', 'options': {'hostname': '${originHost}'}})
+    write(tmp_path / 'snippets' / 'caching.json', [{'name': 'caching', 'options': {'ttl': '${ttl}'}},
+                                                   {'name': 'downstreamCache', 'options': {}}])
+    write(tmp_path / 'snippets' / 'static.json', {'name': 'Static', 'children': [],
+                                                  'behaviors': [{'$include': 'caching.json'}]})
+    write_template(tmp_path, 'www.example.com', ['origin.json', 'caching.json'], ttl='1d')
+    write_template(tmp_path, 'api.example.com', ['origin.json'], ttl='0s')
+    return tmp_path
+
+
+def write(path, content):
+    with open(path, 'w') as file:
+        json.dump(content, file)
+
+
+def write_template(directory, name, includes, **variables):
+    write(directory / f'{name}.template.json', {
+        '$variables': dict(variables, originHost=f'origin.{name}', ports=[80, 443]),
+        'rules': {'name': 'default', 'children': [], 'options': {'ports': '${ports}'},
+                  'behaviors': [{'$include': include} for include in includes],
+                  'comments': 'Rule tree of ${propertyName}'},
+    })
+
+
+def test_render_expands_includes_and_variables(template_dir):
+    rule_tree, used = rule_tree_templates.render('www.example.com')
+
+    assert used == {'origin.json', 'caching.json'}
+    assert rule_tree['rules']['behaviors'] == [
+        {'name': 'origin', 'options': {'hostname': 'origin.www.example.com'}},
+        {'name': 'caching', 'options': {'ttl': '1d'}},
+        {'name': 'downstreamCache', 'options': {}},
+    ]
+    assert rule_tree['rules']['options']['ports'] == [80, 443]
+    assert rule_tree['rules']['comments'] == 'Rule tree of www.example.com'
+
+
+def test_only_properties_using_a_changed_snippet_are_rendered_again(template_dir):
+    assert rule_tree_templates.render_all() == ['api.example.com', 'www.example.com']
+    assert rule_tree_templates.render_all() == []
+
+    write(template_dir / 'snippets' / 'caching.json', [{'name': 'caching', 'options': {'ttl': '7d'}}])
+
+    assert rule_tree_templates.affected_properties(['caching.json']) == ['www.example.com']
+    assert rule_tree_templates.render_all() == ['www.example.com']
+    with open(template_dir / 'www.example.com.json') as file:
+        assert json.load(file)['rules']['behaviors'][1]['options']['ttl'] == '7d'
+
+
+def test_nested_includes_are_tracked_and_cycles_rejected(template_dir):
+    write_template(template_dir, 'static.example.com', ['static.json'], ttl='30d')
+    rule_tree_templates.render_all(['static.example.com'])
+    assert rule_tree_templates.affected_properties(['caching.json']) == ['static.example.com']
+
+    write(template_dir / 'snippets' / 'caching.json', {'$include': 'static.json'})
+    with pytest.raises(Exception, match='include cycle'):
+        rule_tree_templates.render('static.example.com')
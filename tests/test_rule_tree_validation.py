@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+
+import pytest
+
+RULE_TREE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'www.cyberabstract.com.json')
+
+pytest.importorskip('requests')
+import rule_tree_validation  # noqa: E402
+from papi_mock_server import RULE_FORMAT_SCHEMA  # noqa: E402
+
+
+def load_rule_tree():
+    with open(RULE_TREE_FILE, 'r') as file:
+        return json.load(file)
+
+
+@pytest.fixture
+def mock_papi(start_mock_papi):
+    return start_mock_papi()
+
+
+def test_repository_rule_tree_is_structurally_valid():
+    assert rule_tree_validation.validate_locally(load_rule_tree()) == []
+
+
+def test_structural_errors_point_at_the_offending_element():
+    tree = load_rule_tree()
+    tree['rules']['criteria'] = [{'name': 'path', 'options': {}}]
+    tree['rules']['children'][0]['behaviors'].append({'options': {}})
+    tree['rules']['children'][0]['criteriaMustSatisfy'] = 'some'
+
+    errors = rule_tree_validation.validate_locally(tree)
+
+    assert '#/rules/criteria: the default rule cannot have criteria' in errors
+    assert any(e.startswith('#/rules/children/0/behaviors/') for e in errors)
+    assert any(e.startswith('#/rules/children/0/criteriaMustSatisfy') for e in errors)
+
+
+def test_unknown_behaviors_are_caught_with_the_schema_catalog():
+    tree = {'rules': {'name': 'default', 'behaviors': [{'name': 'origin', 'options': {}},
+                                                       {'name': 'teleport', 'options': {}}]}}
+
+    assert rule_tree_validation.validate_locally(tree, RULE_FORMAT_SCHEMA) == [
+        "#/rules/behaviors/1: unknown behavior 'teleport'"]
+
+
+def test_validation_caches_the_schema_and_runs_the_dry_run(mock_papi):
+    entry = mock_papi.manifest()[0]
+    prop = mock_papi.properties[entry['propertyId']]
+    prop['versions'][2] = dict(prop['versions'][1], stagingStatus='INACTIVE', productionStatus='INACTIVE')
+    tree = mock_papi.rule_tree(entry['propertyId'], 1)
+    args = ('ASK', entry['propertyId'], 2, entry['contractId'], entry['groupId'])
+
+    rule_tree_validation.validate_rule_tree(*args, tree, server=True)
+    calls = mock_papi.request_count
+    rule_tree_validation.validate_rule_tree(*args, tree)
+    assert mock_papi.request_count == calls
+
+    tree['rules']['behaviors'][0]['name'] = 'teleport'
+    with pytest.raises(Exception, match='local validation'):
+        rule_tree_validation.validate_rule_tree(*args, tree, server=True)
+    with pytest.raises(Exception, match='server-side validation'):
+        rule_tree_validation.validate_on_server(*args, tree)
+
+
+def test_a_locked_version_fails_the_dry_run(mock_papi):
+    entry = mock_papi.manifest()[0]
+    tree = mock_papi.rule_tree(entry['propertyId'], 1)
+
+    with pytest.raises(Exception, match='locked'):
+        rule_tree_validation.validate_rule_tree('ASK', entry['propertyId'], 1, entry['contractId'], entry['groupId'],
+                                                tree, server=True)
+
+
+def test_a_schema_download_does_not_hold_up_other_schemas(tmp_path, monkeypatch):
+    monkeypatch.setattr(rule_tree_validation, 'SCHEMA_DIR', str(tmp_path))
+    started = threading.Event()
+    release = threading.Event()
+
+    class Response:
+        status_code = 200
+        text = json.dumps(RULE_FORMAT_SCHEMA)
+
+        def json(self):
+            return RULE_FORMAT_SCHEMA
+
+    def get(path, params=None):
+        if 'prd_Slow' in path:
+            started.set()
+            release.wait(5)
+        return Response()
+
+    monkeypatch.setattr(rule_tree_validation.client, 'get', get)
+    slow = threading.Thread(target=rule_tree_validation.load_schema, args=('ASK', 'prd_Slow'))
+    slow.start()
+    try:
+        assert started.wait(5)
+        assert rule_tree_validation.load_schema('ASK', 'prd_Fast') == RULE_FORMAT_SCHEMA
+        assert slow.is_alive()
+    finally:
+        release.set()
+        slow.join()
@@ -0,0 +1,65 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+import smoke_test  # noqa: E402
+
+
+class EdgeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        status = 500 if self.path == '/broken' else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        if 'akamai-x-cache-on' in self.headers.get('Pragma', ''):
+            self.send_header('X-Cache', f"TCP_HIT from {self.headers['Host']}")
+        self.end_headers()
+
+
+@pytest.fixture
+def edge_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), EdgeHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+
+
+def test_matrix_covers_hostnames_paths_and_edge_ips():
+    cases = smoke_test.build_matrix(['a.example.com', 'b.example.com'], ['/', 'about'], ['production'],
+                                    edge_ips=['192.0.2.1', '192.0.2.2'])
+
+    assert len(cases) == 8
+    assert {'environment': 'production', 'hostname': 'b.example.com', 'path': 'about',
+            'url': 'http://192.0.2.2/about'} in cases
+
+
+def test_matrix_reports_failures_and_cache_status(edge_server):
+    cases = smoke_test.build_matrix(['www.example.com'], ['/', '/broken', '/a', '/b'], ['staging'],
+                                    edge_ips=[edge_server])
+
+    results = smoke_test.run_matrix(cases, max_workers=4, timeout=5)
+    summary = smoke_test.summarize(results)
+
+    assert [r['passed'] for r in results] == [True, False, True, True]
+    assert summary['failed'] == 1
+    assert summary['cache'] == {'TCP_HIT': 4}
+
+
+def test_the_pool_is_only_remounted_to_grow(monkeypatch):
+    monkeypatch.setattr(smoke_test, '_pool_size', 0)
+    smoke_test.run_matrix([], max_workers=4)
+    adapter = smoke_test._session.get_adapter('http://www.example.com')
+
+    smoke_test.run_matrix([], max_workers=4)
+    smoke_test.run_matrix([], max_workers=2)
+    assert smoke_test._session.get_adapter('http://www.example.com') is adapter
+
+    smoke_test.run_matrix([], max_workers=8)
+    assert smoke_test._session.get_adapter('http://www.example.com') is not adapter
@@ -0,0 +1,72 @@
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import state_store
+
+PROPERTY = {
+    'accountId': '1-ABC', 'contractId': 'ctr', 'groupId': 'grp', 'propertyId': '123',
+    'propertyName': 'www.example.com', 'propertyVersion': 3, 'etag': 'e3',
+}
+
+
+@pytest.fixture(autouse=True)
+def state_db(tmp_path, monkeypatch):
+    monkeypatch.setenv('AKAMAI_STATE_DB', str(tmp_path / 'state.db'))
+    monkeypatch.delenv('AKAMAI_PROPERTY_NAME', raising=False)
+    return tmp_path
+
+
+def test_save_merges_into_existing_state():
+    state_store.save_relevant_data(PROPERTY)
+    state_store.save_relevant_data({'propertyVersion': 4, 'rulesHash': 'abc'}, 'www.example.com')
+
+    loaded = state_store.load_relevant_data('www.example.com')
+    assert loaded['propertyVersion'] == 4
+    assert loaded['rulesHash'] == 'abc'
+    assert loaded['etag'] == 'e3'
+
+
+def test_missing_property_raises():
+    with pytest.raises(Exception):
+        state_store.load_relevant_data('unknown')
+
+
+def test_concurrent_updates_are_not_lost():
+    state_store.save_relevant_data(PROPERTY)
+    names = [f'www{i}.example.com' for i in range(20)]
+
+    def save(index):
+        state_store.save_relevant_data(dict(PROPERTY, propertyId=str(index), propertyName=names[index]))
+        state_store.save_relevant_data({f'field{index}': index}, names[index])
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(save, range(20)))
+
+    for index, name in enumerate(names):
+        assert state_store.load_relevant_data(name)[f'field{index}'] == index
+
+
+def test_a_property_name_is_required(monkeypatch):
+    state_store.save_relevant_data(PROPERTY)
+
+    with pytest.raises(Exception, match='AKAMAI_PROPERTY_NAME'):
+        state_store.load_relevant_data()
+    with pytest.raises(Exception, match='AKAMAI_PROPERTY_NAME'):
+        state_store.save_relevant_data({'propertyVersion': 4})
+
+    monkeypatch.setenv('AKAMAI_PROPERTY_NAME', 'www.example.com')
+    assert state_store.load_relevant_data()['propertyId'] == '123'
+
+
+def test_existing_pickles_are_imported_explicitly(state_db):
+    with open(state_db / 'property_fields.pkl', 'wb') as pklfile:
+        pickle.dump(PROPERTY, pklfile)
+    with open(state_db / 'switch_key.pkl', 'wb') as pklfile:
+        pickle.dump({'switch_key': '1-ABC:1-DEF', 'account_name': 'Example'}, pklfile)
+
+    assert state_store.load_switch_key_data() is None
+    assert len(state_store.import_pickles(str(state_db))) == 2
+    assert state_store.load_relevant_data('www.example.com')['propertyId'] == '123'
+    assert state_store.load_switch_key_data() == {'switch_key': '1-ABC:1-DEF', 'account_name': 'Example'}